@@ -0,0 +1,70 @@
+"""
+Benchmark for server-side filtering in 'phc list-streams' and 'phc list-depots'.
+
+Lists a large synthetic set of task streams from the local stand-in server in fake_p4, once the old way
+(every full stream spec, filtered in Python) and once with the server-side filter and field selection
+built by perforce_tools.server_filters, and prints the bytes each query returned and its wall-clock time.
+The byte counts are the size of the returned records serialized as JSON, which tracks the size of the
+tagged output the server sends.
+
+Usage:
+    python benchmarks/bench_list_filters.py [--streams 20000] [--bandwidth 10] [--latency 0.002]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_p4
+
+PATTERNS = ["task-0001", "^//bench/task-00012", "main$", "task-.*42$", "task-[0-9]+7$"]
+
+
+def measure(server, p4, args, pattern, field):
+    server.listed_bytes = 0
+    start = time.monotonic()
+    records = p4.run(*args)
+    records = [r for r in records if re.search(pattern, r[field])]
+    return len(records), server.listed_bytes, time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, default=20000, help='Number of task streams in the depot')
+    parser.add_argument('--bandwidth', type=float, default=10, help='Server bandwidth in MB/s')
+    parser.add_argument('--latency', type=float, default=0.002, help='Round-trip latency per command in seconds')
+    options = parser.parse_args()
+
+    server = fake_p4.install()
+    server.latency = options.latency
+    server.bandwidth = options.bandwidth * 1024 * 1024
+    server.add_stream_specs('bench', options.streams)
+    for i in range(200):
+        server.depots.append({'name': f"project-{i:03d}", 'type': 'stream', 'desc': 'Synthetic depot'})
+
+    from perforce_tools.server_filters import depots_query, streams_query
+    from perforce_tools.sync_stats import format_bytes
+
+    p4 = fake_p4.P4().connect()
+
+    print(f"{'query':<44} {'matches':>8} {'before':>20} {'after':>20} {'saved':>7}")
+    cases = [(f"list-streams --pattern \"{pattern}\"", ["streams", "//bench/..."], streams_query('bench', pattern),
+              pattern, 'Stream') for pattern in PATTERNS]
+    cases.append(("list-depots --pattern \"project-01\"", ["depots"], depots_query("project-01"), "project-01",
+                  'name'))
+    for label, before_args, after_args, pattern, field in cases:
+        matches, before_bytes, before_time = measure(server, p4, before_args, pattern, field)
+        after_matches, after_bytes, after_time = measure(server, p4, after_args, pattern, field)
+        assert matches == after_matches, f"{label}: {matches} != {after_matches}"
+        saved = 100 * (1 - after_bytes / before_bytes) if before_bytes else 0
+        print(f"{label:<44} {matches:>8} {format_bytes(before_bytes):>10} {before_time:>7.3f}s "
+              f"{format_bytes(after_bytes):>10} {after_time:>7.3f}s {saved:>6.1f}%")
+
+
+if __name__ == '__main__':
+    main()
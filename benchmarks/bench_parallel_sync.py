@@ -0,0 +1,80 @@
+"""
+Benchmark for 'phc sync-stream --parallel'.
+
+Runs the parallel sync code against the local stand-in server in fake_p4 and prints wall-clock time and
+aggregate throughput for increasing numbers of transfer threads.
+
+Usage:
+    python benchmarks/bench_parallel_sync.py [--files-per-dir 20] [--latency 0.002]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_p4
+
+
+def run(parallel_values, server_side):
+    server = fake_p4.install()
+    server.parallel_max = max(parallel_values) if server_side else 0
+
+    from perforce_tools.connection_pool import ConnectionPool
+    from perforce_tools.parallel_sync import UNITS_PER_WORKER, parallel_sync, plan_sync_units
+    from perforce_tools.sync_stats import format_bytes
+
+    def connect():
+        return fake_p4.P4().connect()
+
+    p4 = connect()
+    p4.client = 'bench_client'
+    p4.save_client({'Client': 'bench_client', 'Stream': '//bench/main', 'Root': '/tmp/bench'})
+
+    results = []
+    for parallel in parallel_values:
+        server.have.clear()
+        start = time.monotonic()
+        if parallel == 1:
+            records = p4.run_sync()
+            files, total = len(records), sum(int(r['fileSize']) for r in records)
+        else:
+            units = plan_sync_units(p4, 'bench_client', parallel * UNITS_PER_WORKER)
+            pool = ConnectionPool(connect, parallel - 1)
+            _, stats = parallel_sync(p4, pool, 'bench_client', parallel, units)
+            pool.close()
+            files, total = sum(s.files for s in stats), sum(s.bytes for s in stats)
+        elapsed = time.monotonic() - start
+        results.append((parallel, elapsed))
+        print(f"parallel={parallel:<3} {files} files, {format_bytes(total)} in {elapsed:.2f}s "
+              f"({format_bytes(total / elapsed)}/s)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files-per-dir', type=int, default=20)
+    parser.add_argument('--file-size', type=int, default=256 * 1024)
+    parser.add_argument('--latency', type=float, default=0.002)
+    parser.add_argument('--bandwidth', type=float, default=50 * 1024 * 1024,
+                        help='Bytes per second a single connection can transfer')
+    parser.add_argument('--server-side', action='store_true',
+                        help='Enable net.parallel.max on the stand-in server')
+    args = parser.parse_args()
+
+    server = fake_p4.install()
+    server.latency = args.latency
+    server.bandwidth = args.bandwidth
+    server.add_stream('//bench/main', dirs=4, depth=2, files_per_dir=args.files_per_dir, file_size=args.file_size)
+
+    results = run([1, 2, 4, 8], args.server_side)
+    baseline = results[0][1]
+    for parallel, elapsed in results[1:]:
+        print(f"speedup at parallel={parallel}: {baseline / elapsed:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
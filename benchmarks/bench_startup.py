@@ -0,0 +1,73 @@
+"""
+Benchmark for 'phc' startup time.
+
+Runs phc commands that do not talk to a server in fresh interpreters and prints their import time, as
+reported by 'python -X importtime', and their wall-clock time. For comparison, the same is measured for
+importing every subcommand module up front, as phc did before subcommands were loaded lazily.
+P4Python must be installed for the comparison to be meaningful.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EAGER_IMPORTS = ("import perforce_tools.save_profile, perforce_tools.list_depots, perforce_tools.list_streams, "
+                 "perforce_tools.list_files, perforce_tools.list_profiles, perforce_tools.delete_profile, "
+                 "perforce_tools.sync_stream, perforce_tools.sync_streams, perforce_tools.daemon; ")
+
+CASES = [
+    ("phc --help", "from perforce_tools.phc import cli; cli(['--help'])"),
+    ("phc list-profiles", "from perforce_tools.phc import cli; cli(['list-profiles'])"),
+    ("phc --help, all modules imported", EAGER_IMPORTS + "from perforce_tools.phc import cli; cli(['--help'])"),
+    ("phc list-profiles, all modules imported",
+     EAGER_IMPORTS + "from perforce_tools.phc import cli; cli(['list-profiles'])"),
+]
+
+
+def run_case(code, env):
+    """
+    Run code in a fresh interpreter.
+
+    Returns:
+        tuple: (total import time in seconds, wall-clock time in seconds, whether P4 was imported)
+    """
+    start = time.monotonic()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.monotonic() - start
+    # Top-level imports are the lines whose module name is not indented
+    total = sum(int(match.group(1)) for match in re.finditer(r"^import time:\s+\d+ \|\s+(\d+) \| (\S)",
+                                                            result.stderr, re.MULTILINE))
+    loaded_p4 = re.search(r"\|\s+P4$", result.stderr, re.MULTILINE) is not None
+    return total / 1e6, elapsed, loaded_p4
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Runs per command; the median is reported')
+    options = parser.parse_args()
+
+    # Use an empty configuration directory so list-profiles does not depend on the local setup
+    home = tempfile.mkdtemp()
+    env = dict(os.environ, HOME=home, APPDATA=home, PYTHONPATH=ROOT)
+
+    print(f"{'command':<42} {'imports':>9} {'wall':>9}  P4 loaded")
+    for label, code in CASES:
+        runs = [run_case(code, env) for _ in range(options.runs)]
+        imports = statistics.median(run[0] for run in runs)
+        wall = statistics.median(run[1] for run in runs)
+        print(f"{label:<42} {imports * 1000:>7.1f}ms {wall * 1000:>7.1f}ms  {'yes' if runs[0][2] else 'no'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""
+Benchmark suite for phc, with regression checks against a stored baseline.
+
+Runs the phc commands in-process against the local stand-in server in fake_p4, loaded with a synthetic depot
+of task streams and a synthetic stream with a regular directory tree, and measures:
+
+- listing latency: list-depots and list-streams (from the server, from the metadata cache, and with a
+  pattern), and the file rate of list-files over the whole stream
+- sync throughput: the file rate of sync-stream, on one connection and with --parallel
+- peak memory: the largest amount of memory allocated by Python objects during sync-stream, as reported by
+  tracemalloc; this includes the stand-in server's allocations for a single command, but not its have lists
+- startup time: 'phc --help' and 'phc list-profiles' in fresh interpreters
+
+The stand-in server answers with a negligible latency and transfers at a very high bandwidth, so the numbers
+measure the tools themselves rather than the simulated network.
+
+The results are compared with a baseline file, and the suite exits with status 1 if any metric is worse than
+its baseline by more than the tolerance. Timings depend on the machine, so baselines are not part of the
+repository: the machine that runs the comparison records its own, e.g. a CI job runs the suite with
+--save-baseline on the target branch and then without it on the change, on the same runner. Without a
+baseline for the scale, the results are only reported, unless --require-baseline makes that an error so a
+check that lost its baseline cannot pass silently.
+
+Usage:
+    python benchmarks/bench_suite.py --scale small --save-baseline [--baseline PATH]
+    python benchmarks/bench_suite.py [--scale small|medium|large] [--cases list,sync,...] [--tolerance 0.25]
+                                     [--require-baseline]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+import fake_p4
+
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+
+# Size of the synthetic data per scale: task streams in the depot, and the shape of the synced stream
+# (a tree of 1 + 10 + 100 + 1000 directories with the same number of files in each)
+SCALES = {
+    "small": {"streams": 2000, "dirs": 10, "depth": 3, "files_per_dir": 18},
+    "medium": {"streams": 10000, "dirs": 10, "depth": 3, "files_per_dir": 180},
+    "large": {"streams": 20000, "dirs": 10, "depth": 3, "files_per_dir": 900},
+}
+
+# Size of every synthetic file in bytes
+FILE_SIZE = 4096
+
+# Metrics: name -> (unit, whether higher values are better)
+METRICS = {
+    "list_depots": ("s", False),
+    "list_streams": ("s", False),
+    "list_streams_cached": ("s", False),
+    "list_streams_pattern": ("s", False),
+    "list_files_rate": ("files/s", True),
+    "sync_rate": ("files/s", True),
+    "sync_parallel_rate": ("files/s", True),
+    "sync_peak_memory": ("MB", False),
+    "startup_help": ("s", False),
+    "startup_list_profiles": ("s", False),
+}
+
+PROFILE = "bench"
+STREAM = "//bench/main"
+
+
+def phc(*args):
+    """
+    Run a phc command in-process with its output discarded.
+
+    Returns:
+        float: Wall-clock seconds the command took
+    """
+    from perforce_tools.phc import cli
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        try:
+            cli.main(list(args), prog_name="phc", standalone_mode=False)
+        except SystemExit as e:
+            if e.code:
+                raise RuntimeError(f"'phc {' '.join(args)}' exited with status {e.code}")
+    return time.perf_counter() - start
+
+
+def median_time(runs, *args):
+    return statistics.median(phc(*args) for _ in range(runs))
+
+
+def bench_list(options, workdir):
+    phc("list-streams", "--profile", PROFILE, "--depot", "bench")
+    return {
+        "list_depots": median_time(options.runs, "list-depots", "--profile", PROFILE, "--refresh"),
+        "list_streams": median_time(options.runs, "list-streams", "--profile", PROFILE, "--depot", "bench",
+                                    "--refresh"),
+        "list_streams_cached": median_time(options.runs, "list-streams", "--profile", PROFILE, "--depot", "bench"),
+        "list_streams_pattern": median_time(options.runs, "list-streams", "--profile", PROFILE, "--depot", "bench",
+                                            "--pattern", "task-0001", "--refresh"),
+    }
+
+
+def bench_list_files(options, workdir):
+    files = len(fake_p4.SERVER.under(STREAM + "/"))
+    elapsed = median_time(options.runs, "list-files", "--profile", PROFILE, "--depot", "bench", "--stream", "main",
+                          "--output", os.devnull)
+    return {"list_files_rate": files / elapsed}
+
+
+def _sync(workdir, *extra):
+    workspace = tempfile.mkdtemp(dir=workdir)
+    try:
+        return phc("sync-stream", "--profile", PROFILE, "--depot", "bench", "--stream", "main", "--workspace-path",
+                   workspace, "--progress-interval", "0", *extra)
+    finally:
+        shutil.rmtree(workspace)
+
+
+def bench_sync(options, workdir):
+    files = len(fake_p4.SERVER.under(STREAM + "/"))
+    return {
+        "sync_rate": files / statistics.median(_sync(workdir) for _ in range(options.runs)),
+        "sync_parallel_rate": files / statistics.median(_sync(workdir, "--parallel", "4")
+                                                        for _ in range(options.runs)),
+    }
+
+
+def bench_memory(options, workdir):
+    # Sync once untraced first, so the memory used by modules and caches loaded on first use is not counted
+    _sync(workdir)
+    tracemalloc.start()
+    try:
+        _sync(workdir)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"sync_peak_memory": peak / (1024 * 1024)}
+
+
+def bench_startup(options, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    results = {}
+    for metric, args in (("startup_help", ["--help"]), ("startup_list_profiles", ["list-profiles"])):
+        code = f"from perforce_tools.phc import cli; cli({args!r})"
+        runs = []
+        for _ in range(options.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, check=True)
+            runs.append(time.perf_counter() - start)
+        results[metric] = statistics.median(runs)
+    return results
+
+
+CASES = {
+    "list": bench_list,
+    "list-files": bench_list_files,
+    "sync": bench_sync,
+    "memory": bench_memory,
+    "startup": bench_startup,
+}
+
+
+def setup(scale, workdir):
+    """
+    Point phc at an empty configuration directory and load the stand-in server with synthetic data.
+    """
+    os.environ.update(HOME=workdir, APPDATA=workdir, PHC_NO_DAEMON="1")
+    server = fake_p4.install()
+    server.latency = 0.0
+    server.bandwidth = 1e15
+    server.keep_have = False
+    server.add_stream_specs("bench", scale["streams"])
+    server.streams.pop(0)
+    server.add_stream(STREAM, dirs=scale["dirs"], depth=scale["depth"], files_per_dir=scale["files_per_dir"],
+                      file_size=FILE_SIZE)
+    for i in range(200):
+        server.depots.append({"name": f"project-{i:03d}", "type": "stream", "desc": "Synthetic depot"})
+    # Build the file index now rather than during the first measurement
+    server.under(STREAM)
+
+    from perforce_tools import config
+    config.save_config({"profiles": {PROFILE: {"host": "fake:1666", "username": "bench", "password": "bench"}}})
+    return server
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a baseline.
+
+    Returns:
+        list: Lines describing every metric, and the number of regressions
+    """
+    lines = [f"{'metric':<24} {'value':>18} {'baseline':>18} {'change':>8}"]
+    regressions = 0
+    for metric, value in results.items():
+        unit, higher_is_better = METRICS[metric]
+        line = f"{metric:<24} {value:>10.4g} {unit:<7}"
+        expected = baseline.get(metric)
+        if expected:
+            change = value / expected - 1
+            worse = -change if higher_is_better else change
+            line += f" {expected:>10.4g} {unit:<7} {change:>+7.0%}"
+            if worse > tolerance:
+                line += "  REGRESSION"
+                regressions += 1
+        lines.append(line.rstrip())
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="Size of the synthetic data")
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma-separated cases to run")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per measurement; the median is used")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Fraction by which a metric may be worse than its baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="Exit with status 1 if there is no baseline for the scale")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    options = parser.parse_args()
+    if options.require_baseline and options.save_baseline:
+        parser.error("--require-baseline and --save-baseline cannot be used together")
+
+    cases = options.cases.split(",")
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    workdir = tempfile.mkdtemp(prefix="phc-bench-")
+    try:
+        start = time.perf_counter()
+        server = setup(SCALES[options.scale], workdir)
+        print(f"Scale '{options.scale}': {len(server.streams)} streams, {len(server.files)} files in {STREAM} "
+              f"(generated in {time.perf_counter() - start:.1f}s)")
+        results = {}
+        for case in cases:
+            start = time.perf_counter()
+            results.update(CASES[case](options, workdir))
+            print(f"  {case} done in {time.perf_counter() - start:.1f}s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baselines = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as f:
+            baselines = json.load(f)
+    lines, regressions = compare(results, baselines.get(options.scale, {}), options.tolerance)
+    print("\n".join(lines))
+    missing_baseline = options.scale not in baselines and not options.save_baseline
+    if missing_baseline:
+        print(f"No baseline for scale '{options.scale}' in {options.baseline}; record one on this machine with "
+              f"--save-baseline to compare against")
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump({"scale": options.scale, "results": results}, f, indent=2)
+
+    if options.save_baseline:
+        baselines[options.scale] = dict(baselines.get(options.scale, {}), **results)
+        with open(options.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline for scale '{options.scale}' saved to {options.baseline}")
+    elif regressions:
+        print(f"{regressions} metrics regressed by more than {options.tolerance:.0%}")
+        sys.exit(1)
+    elif missing_baseline and options.require_baseline:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
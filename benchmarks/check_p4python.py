@@ -0,0 +1,77 @@
+"""
+Check the tools' use of P4Python objects against the real P4Python, without a server.
+
+The benchmarks run against the stand-in in fake_p4, which can hide uses of P4.P4 that the real module rejects,
+such as setting attributes on a connection or passing an output handler that is not a P4.OutputHandler. This
+script runs those code paths with the real module: it connects with --trace enabled to a port where no server
+listens, and runs commands with and without an output handler on a traced connection, expecting each to fail
+only with the connection error.
+
+Usage:
+    python benchmarks/check_p4python.py
+"""
+
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+
+# A port where no server listens, so every connection attempt fails quickly
+UNREACHABLE_PORT = "127.0.0.1:1"
+
+
+def main():
+    try:
+        import P4
+    except ImportError:
+        print("P4Python is not installed; skipped")
+        return
+
+    home = tempfile.mkdtemp(prefix="phc-check-")
+    os.environ.update(HOME=home, APPDATA=home, PHC_NO_DAEMON="1")
+    from perforce_tools import config, tracing
+
+    failures = []
+    tracing.enable(os.path.join(home, "trace.json"))
+
+    # A connection attempt must fail with the connection error only
+    config.save_config({"profiles": {"check": {"host": UNREACHABLE_PORT, "username": "check", "password": "x"}}})
+    try:
+        config.get_p4_client("check", direct=True)
+        failures.append("connecting to an unreachable port succeeded")
+    except ValueError as e:
+        if not str(e).startswith("Failed to connect"):
+            failures.append(f"get_p4_client: {e}")
+    except Exception as e:
+        failures.append(f"get_p4_client: {type(e).__name__}: {e}")
+
+    # Commands on a traced connection, with and without a handler, must reach P4Python and fail there
+    p4 = tracing.traced(P4.P4)()
+    p4.port = UNREACHABLE_PORT
+    p4.track = True
+    for kwargs in ({}, {"handler": P4.OutputHandler()}):
+        try:
+            p4.run("files", "//depot/...", **kwargs)
+            failures.append("a command succeeded without a connection")
+        except P4.P4Exception:
+            pass
+        except Exception as e:
+            failures.append(f"run({', '.join(kwargs)}): {type(e).__name__}: {e}")
+
+    spans = [span["name"] for span in tracing._tracer.spans]
+    if spans.count("run_files") != 2:
+        failures.append(f"expected two traced run_files spans, got {spans}")
+    tracing.finish()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print("P4Python checks passed")
+
+
+if __name__ == "__main__":
+    main()
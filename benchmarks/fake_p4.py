@@ -0,0 +1,650 @@
+"""
+Local stand-in for a Helix Core server, used by the benchmarks.
+
+This module mimics the parts of the P4Python 'P4' module that the tools use. Installing it with install()
+replaces 'P4' in sys.modules, so the real tool code runs unchanged against a scripted in-process server.
+Every command costs a fixed round-trip latency, and file transfers are throttled to a per-connection
+bandwidth, which makes concurrency effects measurable without a real p4d.
+"""
+
+import bisect
+import contextlib
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import shlex
+import sys
+import threading
+import time
+
+
+class P4Exception(Exception):
+    """Raised by the fake server for errors, like P4.P4Exception."""
+
+
+class OutputHandler:
+    """Base class for output handlers, like P4.OutputHandler."""
+    REPORT = 0
+    HANDLED = 1
+    CANCEL = 2
+
+    def outputText(self, s):
+        return OutputHandler.REPORT
+
+    def outputBinary(self, b):
+        return OutputHandler.REPORT
+
+    def outputStat(self, h):
+        return OutputHandler.REPORT
+
+    def outputInfo(self, i):
+        return OutputHandler.REPORT
+
+    def outputMessage(self, e):
+        return OutputHandler.REPORT
+
+
+def _check_handler(handler):
+    """
+    Reject output handlers that P4.P4 would reject, which must be P4.OutputHandler instances.
+    """
+    if handler is not None and not isinstance(handler, OutputHandler):
+        raise TypeError("Handler must be an instance of P4.OutputHandler")
+
+
+class FakeServer:
+    """
+    Scripted server state shared by every FakeP4 connection.
+    """
+
+    def __init__(self, latency=0.002, bandwidth=50 * 1024 * 1024, parallel_max=0, compress_ratio=1.0,
+                 compress_rate=None):
+        """
+        Args:
+            latency (float): Seconds added to every command, simulating a network round trip
+            bandwidth (float): Bytes per second one connection can transfer
+            parallel_max (int): The value reported for net.parallel.max (0 disables server-side parallel sync)
+            compress_ratio (float): Size of file content after compression relative to its size, for clients
+                with the 'compress' option (1.0 for content that is already compressed)
+            compress_rate (float): Bytes per second compression and decompression can process, or None to
+                make compression free
+
+        Set keep_have to False to not record have lists, so that the server's memory use does not grow with the
+        number of files synced. Add tickets to revoked_tickets to simulate 'p4 logout' on the server, and set
+        max_results to make 'p4 files' fail like a server with a MaxResults limit.
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.parallel_max = parallel_max
+        self.compress_ratio = compress_ratio
+        self.compress_rate = compress_rate
+        self.tunables = {}
+        self.files = {}
+        self._index = None
+        self._view_maps = {}
+        self.depots = []
+        self.streams = []
+        self.clients = {}
+        self.have = {}
+        self.deleted = set()
+        self.head_change = 100
+        self.change_log = []
+        self._changes_by_number = {}
+        self.logins = 0
+        self.revoked_tickets = set()
+        self.max_results = None
+        self.listed_bytes = 0
+        self.fail_after_syncs = None
+        self.write_files = False
+        self.keep_have = True
+        self.lock = threading.Lock()
+
+    def add_stream(self, stream_path, dirs=4, depth=2, files_per_dir=20, file_size=64 * 1024):
+        """
+        Generate a synthetic stream with a regular directory tree.
+
+        Args:
+            stream_path (str): Depot path of the stream, e.g. '//bench/main'
+            dirs (int): Subdirectories per directory
+            depth (int): Depth of the directory tree
+            files_per_dir (int): Files in every directory, including the root
+            file_size (int): Size of every file in bytes
+        """
+        depot = stream_path.split('/')[2]
+        if not any(d['name'] == depot for d in self.depots):
+            self.depots.append({'name': depot, 'type': 'stream', 'desc': f'Synthetic depot {depot}'})
+        self.streams.append({'Stream': stream_path, 'Type': 'mainline', 'Description': 'Synthetic stream'})
+
+        def populate(path, level):
+            for i in range(files_per_dir):
+                self.files[f"{path}/file{i}.bin"] = file_size
+            if level < depth:
+                for i in range(dirs):
+                    populate(f"{path}/dir{i}", level + 1)
+
+        populate(stream_path, 0)
+        self._index = None
+
+    def add_history(self, stream_path, count, files_per_change=5, users=8, interval=600):
+        """
+        Generate a synthetic changelist history touching the existing files of a stream.
+
+        Changes are numbered after head_change, which is moved to the last of them, and are submitted every
+        interval seconds up to the current time.
+
+        Args:
+            stream_path (str): Depot path of the stream, e.g. '//bench/main'
+            count (int): Number of changes
+            files_per_change (int): Files edited by every change
+            users (int): Number of distinct users submitting the changes
+            interval (int): Seconds between two changes
+        """
+        files = self.under(stream_path + '/')
+        now = int(time.time())
+        for i in range(count):
+            self.head_change += 1
+            user = f"user{i % users}"
+            change = {'change': self.head_change, 'user': user, 'client': f"{user}_ws",
+                      'time': now - (count - i) * interval,
+                      'desc': f"Change {i} to {stream_path}\n\nSynthetic history entry.\n",
+                      'files': [files[(i * files_per_change + j) % len(files)] for j in range(files_per_change)]}
+            self.change_log.append(change)
+            self._changes_by_number[self.head_change] = change
+
+    def add_stream_specs(self, depot, count, description_size=200):
+        """
+        Generate stream specs without files, as found on depots with many task streams.
+
+        Args:
+            depot (str): The stream depot
+            count (int): Number of development streams, all children of //<depot>/main
+            description_size (int): Length of every stream description
+        """
+        if not any(d['name'] == depot for d in self.depots):
+            self.depots.append({'name': depot, 'type': 'stream', 'desc': f'Synthetic depot {depot}'})
+        for i in range(count):
+            name = 'main' if i == 0 else f"task-{i:06d}"
+            self.streams.append({
+                'Stream': f"//{depot}/{name}", 'Update': '2024/01/01 00:00:00', 'Access': '2024/01/01 00:00:00',
+                'Owner': 'bench', 'Name': name, 'Parent': 'none' if i == 0 else f"//{depot}/main",
+                'Type': 'mainline' if i == 0 else 'task', 'Description': 'x' * description_size,
+                'Options': 'allsubmit unlocked toparent fromparent mergedown', 'ParentView': 'inherit',
+                'baseParent': 'none', 'firstIsChild': '0', 'changeFlowsToParent': 'true',
+                'changeFlowsFromParent': 'true',
+            })
+
+    def content(self, depot_file):
+        """
+        Get the synthetic content of a file: its depot path repeated up to the file size.
+        """
+        seed = depot_file.encode('utf-8')
+        size = self.files[depot_file]
+        return (seed * (size // len(seed) + 1))[:size]
+
+    def digest(self, depot_file):
+        return hashlib.md5(self.content(depot_file)).hexdigest().upper()
+
+    def view_map(self, client_name):
+        """
+        Map the depot files of a classic client to their paths relative to the client root.
+
+        The view lines are applied in order, later lines overriding earlier ones, as the server does.
+        """
+        client = self.clients[client_name]
+        key = (tuple(client['View']), len(self.files))
+        cached = self._view_maps.get(client_name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        lines = []
+        for line in client['View']:
+            negative = line.startswith('-')
+            depot_side, client_side = shlex.split(line.lstrip('-+&'))
+            parts = re.split(r'(\.\.\.|\*)', client_side[len(f"//{client_name}/"):])
+            lines.append((negative, _wildcard(depot_side), parts))
+
+        mapping = {}
+        for f in self.files:
+            for negative, pattern, parts in reversed(lines):
+                match = pattern.fullmatch(f)
+                if match:
+                    if not negative:
+                        groups = iter(match.groups())
+                        mapping[f] = "".join(next(groups) if part in ('...', '*') else part for part in parts)
+                    break
+        self._view_maps[client_name] = (key, mapping)
+        return mapping
+
+    def client_path(self, client_name, depot_file):
+        """
+        Get the path of a depot file relative to a client's root, or None if the client does not map it.
+        """
+        client = self.clients.get(client_name)
+        if client is None:
+            return None
+        if 'View' in client:
+            return self.view_map(client_name).get(depot_file)
+        prefix = client['Stream'] + '/'
+        return depot_file[len(prefix):] if depot_file.startswith(prefix) else None
+
+    def local_path(self, client_name, depot_file):
+        """
+        Get the local path a depot file is synced to by a client.
+        """
+        relative = self.client_path(client_name, depot_file)
+        return os.path.join(self.clients[client_name]['Root'], *relative.split('/'))
+
+    def resolve(self, spec):
+        """
+        Translate a client-syntax file spec into depot syntax.
+        """
+        if spec.startswith('//'):
+            name, _, rest = spec[2:].partition('/')
+            if name in self.clients:
+                root = self.clients[name]['Stream']
+                return f"{root}/{rest}" if rest else root
+        return spec
+
+    def under(self, prefix):
+        """
+        List the depot files starting with a prefix, in sorted order.
+
+        Uses a sorted index of the file paths, so queries stay fast on streams with millions of files.
+        """
+        if self._index is None or len(self._index) != len(self.files):
+            self._index = sorted(self.files)
+        start = bisect.bisect_left(self._index, prefix)
+        end = bisect.bisect_left(self._index, prefix + '\U0010ffff', start)
+        return self._index[start:end]
+
+    def classic_client(self, spec):
+        """
+        Get the name of the classic client a client-syntax spec refers to, or None.
+        """
+        name = spec[2:].partition('/')[0] if spec.startswith('//') else None
+        return name if name in self.clients and 'View' in self.clients[name] else None
+
+    def delete(self, depot_file):
+        """
+        Submit the deletion of a file. Its head revision is then deleted: it is no longer listed, and syncing it
+        removes it from the have lists and workspaces of the clients that have it.
+        """
+        self.deleted.add(depot_file)
+        self.head_change += 1
+
+    def match(self, spec, client_name=None, include_deleted=False):
+        """
+        List the depot files matching a spec ending in '/...', '*' or naming one file.
+
+        Files outside the view of client_name, if it is a classic client, are left out, and so are deleted
+        files unless include_deleted is set.
+        """
+        spec = spec.split('@')[0].split('#')[0]
+        classic = self.classic_client(spec)
+        if classic is not None:
+            pattern = _wildcard(spec[len(f"//{classic}/"):])
+            files = sorted(f for f, relative in self.view_map(classic).items() if pattern.fullmatch(relative))
+            return files if include_deleted else [f for f in files if f not in self.deleted]
+
+        spec = self.resolve(spec)
+        if spec.endswith('/...'):
+            files = self.under(spec[:-3])
+        elif spec.endswith('*'):
+            prefix = spec[:-1]
+            files = [f for f in self.under(prefix) if '/' not in f[len(prefix):]]
+        else:
+            files = [spec] if spec in self.files else []
+        if client_name in self.clients and 'View' in self.clients[client_name]:
+            mapped = self.view_map(client_name)
+            files = [f for f in files if f in mapped]
+        if self.deleted and not include_deleted:
+            files = [f for f in files if f not in self.deleted]
+        return files
+
+
+def _wildcard(pattern):
+    """
+    Compile a path with Perforce wildcards into a regular expression with one group per wildcard.
+    """
+    parts = re.split(r'(\.\.\.|\*)', pattern)
+    return re.compile("".join('(.*)' if part == '...' else '([^/]*)' if part == '*' else re.escape(part)
+                              for part in parts))
+
+
+SERVER = FakeServer()
+
+
+class P4:
+    """
+    A connection to the fake server, mimicking P4.P4.
+    """
+    RAISE_NONE = 0
+    RAISE_ERRORS = 1
+    RAISE_ALL = 2
+
+    # The attributes P4.P4 lets callers set; like P4.P4, the stand-in rejects any other attribute
+    SETTABLE = frozenset({'port', 'user', 'password', 'client', 'handler', 'exception_level', 'input', 'track',
+                          'prog', 'charset', 'tagged', 'cwd', 'host', 'ticket_file', 'api_level', 'progress',
+                          'streams', 'encoding', 'logger'})
+
+    def __init__(self):
+        self.port = 'fake:1666'
+        self.user = 'bench'
+        self.password = ''
+        self.client = 'fake_client'
+        self.handler = None
+        self.exception_level = P4.RAISE_ALL
+        self.input = None
+        self.track = False
+        object.__setattr__(self, 'warnings', [])
+        object.__setattr__(self, 'errors', [])
+        object.__setattr__(self, 'track_output', [])
+        object.__setattr__(self, '_connected', False)
+
+    def __setattr__(self, name, value):
+        if name not in P4.SETTABLE:
+            raise AttributeError(f"Cannot set attribute : {name} with value {value}")
+        if name == 'handler':
+            _check_handler(value)
+        object.__setattr__(self, name, value)
+
+    def connect(self):
+        time.sleep(SERVER.latency)
+        object.__setattr__(self, '_connected', True)
+        return self
+
+    def disconnect(self):
+        object.__setattr__(self, '_connected', False)
+
+    def connected(self):
+        return self._connected
+
+    @contextlib.contextmanager
+    def at_exception_level(self, level):
+        previous, self.exception_level = self.exception_level, level
+        try:
+            yield
+        finally:
+            self.exception_level = previous
+
+    def set_tunable(self, name, value):
+        # Tunables are global to the process in P4Python as well
+        if not name.startswith(('net.', 'filesys.', 'sys.', 'rpc.')):
+            raise TypeError(f"Unknown tunable '{name}'")
+        SERVER.tunables[name] = value
+
+    def get_tunable(self, name):
+        return SERVER.tunables.get(name, 0)
+
+    def __getattr__(self, name):
+        if name.startswith('run_'):
+            return lambda *args, **kwargs: self.run(name[len('run_'):], *args, **kwargs)
+        if name.startswith('save_'):
+            return lambda spec, **kwargs: self.run(name[len('save_'):], '-i', spec, **kwargs)
+        if name.startswith('delete_'):
+            return lambda *args, **kwargs: self.run(name[len('delete_'):], '-d', *args, **kwargs)
+        if name.startswith('fetch_'):
+            return lambda *args, **kwargs: self.run(name[len('fetch_'):], '-o', *args, **kwargs)[0]
+        raise AttributeError(name)
+
+    def _warn(self, message):
+        if self.exception_level >= P4.RAISE_ALL:
+            raise P4Exception(f"[Warning]: {message}")
+
+    def _listing(self, records, args):
+        """
+        Apply the -F filter and -T field selection of a listing command and charge its transfer time.
+        """
+        args = list(args)
+        if '-F' in args:
+            field, _, wildcard = args[args.index('-F') + 1].partition('=')
+            records = [r for r in records if fnmatch.fnmatchcase(r.get(field, ''), wildcard)]
+        if '-T' in args:
+            fields = args[args.index('-T') + 1].split(',')
+            records = [{k: v for k, v in r.items() if k in fields} for r in records]
+        SERVER.listed_bytes += len(json.dumps(records))
+        time.sleep(len(json.dumps(records)) / SERVER.bandwidth)
+        return records
+
+    def _emit(self, records, handler):
+        if handler is None:
+            return list(records)
+        for record in records:
+            handler.outputStat(record)
+        return []
+
+    def run(self, cmd, *args, handler=None):
+        if not self._connected:
+            raise P4Exception("Not connected to a Perforce server")
+        _check_handler(handler)
+        handler = handler or self.handler
+        time.sleep(SERVER.latency)
+        flat = [a for a in args if isinstance(a, str)]
+
+        if cmd == 'login':
+            if '-s' in flat:
+                if self.password in SERVER.revoked_tickets:
+                    raise P4Exception("[Error]: Your session has expired, please login again.")
+                return [{'User': self.user, 'TicketExpiration': '43200'}]
+            with SERVER.lock:
+                SERVER.logins += 1
+            return [{'TicketExpiration': '43200', 'user': self.user}, f"TICKET{SERVER.logins:028d}"]
+        if cmd == 'info':
+            return [{'userName': self.user, 'serverAddress': self.port, 'caseHandling': 'sensitive'}]
+        if cmd == 'files':
+            files = sorted(SERVER.match(flat[-1], self.client))
+            if not files:
+                self._warn(f"{flat[-1]} - no such file(s).")
+            if '-m' in flat:
+                files = files[:int(flat[flat.index('-m') + 1])]
+            if SERVER.max_results and len(files) > SERVER.max_results:
+                raise P4Exception(f"[Error]: Request too large (over {SERVER.max_results}); see 'p4 help maxresults'.")
+            return [{'depotFile': f, 'rev': '1', 'change': str(SERVER.head_change), 'action': 'add',
+                     'type': 'binary', 'time': '1700000000'} for f in files]
+        if cmd == 'counter':
+            return [{'counter': flat[-1], 'value': str(SERVER.head_change) if flat[-1] == 'change' else '0'}]
+        if cmd == 'configure':
+            return [{'Type': 'configure', 'Name': 'net.parallel.max', 'Value': str(SERVER.parallel_max)}]
+        if cmd == 'depots':
+            depots = SERVER.depots
+            if '-e' in flat:
+                depots = [d for d in depots if fnmatch.fnmatchcase(d['name'], flat[flat.index('-e') + 1])]
+            return self._listing(depots, flat)
+        if cmd == 'streams':
+            prefix = flat[-1][:-3] if flat and flat[-1].startswith('//') else '//'
+            return self._listing([s for s in SERVER.streams if s['Stream'].startswith(prefix)], flat)
+        if cmd == 'clients':
+            pattern = flat[flat.index('-e') + 1] if '-e' in flat else '*'
+            return [{'client': name, 'Update': spec['Update'], 'Access': spec['Access'],
+                     'Owner': spec.get('Owner', self.user), 'Host': spec.get('Host', '')}
+                    for name, spec in SERVER.clients.items() if fnmatch.fnmatchcase(name, pattern)]
+        if cmd == 'changes':
+            if not SERVER.change_log:
+                return [{'change': str(SERVER.head_change), 'user': self.user}] if SERVER.files else []
+            return self._changes(flat)
+        if cmd == 'describe':
+            records = []
+            for number in (int(a) for a in flat if a.isdigit()):
+                change = SERVER._changes_by_number[number]
+                records.append({'change': str(number), 'user': change['user'], 'client': change['client'],
+                                'time': str(change['time']), 'desc': change['desc'], 'status': 'submitted',
+                                'depotFile': list(change['files']), 'action': ['edit'] * len(change['files']),
+                                'rev': ['2'] * len(change['files']), 'type': ['text'] * len(change['files'])})
+            return self._listing(records, [])
+        if cmd == 'fstat':
+            records = []
+            specs = [a for a in flat if a.startswith('//')]
+            have = SERVER.have.get(self.client, set())
+            # '#have' selects the synced revisions, including those of files deleted at head since
+            files = {f for spec in specs for f in SERVER.match(spec, self.client, include_deleted=True)
+                     if (f in have if spec.endswith('#have') else f not in SERVER.deleted)}
+            for f in sorted(files):
+                relative = SERVER.client_path(self.client, f) or f
+                records.append({'depotFile': f, 'clientFile': f"//{self.client}/{relative}", 'headType': 'binary',
+                                'headAction': 'add', 'headRev': '1', 'headChange': str(SERVER.head_change),
+                                'headModTime': '1700000000', 'digest': SERVER.digest(f),
+                                'fileSize': str(SERVER.files[f])})
+            return self._emit(records, handler)
+        if cmd == 'clean':
+            return []
+        if cmd == 'client':
+            if '-i' in args:
+                spec = args[-1]
+                now = str(int(time.time()))
+                SERVER.clients[spec['Client']] = dict(spec, Update=now, Access=now)
+                return [f"Client {spec['Client']} saved."]
+            if '-d' in args:
+                SERVER.clients.pop(flat[-1], None)
+                SERVER.have.pop(flat[-1], None)
+                return [f"Client {flat[-1]} deleted."]
+            if '-S' in flat:
+                stream = flat[flat.index('-S') + 1]
+                return [{'Client': flat[-1], 'Stream': stream, 'View': [f"{stream}/... //{flat[-1]}/..."]}]
+            return [SERVER.clients.get(flat[-1], {'Client': flat[-1]})]
+        if cmd == 'dirs':
+            # The stand-in keeps no file history, so a revision selects the head state
+            spec = flat[-1].split('@')[0].split('#')[0]
+            if '-H' in flat:
+                # Only directories with files on the client's have list, whether or not they are deleted
+                have = SERVER.have.get(self.client, set())
+                listed = lambda f: f in have
+            else:
+                listed = lambda f: f not in SERVER.deleted
+            classic = SERVER.classic_client(spec)
+            if classic is not None:
+                # Report the directories in client syntax, which the tools pass back unchanged
+                prefix = spec[:-1]
+                relative_prefix = prefix[len(f"//{classic}/"):]
+                paths = [prefix + relative[len(relative_prefix):] for f, relative in SERVER.view_map(classic).items()
+                         if relative.startswith(relative_prefix) and listed(f)]
+            else:
+                prefix = SERVER.resolve(spec)[:-1]
+                paths = [f for f in SERVER.under(prefix) if listed(f)]
+            dirs = sorted({prefix + f[len(prefix):].split('/')[0] for f in paths if '/' in f[len(prefix):]})
+            if not dirs:
+                self._warn(f"{flat[-1]} - no such file(s).")
+            return [{'dir': d} for d in dirs]
+        if cmd == 'sync':
+            return self._sync(flat, handler)
+        raise P4Exception(f"Unknown command: {cmd}")
+
+    def _changes(self, args):
+        """
+        List the submitted changes of the change log touching a path, newest first, as 'p4 changes' does.
+        """
+        path, _, revision = args[-1].partition('@')
+        prefix = SERVER.resolve(path)[:-3]
+        low, high = 1, float('inf')
+        if revision:
+            first, _, last = revision.partition(',')
+            low = int(first)
+            if last and last.lstrip('@') != 'now':
+                high = int(last.lstrip('@'))
+        limit = int(args[args.index('-m') + 1]) if '-m' in args else None
+        records = []
+        for change in reversed(SERVER.change_log):
+            if change['change'] > high:
+                continue
+            if change['change'] < low or (limit and len(records) >= limit):
+                break
+            if any(f.startswith(prefix) for f in change['files']):
+                desc = change['desc'] if '-l' in args else change['desc'][:31]
+                records.append({'change': str(change['change']), 'user': change['user'], 'client': change['client'],
+                                'time': str(change['time']), 'desc': desc, 'status': 'submitted',
+                                'changeType': 'public'})
+        return self._listing(records, [])
+
+    def _sync(self, args, handler):
+        specs = [a for a in args if a.startswith('//')] or [f"//{self.client}/..."]
+        threads = 1
+        for a in args:
+            if a.startswith('threads='):
+                threads = max(1, min(int(a.split(',')[0].split('=')[1]), SERVER.parallel_max))
+        with SERVER.lock:
+            have = SERVER.have.setdefault(self.client, set())
+        if any(spec.endswith('#none') for spec in specs):
+            have.difference_update(f for spec in specs
+                                   for f in SERVER.match(spec[:-len('#none')], self.client, include_deleted=True))
+            return []
+        if SERVER.fail_after_syncs is not None and '-n' not in args:
+            if SERVER.fail_after_syncs <= 0:
+                raise P4Exception("[Error]: Connection dropped (simulated).")
+            SERVER.fail_after_syncs -= 1
+        matched = sorted(f for spec in specs for f in SERVER.match(spec, self.client))
+        # Files on the have list whose head revision is deleted are removed from the workspace
+        gone = sorted({f for spec in specs for f in SERVER.match(spec, self.client, include_deleted=True)
+                       if f in SERVER.deleted and f in have}) if SERVER.deleted else []
+        if not matched and not gone:
+            self._warn(f"{specs[0]} - no such file(s).")
+            return []
+        files = matched if '-f' in args else [f for f in matched if f not in have]
+        removals = [{'depotFile': f, 'clientFile': f, 'rev': '2', 'action': 'deleted'} for f in gone]
+        if '-n' in args:
+            # Preview: report the files that would be updated without changing anything
+            return self._emit([{'depotFile': f, 'clientFile': f, 'rev': '1', 'action': 'added',
+                                'fileSize': str(SERVER.files[f])} for f in files] + removals, handler)
+        if SERVER.keep_have:
+            have.update(files)
+        have.difference_update(gone)
+        if not files and not gone:
+            self._warn(f"{specs[0]} - file(s) up-to-date.")
+            return []
+        if '-k' in args:
+            return self._emit([{'depotFile': f, 'clientFile': f, 'rev': '1', 'action': 'updated'} for f in files]
+                              + removals, handler)
+        if SERVER.write_files:
+            for f in gone:
+                path = SERVER.local_path(self.client, f)
+                if os.path.exists(path):
+                    os.remove(path)
+        total = sum(SERVER.files[f] for f in files)
+        if 'compress' in SERVER.clients.get(self.client, {}).get('Options', '').split():
+            time.sleep(total * SERVER.compress_ratio / (SERVER.bandwidth * threads)
+                       + (total / SERVER.compress_rate if SERVER.compress_rate else 0))
+        else:
+            time.sleep(total / (SERVER.bandwidth * threads))
+        if SERVER.write_files:
+            self._write(files)
+
+        def records():
+            # Generated one at a time, so a handler sees the records without the whole result being built
+            for i, f in enumerate(files):
+                record = {'depotFile': f, 'clientFile': f, 'rev': '1', 'action': 'added',
+                          'fileSize': str(SERVER.files[f])}
+                if i == 0:
+                    record.update({'totalFileSize': str(total), 'totalFileCount': str(len(files))})
+                yield record
+            yield from removals
+
+        return self._emit(records(), handler)
+
+
+    def _write(self, files):
+        writable = 'allwrite' in SERVER.clients[self.client].get('Options', '').split()
+        for f in files:
+            path = SERVER.local_path(self.client, f)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                os.remove(path)
+            with open(path, 'wb') as out:
+                out.write(SERVER.content(f))
+            os.chmod(path, 0o644 if writable else 0o444)
+            os.utime(path, (1700000000, 1700000000))
+
+
+def install(server=None):
+    """
+    Replace the 'P4' module with this stand-in.
+
+    Must be called before any perforce_tools module that imports P4.
+
+    Args:
+        server (FakeServer): Optional server state to use instead of the default
+    """
+    global SERVER
+    if server is not None:
+        SERVER = server
+    sys.modules['P4'] = sys.modules[__name__]
+    return SERVER
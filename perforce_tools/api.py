@@ -0,0 +1,394 @@
+"""
+Python API for Perforce Helix Core Python Tools.
+
+The phc commands print their results and exit with a status code. This module offers the same operations as
+functions that return structured results and raise exceptions, for programs that embed the tools; the
+commands are thin wrappers over it.
+
+Every operation has a blocking form, e.g. list_depots(), and an asyncio form with an '_async' suffix, e.g.
+list_depots_async(). The asyncio forms run the blocking P4Python calls on the bounded thread pool of a
+Session, so the event loop is never blocked. A Session also keeps one pool of connections per profile, shared
+by all of its calls under one connection limit, so consecutive calls for a profile reuse a connection
+instead of connecting and authenticating again. The asyncio forms use a default session, created on first
+use, unless one is passed; close() closes it. The blocking forms connect for every call unless a session is
+passed.
+
+Errors are raised rather than printed: ValueError for invalid arguments, unknown profiles and failed
+connections, and P4.P4Exception for errors reported by the server.
+
+Example:
+    import asyncio
+    from perforce_tools import api
+
+    async def main():
+        async with api.Session(max_workers=4) as session:
+            depots, streams = await asyncio.gather(
+                api.list_depots_async("dev", session=session),
+                api.list_streams_async("dev", "project-x", session=session))
+            result = await api.sync_stream_async("dev", "project-x", "main", "/builds/main", parallel=4,
+                                                 session=session)
+            print(result["files"], result["bytes"])
+
+    asyncio.run(main())
+"""
+
+import asyncio
+import functools
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from perforce_tools.config import get_p4_client, get_profile, get_tuning, normalize_tuning, p4_connection
+from perforce_tools.connection_pool import ConnectionBudget, ConnectionPool, ProfilePools
+from perforce_tools.metadata_cache import cached_run, describe_source
+from perforce_tools.server_filters import depots_query, streams_query
+
+# Threads of a session running blocking calls
+DEFAULT_WORKERS = 8
+
+# Connections a session keeps open at most, across all profiles
+DEFAULT_CONNECTIONS = 8
+
+# The session used by the asyncio functions when none is passed
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+class Session:
+    """
+    A bounded thread pool for blocking calls, and connection pools per profile shared by its calls.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, max_connections=DEFAULT_CONNECTIONS):
+        """
+        Args:
+            max_workers (int): Number of threads running blocking calls; further calls wait for a free thread
+            max_connections (int): Maximum number of server connections open at the same time, across all
+                profiles; idle connections of other profiles are closed to make room
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="phc-api")
+        self._pools = ProfilePools(ConnectionBudget(max_connections),
+                                   lambda profile: get_p4_client(profile, direct=True))
+        self.closed = False
+
+    def pool(self, profile):
+        """
+        Get the connection pool of a profile.
+
+        Args:
+            profile (str): The profile name
+
+        Returns:
+            ConnectionPool: The pool, created on first use
+        """
+        return self._pools.get(profile)
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Run a blocking function on the session's thread pool.
+
+        Args:
+            function (callable): The function to run
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            The function's return value
+        """
+        if self.closed:
+            raise ValueError("The session is closed")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    def close(self):
+        """
+        Wait for running calls to finish and disconnect every pooled connection.
+        """
+        self.closed = True
+        self._executor.shutdown(wait=True)
+        self._pools.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+def default_session():
+    """
+    Get the session used by the asyncio functions when none is passed, creating it on first use.
+
+    Returns:
+        Session: The default session
+    """
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None or _default_session.closed:
+            _default_session = Session()
+        return _default_session
+
+
+def close():
+    """
+    Close the default session, if it was created.
+    """
+    global _default_session
+    with _default_session_lock:
+        session, _default_session = _default_session, None
+    if session is not None:
+        session.close()
+
+
+async def _run_async(session, function, *args, **kwargs):
+    session = session or default_session()
+    return await session.run(function, *args, session=session, **kwargs)
+
+
+def _pool(session, profile):
+    return session.pool(profile) if session is not None else None
+
+
+def _discard(message):
+    pass
+
+
+def list_depots(profile, pattern=None, refresh=False, offline=False, session=None):
+    """
+    List the depots on the server of a profile.
+
+    Results are answered from the metadata cache while no changelist has been submitted on the server.
+
+    Args:
+        profile (str): The profile name
+        pattern (str): Optional regex pattern the depot names must match (re.search)
+        refresh (bool): Ignore cached results and ask the server
+        offline (bool): Only use cached results, without contacting the server
+        session (Session): Optional session whose connections are used
+
+    Returns:
+        dict: 'profile'; 'depots', the 'p4 depots' records; 'age', the seconds since they were fetched from the
+              server, or None if they were just fetched; and 'source', a message describing where they came from
+    """
+    if refresh and offline:
+        raise ValueError("--refresh and --offline cannot be used together")
+    profile_data = get_profile(profile)
+    depots, age = cached_run(profile, depots_query(pattern), refresh=refresh, offline=offline,
+                             pool=_pool(session, profile))
+    if pattern:
+        depots = [depot for depot in depots if re.search(pattern, depot["name"])]
+    return {'profile': profile, 'depots': depots, 'age': age, 'source': describe_source(profile_data, age)}
+
+
+def list_streams(profile, depot, pattern=None, refresh=False, offline=False, session=None):
+    """
+    List the streams of a depot on the server of a profile.
+
+    Results are answered from the metadata cache while no changelist has been submitted on the server.
+
+    Args:
+        profile (str): The profile name
+        depot (str): The depot name
+        pattern (str): Optional regex pattern the stream paths must match (re.search)
+        refresh (bool): Ignore cached results and ask the server
+        offline (bool): Only use cached results, without contacting the server
+        session (Session): Optional session whose connections are used
+
+    Returns:
+        dict: 'profile', 'depot'; 'streams', the 'p4 streams' records with the fields phc displays; and 'age'
+              and 'source', as for list_depots()
+    """
+    if refresh and offline:
+        raise ValueError("--refresh and --offline cannot be used together")
+    profile_data = get_profile(profile)
+    streams, age = cached_run(profile, streams_query(depot, pattern), refresh=refresh, offline=offline,
+                              pool=_pool(session, profile))
+    if pattern:
+        streams = [stream for stream in streams if re.search(pattern, stream["Stream"])]
+    return {'profile': profile, 'depot': depot, 'streams': streams, 'age': age,
+            'source': describe_source(profile_data, age)}
+
+
+def list_files(profile, depot, stream, path=None, include_deleted=False, session=None, echo=None):
+    """
+    List the files in a stream, one directory at a time.
+
+    The connection is held until the returned generator is exhausted or closed.
+
+    Args:
+        profile (str): The profile name
+        depot (str): The depot name
+        stream (str): The stream name
+        path (str): Only list files below this directory of the stream
+        include_deleted (bool): Also list files whose head revision is deleted
+        session (Session): Optional session whose connections are used
+        echo (callable): Optional function called with status messages
+
+    Yields:
+        dict: One 'p4 files' record per file
+    """
+    from perforce_tools.list_files import iter_files
+
+    echo = echo or _discard
+    root = f"//{depot}/{stream}"
+    if path:
+        root = f"{root}/{path.strip('/')}"
+
+    with p4_connection(profile, pool=_pool(session, profile)) as p4:
+        echo(f"Connected to {p4.port} as {p4.user}")
+        echo(f"Listing files in '{root}'...")
+        yield from iter_files(p4, root, include_deleted)
+
+
+def sync_stream(profile, depot, stream, workspace_path, force=False, writable=False, parallel=None,
+                incremental=False, reconcile=False, resume=False, cache_dir=None, cache_size=10240, client_pool=False,
+                include=(), exclude=(), at=None, watch=False, poll_interval=None, debounce=None, stop=None,
+                progress_interval=5.0, tuning=None, session=None, echo=None):
+    """
+    Sync a stream to a local workspace path.
+
+    The options have the meaning of the sync-stream options of the same names.
+
+    Args:
+        profile (str): The profile name
+        depot (str): The depot name
+        stream (str): The stream name
+        workspace_path (str): The local workspace path
+        force (bool): Clear a non-empty workspace directory, or with incremental, sync over it
+        writable (bool): Make synced files writable
+        parallel (int): Number of parallel transfer threads; by default the profile tuning's
+        incremental (bool): Keep a persistent client workspace, so later syncs only transfer changed files
+        reconcile (bool): With incremental, restore files modified or deleted outside of Perforce
+        resume (bool): Continue an interrupted sync into the workspace path from its checkpoint
+        cache_dir (str): Optional directory of a local content cache
+        cache_size (int): Maximum size of the content cache in MB
+        client_pool (bool): Lease a client workspace from the pool of this host
+        include (list): Paths of the stream to sync, relative to the stream root
+        exclude (list): Paths of the stream not to sync, relative to the stream root
+        at (str): Changelist number or label to sync to instead of the latest change
+        watch (bool): After the sync, keep the workspace up to date until stop is set or the call is interrupted
+        poll_interval (float): With watch, seconds between two checks for new changes
+        debounce (float): With watch, seconds without a newer change before a new change is synced
+        stop (threading.Event): With watch, an event that ends the watch when set
+        progress_interval (float): Seconds between progress messages while syncing (0 disables them)
+        tuning (dict): Transfer tuning settings to use instead of the profile's (see config.TUNING_DEFAULTS);
+            the sync then connects directly rather than through the session
+        session (Session): Optional session whose connections are used, including by parallel workers
+        echo (callable): Optional function called with status messages, from the thread running the sync
+
+    Returns:
+        dict: 'profile', 'stream', 'workspace_path', the 'files', 'bytes' and 'seconds' of the sync (of the
+              initial sync, with watch), and the 'cached_files' and 'cached_bytes' taken from the content cache
+    """
+    from perforce_tools.clients import view_filter
+    from perforce_tools.sync_journal import SyncJournal
+    from perforce_tools.sync_stream import prepare_workspace, sync_stream as run_sync
+    from perforce_tools.sync_watch import DEBOUNCE, POLL_INTERVAL
+
+    echo = echo or _discard
+    if reconcile and not incremental:
+        raise ValueError("--reconcile requires --incremental")
+    if client_pool and incremental:
+        raise ValueError("--client-pool cannot be combined with --incremental")
+    include = view_filter(include)
+    exclude = view_filter(exclude)
+    if watch and at:
+        raise ValueError("--watch cannot be combined with --at")
+    if at is not None:
+        at = str(at).lstrip('@')
+        if not at:
+            raise ValueError("--at requires a changelist number or label")
+
+    # Construct the full stream path
+    stream_path = f"//{depot}/{stream}"
+
+    journal = None
+    if resume:
+        if force:
+            raise ValueError("--resume cannot be combined with --force")
+        journal = SyncJournal.load(workspace_path)
+        if journal is None or not journal.matches(profile, stream_path):
+            raise ValueError(f"No interrupted sync of '{stream_path}' with profile '{profile}' found "
+                             f"for workspace '{workspace_path}'")
+        # The interrupted sync's paths and change are used; options that contradict them are an error
+        if ((include or exclude) and (include, exclude) != (journal.include, journal.exclude)
+                or (at and at != journal.change)):
+            raise ValueError("--include, --exclude and --at must match the interrupted sync when resuming")
+        include, exclude = journal.include, journal.exclude
+
+    # Validate workspace path
+    # An incremental sync overwrites the existing contents instead and removes extra files afterwards
+    overwrite = force and incremental
+    cleared = prepare_workspace(workspace_path, force and not overwrite, keep_contents=incremental or resume,
+                                echo=echo)
+
+    # The session's connections were made with the profile's tunables
+    if tuning is not None:
+        tuning = normalize_tuning(tuning)
+        session = None
+    else:
+        tuning = get_tuning(profile)
+    parallel = parallel or tuning['parallel']
+
+    start = time.monotonic()
+    if session is not None:
+        pool = session.pool(profile)
+    else:
+        # Additional parallel workers open their own connections
+        pool = ConnectionPool(lambda: get_p4_client(profile, direct=True, tuning=tuning), max(1, parallel - 1))
+    try:
+        with p4_connection(profile, direct=True, pool=_pool(session, profile), tuning=tuning) as p4:
+            echo(f"Connected to {p4.port} as {p4.user}")
+            stats = run_sync(p4, pool, profile, stream_path, workspace_path, echo=echo, writable=writable,
+                             parallel=parallel, progress_interval=progress_interval, incremental=incremental,
+                             reconcile=reconcile, journal=journal, cleared=cleared, cache_dir=cache_dir,
+                             cache_size=cache_size, overwrite=overwrite, client_pool=client_pool, include=include,
+                             exclude=exclude, at=at, watch=watch, poll_interval=poll_interval or POLL_INTERVAL,
+                             debounce=DEBOUNCE if debounce is None else debounce, stop=stop, tuning=tuning)
+    finally:
+        if session is None:
+            pool.close()
+
+    return {'profile': profile, 'stream': stream_path, 'workspace_path': workspace_path, 'files': stats.files,
+            'bytes': stats.bytes, 'cached_files': stats.cached_files, 'cached_bytes': stats.cached_bytes,
+            'seconds': time.monotonic() - start}
+
+
+async def list_depots_async(profile, pattern=None, refresh=False, offline=False, session=None):
+    """
+    Asyncio form of list_depots().
+    """
+    return await _run_async(session, list_depots, profile, pattern, refresh, offline)
+
+
+async def list_streams_async(profile, depot, pattern=None, refresh=False, offline=False, session=None):
+    """
+    Asyncio form of list_streams().
+    """
+    return await _run_async(session, list_streams, profile, depot, pattern, refresh, offline)
+
+
+async def list_files_async(profile, depot, stream, path=None, include_deleted=False, session=None):
+    """
+    Asyncio form of list_files(), returning the records as a list.
+    """
+    def collect(*args, **kwargs):
+        return list(list_files(*args, **kwargs))
+
+    return await _run_async(session, collect, profile, depot, stream, path, include_deleted)
+
+
+async def sync_stream_async(profile, depot, stream, workspace_path, session=None, **options):
+    """
+    Asyncio form of sync_stream(), taking the same keyword options.
+
+    Cancelling the awaiting task does not interrupt a sync that is running; with watch, set the stop event to
+    end it.
+    """
+    return await _run_async(session, sync_stream, profile, depot, stream, workspace_path, **options)
@@ -0,0 +1,384 @@
+"""
+Client Workspace Pool for Perforce Helix Core Python Tools.
+
+Instead of creating a temporary client workspace for every sync and deleting it afterwards, a sync can lease
+one of a small pool of client workspaces kept on the server for the current host, local user and profile
+('phc_pool_<host>_<user>_<profile>_<n>'), retarget it to the requested stream and root, and give it back when
+it is done. Saving an existing spec writes less to the server's journal than creating and deleting one, and a
+run that crashes leaves no new spec behind, only a pool client that the next lease or the garbage collector
+cleans up.
+
+Leases are taken with an exclusive lock on a local lock file per pool client, held for as long as the sync
+runs, so concurrent phc processes of the user never share a client; the operating system releases the lock
+if a process dies. The lock files live in the user's configuration directory, which is why the local user is
+part of the client names. A pool client that exists on the server with another owner or host is never leased.
+The have list of a client is reset when it is returned, so the next lease starts from an empty have list; a
+client that was not returned cleanly is reset when it is next leased.
+
+Pool clients that have not been used for POOL_IDLE_TIMEOUT seconds are deleted by collect_garbage(), which
+also deletes temporary clients ('temp_sync_<host>_<pid>') left behind by crashed processes on this host.
+"""
+
+import click
+import hashlib
+import json
+import os
+import socket
+import time
+
+import P4
+
+from perforce_tools.clients import client_exists, pool_client_name, pool_client_prefix, temp_client_prefix
+from perforce_tools.config import CONFIG_DIR, get_p4_client
+
+POOL_DIR = os.path.join(CONFIG_DIR, "client-pool")
+
+# Pool clients per host, user and profile
+POOL_SIZE = 8
+
+# Seconds after which an unused pool client is deleted from the server
+POOL_IDLE_TIMEOUT = 24 * 3600
+
+# Minimum seconds between two automatic garbage collections for a server
+GC_INTERVAL = 3600
+
+# Minimum age in seconds of a leftover temporary client before it is deleted
+TEMP_CLIENT_MIN_AGE = 3600
+
+
+def _pool_dir(p4, profile_name):
+    """
+    Get the directory holding the lock and state files of the pool of a profile on a server.
+    """
+    key = hashlib.sha1(f"{p4.port}\n{pool_client_prefix(profile_name)}".encode('utf-8')).hexdigest()[:12]
+    path = os.path.join(POOL_DIR, key)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _try_lock(lock_file):
+    """
+    Take an exclusive lock on an open file without waiting.
+
+    Returns:
+        bool: True if the lock was taken
+    """
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _read_state(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_state(path, state):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+
+def _reset_have(p4, client_name):
+    """
+    Empty the have list of a client without touching local files.
+    """
+    previous = p4.client
+    p4.client = client_name
+    try:
+        with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+            p4.run_sync("-k", f"//{client_name}/...#none")
+    finally:
+        p4.client = previous
+
+
+def _owned_elsewhere(p4, client_name):
+    """
+    Check whether a client exists on the server with another owner, or is restricted to another host.
+    """
+    with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+        clients = p4.run("clients", "-e", client_name)
+    for client in clients:
+        if client.get('client') == client_name:
+            return client.get('Owner') != p4.user or client.get('Host') not in (None, '', socket.gethostname())
+    return False
+
+
+class ClientLease:
+    """
+    A pool client leased by the current process.
+    """
+
+    def __init__(self, name, slot, lock_file, state_path):
+        self.slot = slot
+        self.name = name
+        self._lock_file = lock_file
+        self._state_path = state_path
+
+    def retarget(self, p4, stream_path, client_spec):
+        """
+        Point the leased client at a stream and workspace root.
+
+        The client is created if it does not exist yet. If the previous lease was not returned cleanly, its
+        have list is reset first, while the client still has the view it was synced with. A client that
+        changes between a stream client and a classic client with a narrowed view is created anew.
+
+        Args:
+            p4 (P4.P4): A connected P4 client
+            stream_path (str): The full stream path, e.g. '//depot/main'
+            client_spec (dict): The spec to save, from clients.build_client_spec() with this lease's name
+        """
+        state = _read_state(self._state_path)
+        if state is not None and state.get('leased'):
+            try:
+                _reset_have(p4, self.name)
+            except P4.P4Exception:
+                # Deleting the client also drops its have list
+                if client_exists(p4, self.name):
+                    p4.delete_client(self.name)
+                state = None
+        if state is not None and state.get('narrowed', False) != ('View' in client_spec):
+            if client_exists(p4, self.name):
+                p4.delete_client(self.name)
+        p4.save_client(client_spec)
+        _write_state(self._state_path, {'client': self.name, 'stream': stream_path, 'root': client_spec['Root'],
+                                        'narrowed': 'View' in client_spec, 'leased': True, 'pid': os.getpid(),
+                                        'time': time.time()})
+
+    def release(self, p4):
+        """
+        Reset the have list of the client and return it to the pool.
+
+        Args:
+            p4 (P4.P4): A connected P4 client
+        """
+        try:
+            state = _read_state(self._state_path)
+            if state is not None and state.get('leased') and state.get('pid') == os.getpid():
+                _reset_have(p4, self.name)
+                _write_state(self._state_path, dict(state, leased=False, time=time.time()))
+        finally:
+            self._lock_file.close()
+
+
+def lease_client(p4, profile_name):
+    """
+    Lease a free pool client of a profile for the server p4 is connected to.
+
+    Pool clients that exist on the server with another owner or host are skipped, so the spec of a client
+    created by someone else is never changed.
+
+    Args:
+        p4 (P4.P4): A connected P4 client
+        profile_name (str): The profile p4 is connected with
+
+    Returns:
+        ClientLease: The leased client, or None if every pool client is leased by another process
+    """
+    directory = _pool_dir(p4, profile_name)
+    for slot in range(POOL_SIZE):
+        lock_file = open(os.path.join(directory, f"{slot}.lock"), 'a+')
+        if _try_lock(lock_file):
+            name = pool_client_name(profile_name, slot)
+            try:
+                if not _owned_elsewhere(p4, name):
+                    return ClientLease(name, slot, lock_file, os.path.join(directory, f"{slot}.json"))
+            except BaseException:
+                lock_file.close()
+                raise
+        lock_file.close()
+    return None
+
+
+def pool_status(p4, profile_name):
+    """
+    Describe the pool clients of the current host, user and profile on a server.
+
+    Args:
+        p4 (P4.P4): A connected P4 client
+        profile_name (str): The profile p4 is connected with
+
+    Returns:
+        list: One dict per pool client known locally or on the server, with 'client', 'leased' (by a running
+              process), 'exists' (on the server) and the 'stream', 'root' and 'time' of its last lease
+    """
+    directory = _pool_dir(p4, profile_name)
+    with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+        on_server = {c['client'] for c in p4.run("clients", "-e", pool_client_name(profile_name, "*"))}
+
+    entries = []
+    for slot in range(POOL_SIZE):
+        name = pool_client_name(profile_name, slot)
+        state = _read_state(os.path.join(directory, f"{slot}.json")) or {}
+        if not state and name not in on_server:
+            continue
+        with open(os.path.join(directory, f"{slot}.lock"), 'a+') as lock_file:
+            leased = not _try_lock(lock_file)
+        entries.append({'client': name, 'leased': leased, 'exists': name in on_server,
+                        'stream': state.get('stream'), 'root': state.get('root'), 'time': state.get('time')})
+    return entries
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        # Without a portable check, assume the process may still be running
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _delete_client(p4, client_name):
+    """
+    Delete a client, e.g. one owned by another user, only if the server allows it.
+
+    Returns:
+        bool: True if the client was deleted
+    """
+    try:
+        p4.delete_client(client_name)
+        return True
+    except P4.P4Exception:
+        return False
+
+
+def collect_garbage(p4, profile_name, idle_timeout=POOL_IDLE_TIMEOUT, force=False):
+    """
+    Delete idle pool clients of a profile and leftover temporary clients of the current host.
+
+    Pool clients are deleted once they have not been accessed for idle_timeout seconds and are not leased.
+    Temporary clients are deleted once they are TEMP_CLIENT_MIN_AGE seconds old and the process that created
+    them is no longer running. Unless force is set, this runs at most once every GC_INTERVAL seconds per pool.
+
+    Args:
+        p4 (P4.P4): A connected P4 client
+        profile_name (str): The profile p4 is connected with
+        idle_timeout (float): Seconds after which an unused pool client is deleted
+        force (bool): Run even if the last collection was less than GC_INTERVAL seconds ago
+
+    Returns:
+        list: The names of the deleted clients
+    """
+    directory = _pool_dir(p4, profile_name)
+    stamp = os.path.join(directory, "last-gc")
+    now = time.time()
+    if not force and os.path.exists(stamp) and now - os.path.getmtime(stamp) < GC_INTERVAL:
+        return []
+    with open(stamp, 'w'):
+        pass
+
+    temp_prefix = temp_client_prefix()
+    deleted = []
+    with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+        pool_clients = p4.run("clients", "-e", pool_client_name(profile_name, "*"))
+        temp_clients = p4.run("clients", "-e", f"{temp_prefix}*")
+
+        for client in pool_clients:
+            name = client['client']
+            slot = name[len(pool_client_prefix(profile_name)):]
+            if not slot.isdigit() or now - int(client.get('Access') or now) < idle_timeout:
+                continue
+            with open(os.path.join(directory, f"{slot}.lock"), 'a+') as lock_file:
+                if not _try_lock(lock_file) or not _delete_client(p4, name):
+                    continue
+                state_path = os.path.join(directory, f"{slot}.json")
+                if os.path.exists(state_path):
+                    os.remove(state_path)
+            deleted.append(name)
+
+        for client in temp_clients:
+            name = client['client']
+            pid = name[len(temp_prefix):].split('_')[0]
+            if (not pid.isdigit() or _pid_alive(int(pid))
+                    or now - int(client.get('Update') or now) < TEMP_CLIENT_MIN_AGE):
+                continue
+            if _delete_client(p4, name):
+                deleted.append(name)
+    return deleted
+
+
+@click.group()
+def main():
+    """
+    Manage the pool of reusable client workspaces.
+
+    sync-stream --client-pool leases client workspaces from this pool instead of creating a temporary client
+    for every sync. Pool clients are named phc_pool_<host>_<user>_<profile>_<n> and are kept per host, local user,
+    profile and server.
+    """
+    pass
+
+
+@main.command()
+@click.option('--profile', required=True, help='Profile name to use for connection')
+def status(profile):
+    """
+    List the pool clients of this host and profile and whether they are leased.
+    """
+    try:
+        p4 = get_p4_client(profile, direct=True)
+        entries = pool_status(p4, profile)
+        p4.disconnect()
+
+        if not entries:
+            click.echo("No pool client workspaces exist for this host and profile.")
+            return
+        for entry in entries:
+            state = "leased" if entry['leased'] else "idle"
+            if not entry['exists']:
+                state += ", not on the server"
+            used = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry['time'])) if entry['time'] else "never"
+            target = f"{entry['stream']} -> {entry['root']}" if entry['stream'] else "no stream"
+            click.echo(f"  {entry['client']} ({state}): {target}, last used {used}")
+
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        exit(1)
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}")
+        exit(1)
+
+
+@main.command()
+@click.option('--profile', required=True, help='Profile name to use for connection')
+@click.option('--idle-timeout', type=click.FloatRange(min=0), default=POOL_IDLE_TIMEOUT, show_default=True,
+              help='Delete pool clients that have not been used for this many seconds')
+def gc(profile, idle_timeout):
+    """
+    Delete idle pool clients and temporary clients left behind by crashed runs.
+    """
+    try:
+        p4 = get_p4_client(profile, direct=True)
+        removed = collect_garbage(p4, profile, idle_timeout, force=True)
+        p4.disconnect()
+
+        for name in removed:
+            click.echo(f"  Deleted {name}")
+        click.echo(f"Deleted {len(removed)} client workspaces.")
+
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        exit(1)
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""
+Client Workspace helpers for Perforce Helix Core Python Tools.
+
+This module builds the names and specs of the client workspaces used to sync streams. Temporary clients
+are unique to the current process and are deleted after the sync, while persistent clients have a stable
+name derived from the profile, stream and workspace path so that their have list survives between runs.
+Pool clients are numbered per host, local user and profile, and reused by one sync after another (see
+perforce_tools.client_pool).
+
+A sync restricted with --include or --exclude uses a classic client instead of a stream client, whose view
+is the view the server generates for the stream, narrowed to the requested paths.
+"""
+
+import getpass
+import hashlib
+import itertools
+import os
+import re
+import shlex
+import socket
+
+import P4
+
+# Numbers the temporary clients of a process, so that concurrent syncs in one process get distinct names
+_temp_client_counter = itertools.count()
+
+
+def _sanitized_hostname():
+    """
+    Get the hostname in a form that is safe to use in a client name.
+    """
+    return socket.gethostname().replace('.', '_')
+
+
+def _sanitized(value):
+    """
+    Replace the characters that are not safe to use in a client name.
+    """
+    return re.sub(r'[^A-Za-z0-9_-]', '_', value)
+
+
+def _local_username():
+    """
+    Get the name of the operating system user running the process.
+    """
+    try:
+        return getpass.getuser()
+    except (KeyError, OSError, ImportError):
+        # No user name in the environment or the password database
+        return str(os.getuid()) if hasattr(os, 'getuid') else "unknown"
+
+
+def temp_client_prefix():
+    """
+    Get the prefix shared by the temporary client workspaces of the current host.
+
+    Returns:
+        str: e.g. 'temp_sync_myhost_', followed by the process id in each client name
+    """
+    return f"temp_sync_{_sanitized_hostname()}_"
+
+
+def temp_client_name():
+    """
+    Get the name of a new temporary client workspace for the current process.
+
+    Returns:
+        str: e.g. 'temp_sync_myhost_12345', with a '_<n>' suffix for every further client of the process
+    """
+    name = f"{temp_client_prefix()}{os.getpid()}"
+    number = next(_temp_client_counter)
+    return f"{name}_{number}" if number else name
+
+
+def persistent_client_name(profile_name, stream_path, workspace_path, include=(), exclude=()):
+    """
+    Get the stable name of the persistent client workspace for a (profile, stream, workspace path).
+
+    Args:
+        profile_name (str): The profile used for the connection
+        stream_path (str): The full stream path, e.g. '//depot/main'
+        workspace_path (str): The local workspace path
+        include (list): Paths the view is narrowed to, as returned by view_filter()
+        exclude (list): Paths removed from the view, as returned by view_filter()
+
+    Returns:
+        str: e.g. 'phc_sync_myhost_1a2b3c4d5e6f'
+    """
+    parts = [profile_name, stream_path, os.path.abspath(workspace_path)]
+    if include or exclude:
+        # A narrowed workspace gets its own client, as its have list covers different files
+        parts += ["+" + path for path in include] + ["-" + path for path in exclude]
+    key = "\n".join(parts)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+    return f"phc_sync_{_sanitized_hostname()}_{digest}"
+
+
+def pool_client_prefix(profile_name):
+    """
+    Get the prefix shared by the pool clients of the current host, local user and profile.
+
+    The local user is part of the name because the leases are coordinated through lock files in the user's
+    configuration directory, and the profile because it determines the server and the Perforce user.
+
+    Args:
+        profile_name (str): The profile used for the connection
+
+    Returns:
+        str: e.g. 'phc_pool_myhost_jdoe_dev_', followed by the number of the client in the pool
+    """
+    return f"phc_pool_{_sanitized_hostname()}_{_sanitized(_local_username())}_{_sanitized(profile_name)}_"
+
+
+def pool_client_name(profile_name, slot):
+    """
+    Get the name of a client workspace in the client pool of the current host, local user and profile.
+
+    Args:
+        profile_name (str): The profile used for the connection
+        slot (int or str): The number of the client in the pool, or '*' for a wildcard matching all of them
+
+    Returns:
+        str: e.g. 'phc_pool_myhost_jdoe_dev_3'
+    """
+    return f"{pool_client_prefix(profile_name)}{slot}"
+
+
+def client_options(writable, compress=True):
+    """
+    Get the client Options field used for syncing.
+
+    Args:
+        writable (bool): Whether synced files should be writable
+        compress (bool): Whether file content is compressed in transit, which saves bandwidth on slow links
+            but costs time on fast links and for content that is already compressed
+
+    Returns:
+        str: The Options field value
+    """
+    return (f"{'allwrite' if writable else 'noallwrite'} clobber {'compress' if compress else 'nocompress'} "
+            f"unlocked modtime normdir")
+
+
+def build_client_spec(p4, client_name, workspace_path, stream_path, writable, host=None, view=None, compress=True):
+    """
+    Build a stream client workspace spec for syncing.
+
+    Args:
+        p4 (P4.P4): A connected P4 client; its user becomes the client owner
+        client_name (str): The name of the client workspace
+        workspace_path (str): The root directory of the client workspace
+        stream_path (str): The full stream path, e.g. '//depot/main'
+        writable (bool): Whether synced files should be writable
+        host (str): Optional Host field restricting the client to one machine
+        view (list): Optional view lines, as returned by narrow_view(); the spec is then a classic client
+            with this view instead of a stream client
+        compress (bool): Whether file content is compressed in transit
+
+    Returns:
+        dict: The client spec, ready for p4.save_client()
+    """
+    client_spec = {
+        'Client': client_name,
+        'Owner': p4.user,
+        'Root': workspace_path,
+        'Options': client_options(writable, compress),
+        'LineEnd': 'local',
+    }
+    if view is not None:
+        client_spec['View'] = view
+    else:
+        client_spec['Stream'] = stream_path
+    if host:
+        client_spec['Host'] = host
+    return client_spec
+
+
+def view_filter(paths):
+    """
+    Normalize --include or --exclude paths into client-relative view patterns.
+
+    Paths are relative to the stream root and may use the Perforce wildcards '*' and '...'. A path without
+    wildcards names a directory and covers everything below it.
+
+    Args:
+        paths (iterable): Paths such as 'art/textures', 'src/...' or 'docs/*.md'
+
+    Returns:
+        list: The patterns, e.g. ['art/textures/...', 'src/...', 'docs/*.md']
+
+    Raises:
+        ValueError: If a path is empty or leaves the stream root
+    """
+    patterns = []
+    for path in paths:
+        pattern = path.strip().replace('\\', '/').strip('/')
+        if not pattern or '..' in pattern.replace('...', '') or pattern.startswith('//'):
+            raise ValueError(f"Invalid path filter '{path}': expected a path relative to the stream root")
+        if '*' not in pattern and '...' not in pattern:
+            pattern += '/...'
+        patterns.append(pattern)
+    return patterns
+
+
+def stream_view(p4, client_name, stream_path):
+    """
+    Get the view the server generates for a client of a stream, including the stream's imports and exclusions.
+
+    Args:
+        p4 (P4.P4): A connected P4 client
+        client_name (str): The name the view's client side should use
+        stream_path (str): The full stream path, e.g. '//depot/main'
+
+    Returns:
+        list: The view lines
+    """
+    with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+        return list(p4.fetch_client("-S", stream_path, client_name)['View'])
+
+
+def wildcard_regex(pattern):
+    """
+    Compile a path with the Perforce wildcards '*' (within one directory) and '...' into a regular expression.
+
+    Args:
+        pattern (str): The path, e.g. '//depot/main/src/....py'
+
+    Returns:
+        re.Pattern: A pattern to be matched against whole paths with fullmatch()
+    """
+    parts = re.split(r'(\.\.\.|\*)', pattern)
+    return re.compile("".join('.*' if part == '...' else '[^/]*' if part == '*' else re.escape(part)
+                              for part in parts))
+
+
+def _view_line(prefix, depot_path, client_path):
+    quote = lambda path: f'"{path}"' if ' ' in path else path
+    return f"{prefix}{quote(depot_path)} {quote(client_path)}"
+
+
+def _narrow_line(prefix, depot_path, client_path, pattern):
+    """
+    Intersect one view line with a client-side pattern.
+
+    Returns:
+        list: The view lines mapping the files of the line that the pattern matches
+    """
+    if not (depot_path.endswith('/...') and client_path.endswith('/...')):
+        # A line naming single files is kept whole if the pattern matches its client side
+        return [_view_line(prefix, depot_path, client_path)] if wildcard_regex(pattern).fullmatch(client_path) else []
+    depot_root, client_root = depot_path[:-3], client_path[:-3]
+    if pattern.startswith(client_root):
+        # The pattern is inside the line: map just the pattern
+        return [_view_line(prefix, depot_root + pattern[len(client_root):], pattern)]
+    if pattern.endswith('/...') and '*' not in pattern and '...' not in pattern[:-3] \
+            and client_root.startswith(pattern[:-3]):
+        # The line is inside the pattern, e.g. an import below an included directory
+        return [_view_line(prefix, depot_path, client_path)]
+    return []
+
+
+def narrow_view(view, client_name, include=(), exclude=()):
+    """
+    Narrow a client view to the included paths and remove the excluded ones.
+
+    Exclusion lines of the original view are kept in place, so the stream's own exclusions still apply.
+
+    Args:
+        view (list): View lines, e.g. from stream_view()
+        client_name (str): The name of the client workspace the view's client side uses
+        include (list): Patterns from view_filter() to narrow the view to; all of the view if empty
+        exclude (list): Patterns from view_filter() to remove from the view
+
+    Returns:
+        list: The narrowed view lines
+
+    Raises:
+        ValueError: If none of the included paths are part of the view
+    """
+    lines = []
+    for line in view:
+        prefix = line[0] if line[0] in '-+&' else ''
+        depot_path, client_path = shlex.split(line[len(prefix):])
+        lines.append((prefix, depot_path, client_path))
+
+    narrowed = []
+    for prefix, depot_path, client_path in lines:
+        if prefix == '-' or not include:
+            narrowed.append(_view_line(prefix, depot_path, client_path))
+            continue
+        for pattern in include:
+            narrowed.extend(_narrow_line(prefix, depot_path, client_path, f"//{client_name}/{pattern}"))
+    if include and not any(not line.startswith('-') for line in narrowed):
+        raise ValueError(f"None of the included paths ({', '.join(include)}) are part of the stream")
+
+    # Later lines take precedence, so exclusions appended at the end remove files mapped by any line above
+    for prefix, depot_path, client_path in lines:
+        if prefix != '-':
+            for pattern in exclude:
+                narrowed.extend(_narrow_line('-', depot_path, client_path, f"//{client_name}/{pattern}"))
+    return narrowed
+
+
+def local_path(client_file, client_name, workspace_path):
+    """
+    Get the local path of a 'clientFile' value, which servers report in either client or local syntax.
+
+    Args:
+        client_file (str): e.g. '//my_client/src/main.c' or '/builds/main/src/main.c'
+        client_name (str): The name of the client workspace
+        workspace_path (str): The client workspace root
+
+    Returns:
+        str: The local path of the file
+    """
+    prefix = f"//{client_name}/"
+    if client_file.startswith(prefix):
+        return os.path.join(workspace_path, *client_file[len(prefix):].split('/'))
+    return client_file
+
+
+def client_exists(p4, client_name):
+    """
+    Check whether a client workspace exists on the server.
+
+    Args:
+        p4 (P4.P4): A connected P4 client
+        client_name (str): The name of the client workspace
+
+    Returns:
+        bool: True if the client exists
+    """
+    with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+        return any(c.get('client') == client_name for c in p4.run("clients", "-e", client_name))
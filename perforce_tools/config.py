@@ -2,13 +2,25 @@
 Configuration module for Perforce Helix Core Python Tools.
 
 This module handles loading, saving, and validating profiles for connecting to Perforce servers.
+
+The configuration files are parsed with the C YAML loader when PyYAML was built with it, and parsed files are
+cached in-process until they change on disk. Writes replace the file atomically and are serialized with a
+lock file, so concurrent phc processes sharing a configuration never see or produce a partial file.
+
+P4Python is only imported when a connection is made, so commands that only read the configuration start
+without loading it.
 """
 
+import contextlib
+import copy
+import hashlib
 import os
+import threading
+import time
 import yaml
 from pathlib import Path
-import P4
 import click
+from perforce_tools import tracing
 
 # Constants
 # Use platform-appropriate config directory
@@ -17,6 +29,35 @@ if os.name == 'nt':  # Windows
 else:  # Unix-like systems (Linux, macOS)
     CONFIG_DIR = os.path.expanduser("~/.perforce-helix-core-python-tools")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.yml")
+TICKETS_FILE = os.path.join(CONFIG_DIR, "tickets.yml")
+
+# Seconds before a cached ticket expires at which it is replaced by a new login
+TICKET_REFRESH_MARGIN = 300
+
+# Transfer tuning settings of a profile, with the values used when a profile does not set them:
+# - compress: compress file content in transit (the 'compress' client option)
+# - parallel: transfer threads sync-stream uses when --parallel is not given
+# - parallel_batch, parallel_batchsize, parallel_min, parallel_minsize: the batch and threshold arguments of
+#   'p4 sync --parallel' (files and bytes per batch, and the files and bytes below which a sync is not
+#   parallelized), or None for the server's defaults
+# - tunables: client-side tunables such as net.tcpsize or net.bufsize, set before every direct connection
+TUNING_DEFAULTS = {
+    "compress": True,
+    "parallel": 1,
+    "parallel_batch": None,
+    "parallel_batchsize": None,
+    "parallel_min": None,
+    "parallel_minsize": None,
+    "tunables": {},
+}
+
+# Use the LibYAML bindings when available; they parse and emit several times faster
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# Parsed YAML files: path -> (stat key, data)
+_yaml_cache = {}
+_yaml_cache_lock = threading.Lock()
 
 def ensure_config_dir():
     """
@@ -29,6 +70,75 @@ def ensure_config_dir():
     config_path.mkdir(parents=True, exist_ok=True)
     return config_path
 
+@contextlib.contextmanager
+def _file_lock(path):
+    """
+    Context manager holding an exclusive lock on '<path>.lock', shared by every process and thread.
+    """
+    ensure_config_dir()
+    with open(f"{path}.lock", "a+") as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                try:
+                    # LK_LOCK retries for about 10 seconds before giving up, so keep waiting
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def _read_yaml(path):
+    """
+    Parse a YAML file, reusing the previous result while the file is unchanged.
+
+    Returns:
+        The parsed data, or None if the file does not exist. Callers must not modify it.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # Atomic replacement gives the file a new inode, so a rewrite is noticed even within the mtime resolution
+    key = (st.st_mtime_ns, st.st_size, st.st_ino)
+    with _yaml_cache_lock:
+        cached = _yaml_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with open(path, 'r') as f:
+        data = yaml.load(f, Loader=_YAML_LOADER)
+    with _yaml_cache_lock:
+        _yaml_cache[path] = (key, data)
+    return data
+
+def _write_yaml(path, data):
+    """
+    Atomically replace a YAML file. The file is only readable by the current user, since it holds credentials.
+    """
+    ensure_config_dir()
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            yaml.dump(data, f, Dumper=_YAML_DUMPER, default_flow_style=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
 def load_config():
     """
     Load the configuration file.
@@ -38,23 +148,40 @@ def load_config():
     """
     ensure_config_dir()
 
-    if not os.path.exists(CONFIG_FILE):
+    config = _read_yaml(CONFIG_FILE)
+    if not config:
         return {"profiles": {}}
-
-    with open(CONFIG_FILE, 'r') as f:
-        return yaml.safe_load(f) or {"profiles": {}}
+    return copy.deepcopy(config)
 
 def save_config(config):
     """
     Save the configuration to the config file.
 
+    Prefer update_config() for changes based on the current configuration, so that concurrent changes are
+    not lost.
+
     Args:
         config (dict): The configuration to save
     """
-    ensure_config_dir()
+    with _file_lock(CONFIG_FILE):
+        _write_yaml(CONFIG_FILE, config)
+
+@contextlib.contextmanager
+def update_config():
+    """
+    Context manager for changing the configuration.
+
+    Holds the configuration lock, yields the current configuration and saves it when the block completes
+    without an exception, so that concurrent updates from other processes are applied one after another.
 
-    with open(CONFIG_FILE, 'w') as f:
-        yaml.dump(config, f, default_flow_style=False)
+    Yields:
+        dict: The configuration, to be modified in place
+    """
+    with _file_lock(CONFIG_FILE):
+        config = load_config()
+        config.setdefault("profiles", {})
+        yield config
+        _write_yaml(CONFIG_FILE, config)
 
 def get_profile(profile_name):
     """
@@ -69,12 +196,13 @@ def get_profile(profile_name):
     Raises:
         ValueError: If the profile does not exist
     """
-    config = load_config()
+    ensure_config_dir()
+    profiles = (_read_yaml(CONFIG_FILE) or {}).get("profiles") or {}
 
-    if profile_name not in config.get("profiles", {}):
+    if profile_name not in profiles:
         raise ValueError(f"Profile '{profile_name}' does not exist")
 
-    return config["profiles"][profile_name]
+    return dict(profiles[profile_name])
 
 def save_profile(profile_name, host, username, password):
     """
@@ -89,23 +217,201 @@ def save_profile(profile_name, host, username, password):
     Returns:
         bool: True if the profile was saved successfully
     """
-    # Test connection first
-    if not test_connection(host, username, password):
+    # Test connection first; the ticket from this login is reused by later commands
+    login = _test_login(host, username, password)
+    if login is False:
         return False
 
-    config = load_config()
+    with update_config() as config:
+        previous = config["profiles"].get(profile_name) or {}
+        profile = config["profiles"][profile_name] = {
+            "host": host,
+            "username": username,
+            "password": password
+        }
+        # Saving the connection details again keeps the profile's tuning
+        if previous.get("tuning"):
+            profile["tuning"] = previous["tuning"]
+
+    ticket, expires = login
+    if ticket is None:
+        forget_ticket(profile_name)
+    else:
+        _store_ticket(profile_name, profile, ticket, expires)
+    return True
 
-    if "profiles" not in config:
-        config["profiles"] = {}
+def normalize_tuning(tuning):
+    """
+    Validate transfer tuning settings and fill in the defaults of the settings they do not set.
 
-    config["profiles"][profile_name] = {
-        "host": host,
-        "username": username,
-        "password": password
-    }
+    Args:
+        tuning (dict): Settings as stored in a profile's 'tuning' mapping, or None
 
-    save_config(config)
-    return True
+    Returns:
+        dict: Every key of TUNING_DEFAULTS
+
+    Raises:
+        ValueError: If a setting is unknown or has an invalid value
+    """
+    tuning = tuning or {}
+    if not isinstance(tuning, dict):
+        raise ValueError("Profile tuning must be a mapping")
+    unknown = set(tuning) - set(TUNING_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown tuning settings: {', '.join(sorted(unknown))}")
+
+    settings = dict(TUNING_DEFAULTS, **tuning)
+    if not isinstance(settings["compress"], bool):
+        raise ValueError("Tuning setting 'compress' must be true or false")
+    for key in ("parallel", "parallel_batch", "parallel_batchsize", "parallel_min", "parallel_minsize"):
+        value = settings[key]
+        if value is None and key != "parallel":
+            continue
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            raise ValueError(f"Tuning setting '{key}' must be a positive integer")
+    tunables = settings["tunables"] or {}
+    if not isinstance(tunables, dict):
+        raise ValueError("Tuning setting 'tunables' must map tunable names to values")
+    settings["tunables"] = {str(name): str(value) for name, value in tunables.items()}
+    return settings
+
+def get_tuning(profile_name):
+    """
+    Get the transfer tuning settings of a profile.
+
+    Args:
+        profile_name (str): The name of the profile
+
+    Returns:
+        dict: The settings, with every key of TUNING_DEFAULTS
+
+    Raises:
+        ValueError: If the profile does not exist or its settings are invalid
+    """
+    return normalize_tuning(get_profile(profile_name).get("tuning"))
+
+def save_tuning(profile_name, tuning):
+    """
+    Store transfer tuning settings in a profile, replacing its previous settings.
+
+    Only settings that differ from TUNING_DEFAULTS are written to the configuration file.
+
+    Args:
+        profile_name (str): The name of the profile
+        tuning (dict): The settings
+
+    Raises:
+        ValueError: If the profile does not exist or a setting is invalid
+    """
+    settings = normalize_tuning(tuning)
+    with update_config() as config:
+        profile = config["profiles"].get(profile_name)
+        if profile is None:
+            raise ValueError(f"Profile '{profile_name}' does not exist")
+        changed = {key: value for key, value in settings.items() if value != TUNING_DEFAULTS[key]}
+        if changed:
+            profile["tuning"] = changed
+        else:
+            profile.pop("tuning", None)
+
+def _apply_tunables(p4, tunables):
+    """
+    Set client-side tunables on a P4 client before it connects.
+    """
+    for name, value in tunables.items():
+        try:
+            p4.set_tunable(name, value)
+        except TypeError as e:
+            # P4Python reports unknown tunables as TypeError
+            raise ValueError(f"Invalid tunable in profile tuning: {e}")
+
+def _credentials_key(host, username, password):
+    """
+    Fingerprint the credentials a ticket was obtained with, so a changed profile never reuses it.
+    """
+    return hashlib.sha256(f"{host}\n{username}\n{password}".encode("utf-8")).hexdigest()
+
+def _load_tickets():
+    return copy.deepcopy(_read_yaml(TICKETS_FILE) or {})
+
+def _login(p4, password):
+    """
+    Log in on a connected P4 client and get a ticket without storing it in the user's ticket file.
+
+    Args:
+        p4 (P4.P4): A connected P4 client
+        password (str): The password to log in with
+
+    Returns:
+        tuple: (ticket, expiry time as a UNIX timestamp), or (None, None) if the server issued no ticket
+
+    Raises:
+        P4.P4Exception: If the login fails
+    """
+    p4.password = password
+    with p4.at_exception_level(p4.RAISE_ERRORS):
+        result = p4.run_login("-p")
+
+    ticket = None
+    lifetime = None
+    for item in result:
+        if isinstance(item, dict):
+            lifetime = item.get("TicketExpiration", lifetime)
+            ticket = item.get("ticket", ticket)
+        elif isinstance(item, str) and item.strip() and " " not in item.strip():
+            ticket = item.strip()
+    if not ticket or lifetime is None:
+        return None, None
+    return ticket, time.time() + int(lifetime)
+
+def _store_ticket(profile_name, profile, ticket, expires):
+    with _file_lock(TICKETS_FILE):
+        tickets = _load_tickets()
+        tickets[profile_name] = {
+            "key": _credentials_key(profile["host"], profile["username"], profile["password"]),
+            "ticket": ticket,
+            "expires": expires
+        }
+        _write_yaml(TICKETS_FILE, tickets)
+
+def forget_ticket(profile_name):
+    """
+    Drop the cached login ticket of a profile, so the next connection logs in again.
+
+    Args:
+        profile_name (str): The name of the profile
+    """
+    with _file_lock(TICKETS_FILE):
+        tickets = _load_tickets()
+        if tickets.pop(profile_name, None) is not None:
+            _write_yaml(TICKETS_FILE, tickets)
+
+def _session_password(p4, profile_name, profile):
+    """
+    Get the password to use on a connection: the cached ticket of the profile while it is valid, otherwise a
+    fresh ticket from a new login, falling back to the profile password if the server issues none.
+
+    A cached ticket is checked with 'p4 login -s' first. A ticket the server no longer accepts, e.g. after
+    'p4 logout' or a password reset, is dropped and replaced by a new login.
+    """
+    import P4
+
+    entry = (_read_yaml(TICKETS_FILE) or {}).get(profile_name)
+    if (entry and entry.get("key") == _credentials_key(profile["host"], profile["username"], profile["password"])
+            and entry.get("expires", 0) - TICKET_REFRESH_MARGIN > time.time()):
+        p4.password = entry["ticket"]
+        try:
+            with p4.at_exception_level(p4.RAISE_ERRORS):
+                p4.run_login("-s")
+            return entry["ticket"]
+        except P4.P4Exception:
+            forget_ticket(profile_name)
+
+    ticket, expires = _login(p4, profile["password"])
+    if ticket is None:
+        return profile["password"]
+    _store_ticket(profile_name, profile, ticket, expires)
+    return ticket
 
 def test_connection(host, username, password):
     """
@@ -119,45 +425,111 @@ def test_connection(host, username, password):
     Returns:
         bool: True if the connection was successful
     """
+    return _test_login(host, username, password) is not False
+
+def _test_login(host, username, password):
+    """
+    Connect and log in to a Perforce server to check the credentials.
+
+    Returns:
+        tuple: (ticket, expiry) as returned by _login(), or False if the connection or login failed
+    """
+    import P4
+
     p4 = P4.P4()
     p4.port = host
     p4.user = username
-    p4.password = password
 
     try:
         p4.connect()
-        p4.disconnect()
-        return True
+        try:
+            return _login(p4, password)
+        finally:
+            p4.disconnect()
     except P4.P4Exception as e:
         print(f"Error connecting to Perforce server: {e}")
         return False
 
-def get_p4_client(profile_name):
+def get_p4_client(profile_name, direct=False, tuning=None):
     """
     Get a connected P4 client using the specified profile.
 
+    If the phc daemon is running, the returned client runs its commands on one of the daemon's warm
+    connections instead of connecting itself (see perforce_tools.daemon).
+
+    Direct connections authenticate with a login ticket cached per profile in tickets.yml, so the password is
+    only sent to the server again once the ticket is about to expire or the server rejects it. The client-side
+    tunables of the profile's tuning are set before connecting.
+
     Args:
         profile_name (str): The name of the profile to use
+        direct (bool): Always connect directly, e.g. for commands that need output handlers or transfer files
+        tuning (dict): Tuning settings to connect with instead of the profile's, as returned by
+            normalize_tuning(); a tuning implies a direct connection
 
     Returns:
-        P4.P4: A connected P4 client
+        P4.P4: A connected P4 client, or a daemon.DaemonClient that behaves like one
 
     Raises:
         ValueError: If the profile does not exist or connection fails
     """
     profile = get_profile(profile_name)
+    tunables = (tuning or normalize_tuning(profile.get("tuning")))["tunables"]
 
-    p4 = P4.P4()
+    if not direct and tuning is None:
+        from perforce_tools.daemon import connect_via_daemon
+        with tracing.span("connect_daemon", "connect", profile=profile_name):
+            p4 = connect_via_daemon(profile_name)
+        if p4 is not None:
+            return p4
+
+    import P4
+
+    p4 = tracing.traced(P4.P4)()
     p4.port = profile["host"]
     p4.user = profile["username"]
-    p4.password = profile["password"]
+    _apply_tunables(p4, tunables)
+    if tracing.enabled():
+        # Request the server's performance tracking output, which must be set before connecting
+        p4.track = True
 
     try:
-        p4.connect()
+        with tracing.span("connect", "connect", profile=profile_name, port=p4.port):
+            p4.connect()
+        with tracing.span("authenticate", "connect", profile=profile_name):
+            p4.password = _session_password(p4, profile_name, profile)
         return p4
     except P4.P4Exception as e:
+        if p4.connected():
+            p4.disconnect()
         raise ValueError(f"Failed to connect to Perforce server: {e}")
 
+@contextlib.contextmanager
+def p4_connection(profile_name, direct=False, pool=None, tuning=None):
+    """
+    Context manager that connects with a profile and disconnects on exit.
+
+    Args:
+        profile_name (str): The name of the profile to use
+        direct (bool): Always connect directly, as for get_p4_client()
+        pool (ConnectionPool): Take the connection from this pool of the profile instead, and return it on exit
+        tuning (dict): Tuning settings to connect with instead of the profile's, as for get_p4_client()
+
+    Yields:
+        P4.P4: A connected P4 client
+    """
+    if pool is not None:
+        with pool.connection() as p4:
+            yield p4
+        return
+
+    p4 = get_p4_client(profile_name, direct=direct, tuning=tuning)
+    try:
+        yield p4
+    finally:
+        if p4.connected():
+            p4.disconnect()
+
 def warn_pattern_quoting(pattern):
     """
     Output a warning message about pattern quoting.
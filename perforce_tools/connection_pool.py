@@ -0,0 +1,273 @@
+"""
+Connection Pool for Perforce Helix Core Python Tools.
+
+This module provides a small, thread-safe pool of connected P4 clients so that work spread across
+several threads can reuse connections instead of connecting and authenticating for every unit of work.
+Several pools (for example one per profile) can share a ConnectionBudget that caps the total number of
+open connections across all of them.
+"""
+
+import contextlib
+import queue
+import threading
+import time
+
+# Seconds between checks for a free connection while waiting on a full pool
+WAIT_INTERVAL = 0.1
+
+
+class ConnectionBudget:
+    """
+    A limit on the total number of connections open across several pools.
+
+    When the limit is reached, an idle connection held by another pool is closed to make room.
+    """
+
+    def __init__(self, max_connections):
+        """
+        Args:
+            max_connections (int): The maximum number of open connections across all pools
+        """
+        self.max_connections = max(1, max_connections)
+        self._used = 0
+        self._pools = []
+        self._lock = threading.Lock()
+
+    def register(self, pool):
+        """
+        Add a pool whose idle connections may be closed to free up the budget.
+        """
+        with self._lock:
+            self._pools.append(pool)
+
+    def _try_take(self):
+        with self._lock:
+            if self._used < self.max_connections:
+                self._used += 1
+                return True
+            return False
+
+    def reserve(self, pool):
+        """
+        Reserve room for one new connection.
+
+        Args:
+            pool (ConnectionPool): The pool that wants to open a connection
+
+        Returns:
+            bool: True if the connection may be opened
+        """
+        if self._try_take():
+            return True
+        with self._lock:
+            others = [other for other in self._pools if other is not pool]
+        for other in others:
+            if other.discard_idle() and self._try_take():
+                return True
+        return False
+
+    def release(self):
+        """
+        Give back the room of a connection that was closed.
+        """
+        with self._lock:
+            self._used -= 1
+
+
+class ConnectionPool:
+    """
+    A bounded pool of connected P4 clients.
+
+    Connections are created lazily through the supplied factory, up to max_size. A thread that
+    acquires a connection owns it exclusively until it is released back to the pool.
+    """
+
+    def __init__(self, factory, max_size, budget=None):
+        """
+        Create a connection pool.
+
+        Args:
+            factory (callable): A callable with no arguments that returns a connected P4 client
+            max_size (int): The maximum number of connections the pool will open
+            budget (ConnectionBudget): Optional limit on connections shared with other pools
+        """
+        self._factory = factory
+        self._max_size = max(1, max_size)
+        self._budget = budget
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        if budget is not None:
+            budget.register(self)
+
+    @property
+    def max_size(self):
+        """int: The maximum number of connections the pool will open."""
+        return self._max_size
+
+    def _forget(self):
+        """
+        Account for a connection that was closed or dropped.
+        """
+        with self._lock:
+            self._created -= 1
+        if self._budget is not None:
+            self._budget.release()
+
+    def _try_create(self):
+        """
+        Open a new connection if the pool and the shared budget have room.
+
+        Returns:
+            P4.P4: A new connection, or None if there is no room
+        """
+        with self._lock:
+            if self._created >= self._max_size:
+                return None
+            self._created += 1
+        if self._budget is not None and not self._budget.reserve(self):
+            with self._lock:
+                self._created -= 1
+            return None
+
+        try:
+            return self._factory()
+        except Exception:
+            self._forget()
+            raise
+
+    def try_acquire(self):
+        """
+        Take a connection without waiting.
+
+        Returns:
+            P4.P4: A connected P4 client, or None if the pool is exhausted
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._try_create()
+
+    def acquire(self, timeout=None):
+        """
+        Take a connection from the pool, opening a new one if the pool is not yet full.
+
+        Args:
+            timeout (float): Seconds to wait for a connection to be released when the pool is full
+
+        Returns:
+            P4.P4: A connected P4 client
+
+        Raises:
+            ValueError: If no connection became available within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            p4 = self.try_acquire()
+            if p4 is not None:
+                return p4
+            wait = WAIT_INTERVAL
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    raise ValueError("Timed out waiting for a free Perforce connection")
+            try:
+                return self._idle.get(timeout=wait)
+            except queue.Empty:
+                continue
+
+    def release(self, p4):
+        """
+        Return a connection to the pool.
+
+        Connections that were dropped are discarded so that a fresh one is opened on the next acquire.
+
+        Args:
+            p4 (P4.P4): The connection to return
+        """
+        if p4.connected():
+            self._idle.put(p4)
+        else:
+            self._forget()
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """
+        Context manager that acquires a connection and releases it on exit.
+
+        Args:
+            timeout (float): Seconds to wait for a connection when the pool is full
+
+        Yields:
+            P4.P4: A connected P4 client
+        """
+        p4 = self.acquire(timeout)
+        try:
+            yield p4
+        finally:
+            self.release(p4)
+
+    def discard_idle(self):
+        """
+        Close one idle connection, if there is one.
+
+        Returns:
+            bool: True if a connection was closed
+        """
+        try:
+            p4 = self._idle.get_nowait()
+        except queue.Empty:
+            return False
+        self._forget()
+        if p4.connected():
+            p4.disconnect()
+        return True
+
+    def close(self):
+        """
+        Disconnect every idle connection held by the pool.
+        """
+        while self.discard_idle():
+            pass
+
+
+class ProfilePools:
+    """
+    Lazily created connection pools, one per profile, sharing one connection budget.
+    """
+
+    def __init__(self, budget, factory):
+        """
+        Args:
+            budget (ConnectionBudget): The limit on connections shared by all the pools
+            factory (callable): Called with a profile name; returns a connected P4 client for that profile
+        """
+        self._budget = budget
+        self._factory = factory
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, profile):
+        """
+        Get the pool of a profile, creating it on first use.
+
+        Args:
+            profile (str): The profile name
+
+        Returns:
+            ConnectionPool: The pool of the profile
+        """
+        with self._lock:
+            if profile not in self._pools:
+                self._pools[profile] = ConnectionPool(lambda: self._factory(profile), self._budget.max_connections,
+                                                      self._budget)
+            return self._pools[profile]
+
+    def close(self):
+        """
+        Disconnect the idle connections of every pool.
+        """
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
@@ -0,0 +1,354 @@
+"""
+Content Store for Perforce Helix Core Python Tools.
+
+This module implements an opt-in local file cache shared by every workspace synced on a machine. Files are
+stored once, keyed by the digest the server records for each revision, and an index tracks their size and
+last use so the store can be kept under a size limit by evicting the least recently used files.
+
+Before each part of a sync is transferred, the files it would update whose content is already in the store
+are materialized into the workspace and recorded in the have list with 'p4 sync -k', so the server only sends
+the files that are missing. The files it does send are added to the store afterwards.
+
+Read-only files (the default 'noallwrite' client option) are materialized as hardlinks. Writable files
+('--writable') are materialized as reflinks where the filesystem supports them and as copies otherwise, so
+editing a workspace file can never change the stored content. Copies get the revision's modification time,
+while hardlinked files share the modification time of the stored copy.
+"""
+
+import os
+import shutil
+import sqlite3
+import stat
+import sys
+import tempfile
+import threading
+import time
+
+import P4
+
+from perforce_tools import clients
+
+# Number of files passed to a single 'p4 sync -k' command
+SYNC_BATCH_SIZE = 500
+
+# ioctl request for FICLONE on Linux, used to create copy-on-write reflinks
+FICLONE = 0x40049409
+
+_READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+_EXECUTE = stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH
+
+
+def _reflink_or_copy(source, destination):
+    """
+    Copy a file, using a copy-on-write reflink when the filesystem supports it.
+    """
+    if sys.platform.startswith('linux'):
+        import fcntl
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                return
+            except OSError:
+                pass
+    shutil.copyfile(source, destination)
+
+
+def _is_cacheable(file_type):
+    """
+    Check whether files of a Perforce file type have content that does not depend on their path or revision.
+    """
+    base, _, modifiers = file_type.partition('+')
+    if base in ('symlink', 'apple', 'resource') or base.startswith('k') or 'k' in modifiers:
+        return False
+    return True
+
+
+def _is_executable(file_type):
+    base, _, modifiers = file_type.partition('+')
+    return base.startswith('x') or 'x' in modifiers
+
+
+class ContentStore:
+    """
+    A local store of file contents keyed by server digest, with size-based LRU eviction.
+
+    Safe to share between threads; several processes may also use the same store directory.
+    """
+
+    def __init__(self, root, max_bytes):
+        """
+        Open (or create) a content store.
+
+        Args:
+            root (str): The directory holding the store
+            max_bytes (int): The size the store is trimmed to after files are added
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        # Files and bytes materialized from the store, rather than transferred, since it was opened
+        self.hits = 0
+        self.hit_bytes = 0
+        self._objects = os.path.join(root, "objects")
+        os.makedirs(self._objects, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.db"), timeout=30, check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS objects ("
+                             "key TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, last_used REAL)")
+
+    def _path(self, key):
+        return os.path.join(self._objects, key[:2], key)
+
+    def lookup(self, key):
+        """
+        Find the stored file for a key and mark it as recently used.
+
+        A stored file whose size or modification time changed since it was added has been modified through
+        a hardlink; it is dropped from the store and treated as missing.
+
+        Args:
+            key (str): The content key
+
+        Returns:
+            str: The path of the stored file, or None if it is not in the store
+        """
+        with self._lock:
+            row = self._db.execute("SELECT size, mtime_ns FROM objects WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            path = self._path(key)
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            if st is None or st.st_size != row[0] or st.st_mtime_ns != row[1]:
+                self._remove(key)
+                return None
+            with self._db:
+                self._db.execute("UPDATE objects SET last_used = ? WHERE key = ?", (time.time(), key))
+            return path
+
+    def add(self, key, source_path, link=True):
+        """
+        Add a workspace file to the store.
+
+        Args:
+            key (str): The content key
+            source_path (str): The file to add
+            link (bool): Hardlink the file into the store instead of copying it. Only safe for read-only files.
+        """
+        path = self._path(key)
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM objects WHERE key = ?", (key,)).fetchone():
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                if link:
+                    try:
+                        os.link(source_path, temp_path)
+                    except OSError:
+                        link = False
+                if not link:
+                    _reflink_or_copy(source_path, temp_path)
+                    mode = _READ_ONLY | (os.stat(source_path).st_mode & _EXECUTE)
+                    os.chmod(temp_path, mode)
+                os.replace(temp_path, path)
+            except OSError:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                return
+            st = os.stat(path)
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)",
+                                 (key, st.st_size, st.st_mtime_ns, time.time()))
+
+    def materialize(self, stored_path, destination, writable, mod_time=None):
+        """
+        Place a stored file into a workspace.
+
+        Args:
+            stored_path (str): The path returned by lookup()
+            destination (str): The workspace file to create or replace
+            writable (bool): Whether the workspace file must be writable
+            mod_time (int): Modification time to give copied files, as the 'modtime' client option would
+
+        Returns:
+            bool: True if the file was materialized
+        """
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        temp_path = f"{destination}.phc-{os.getpid()}.tmp"
+        try:
+            linked = False
+            if not writable:
+                try:
+                    os.link(stored_path, temp_path)
+                    linked = True
+                except OSError:
+                    pass
+            if not linked:
+                _reflink_or_copy(stored_path, temp_path)
+                mode = os.stat(stored_path).st_mode & _EXECUTE
+                os.chmod(temp_path, mode | (_READ_ONLY | stat.S_IWUSR if writable else _READ_ONLY))
+                if mod_time:
+                    os.utime(temp_path, (mod_time, mod_time))
+            os.replace(temp_path, destination)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        with self._lock:
+            self.hits += 1
+            self.hit_bytes += os.path.getsize(destination)
+        return True
+
+    def _remove(self, key):
+        path = self._path(key)
+        if os.path.exists(path):
+            if os.name == 'nt':
+                # Windows refuses to delete read-only files; elsewhere the mode is shared with hardlinked workspaces
+                os.chmod(path, stat.S_IWUSR | stat.S_IRUSR)
+            os.remove(path)
+        with self._db:
+            self._db.execute("DELETE FROM objects WHERE key = ?", (key,))
+
+    def evict(self):
+        """
+        Remove the least recently used files until the store is within its size limit.
+
+        Returns:
+            int: The number of files evicted
+        """
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+            evicted = 0
+            if total <= self.max_bytes:
+                return 0
+            for key, size in self._db.execute("SELECT key, size FROM objects ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._remove(key)
+                total -= size
+                evicted += 1
+            return evicted
+
+    def close(self):
+        """
+        Close the store index.
+        """
+        self._db.close()
+
+
+class _PreviewSpool(P4.OutputHandler):
+    """
+    Output handler that writes the revisions 'p4 sync -n' would update to a file as they arrive.
+
+    Spooling keeps the memory used by a preview constant however many files the synced unit holds.
+    """
+
+    def __init__(self, spool):
+        """
+        Args:
+            spool (file): A text file open for writing, one 'depotFile#rev' line is written per revision
+        """
+        P4.OutputHandler.__init__(self)
+        self.spool = spool
+
+    def outputStat(self, h):
+        if 'depotFile' in h and h.get('action') != 'deleted':
+            self.spool.write(f"{h['depotFile']}#{h['rev']}\n")
+        return P4.OutputHandler.HANDLED
+
+    def outputInfo(self, i):
+        return P4.OutputHandler.HANDLED
+
+
+def _batches(lines, size):
+    """
+    Yield the stripped lines of an iterable in lists of at most size entries.
+    """
+    batch = []
+    for line in lines:
+        batch.append(line.rstrip("\n"))
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class CachedSync:
+    """
+    Hooks that let sync_units() take files from a ContentStore before transferring a unit.
+    """
+
+    def __init__(self, store, client_name, workspace_path, writable):
+        """
+        Args:
+            store (ContentStore): The content store to use
+            client_name (str): The name of the client workspace being synced
+            workspace_path (str): The client workspace root
+            writable (bool): Whether the client syncs writable files
+        """
+        self.store = store
+        self.client_name = client_name
+        self.workspace_path = workspace_path
+        self.writable = writable
+
+    def _key(self, record):
+        return record['digest'] + ('.x' if _is_executable(record.get('headType', '')) else '')
+
+    def before(self, p4, spec, stats=None):
+        """
+        Materialize the files of a unit that are already in the store and record them in the have list.
+
+        Only the files that 'p4 sync -n' reports as needing an update are looked up, so an incremental sync
+        costs time in proportion to the changed files rather than to the size of the workspace. The preview is
+        spooled to a temporary file and looked up in batches of SYNC_BATCH_SIZE revisions.
+
+        Args:
+            p4 (P4.P4): A connected P4 client with the client workspace set
+            spec (str): The file specification about to be synced, including any revision
+            stats (SyncStats): Optional counters to which the materialized files are added
+
+        Returns:
+            list: (key, local path) pairs of the files that still need to be transferred
+        """
+        misses = []
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+            p4.run_sync("-n", spec, handler=_PreviewSpool(spool))
+            spool.seek(0)
+            for pending in _batches(spool, SYNC_BATCH_SIZE):
+                records = p4.run_fstat("-Ol", "-T", "depotFile,clientFile,headType,headRev,headModTime,digest",
+                                       *pending)
+                hits = []
+                for record in records:
+                    if not isinstance(record, dict) or not record.get('digest'):
+                        continue
+                    if not _is_cacheable(record.get('headType', '')):
+                        continue
+                    key = self._key(record)
+                    local_path = clients.local_path(record['clientFile'], self.client_name, self.workspace_path)
+                    stored_path = self.store.lookup(key)
+                    mod_time = int(record.get('headModTime') or 0)
+                    if stored_path and self.store.materialize(stored_path, local_path, self.writable, mod_time):
+                        hits.append(f"{record['depotFile']}#{record['headRev']}")
+                        if stats is not None:
+                            stats.add_cached(os.path.getsize(local_path))
+                    else:
+                        misses.append((key, local_path))
+                if hits:
+                    p4.run_sync("-k", *hits)
+        return misses
+
+    def after(self, misses):
+        """
+        Add the files transferred for a unit to the store.
+
+        Args:
+            misses (list): The value returned by before() for the unit
+        """
+        for key, local_path in misses:
+            if os.path.isfile(local_path):
+                self.store.add(key, local_path, link=not self.writable)
+        self.store.evict()
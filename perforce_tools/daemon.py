@@ -0,0 +1,468 @@
+"""
+Connection Daemon for Perforce Helix Core Python Tools.
+
+This module implements an optional local background process that keeps warm, authenticated connections
+per profile, so that short-lived phc commands do not pay for connecting and authenticating every time.
+
+The daemon listens on a Unix socket in the configuration directory and speaks a line-based JSON protocol.
+When it is running, config.get_p4_client() returns a DaemonClient, which mimics the parts of P4.P4 that the
+read-only commands use and runs each command on one of the daemon's pooled connections. When it is not
+running (or on platforms without Unix sockets), get_p4_client() connects directly as before.
+
+Commands that transfer files or need output handlers, such as sync-stream, always connect directly.
+"""
+
+import click
+import contextlib
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from perforce_tools import tracing
+from perforce_tools.config import CONFIG_DIR, ensure_config_dir, get_p4_client, get_profile
+from perforce_tools.connection_pool import ConnectionPool
+
+SOCKET_PATH = os.path.join(CONFIG_DIR, "phcd.sock")
+
+# Set to a non-empty value to make get_p4_client() ignore a running daemon
+DISABLE_ENV = "PHC_NO_DAEMON"
+
+# Warm connections kept per profile
+CONNECTIONS_PER_PROFILE = 4
+
+
+# The DaemonCommandError class, defined on first use by _command_error()
+_command_error_class = None
+_command_error_lock = threading.Lock()
+
+
+def _command_error():
+    """
+    Get the DaemonCommandError class, defining it on first use.
+
+    DaemonCommandError is raised by DaemonClient when a command fails on the daemon's connection. It derives
+    from P4.P4Exception, so callers handle the errors of both kinds of connection alike. The class is defined
+    lazily because connecting through the daemon does not import P4Python otherwise.
+
+    Returns:
+        type: The DaemonCommandError class
+    """
+    global _command_error_class
+    with _command_error_lock:
+        if _command_error_class is None:
+            import P4
+
+            class DaemonCommandError(P4.P4Exception):
+                """
+                Raised by DaemonClient when a command fails on the daemon's connection.
+                """
+
+            _command_error_class = DaemonCommandError
+    return _command_error_class
+
+
+def __getattr__(name):
+    # daemon.DaemonCommandError is resolved on first access
+    if name == "DaemonCommandError":
+        return _command_error()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def daemon_supported():
+    """
+    Check whether the daemon can be used on this platform and has not been disabled.
+
+    Returns:
+        bool: True if Unix sockets are available and PHC_NO_DAEMON is not set
+    """
+    return hasattr(socket, "AF_UNIX") and not os.environ.get(DISABLE_ENV)
+
+
+def _profile_key(profile):
+    """
+    Identify a profile's connection settings, so a changed profile gets fresh connections.
+    """
+    raw = json.dumps([profile.get("host"), profile.get("username"), profile.get("password")])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class _Channel:
+    """
+    A connection to the daemon socket carrying one JSON request and response per line.
+    """
+
+    def __init__(self, timeout=None):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(SOCKET_PATH)
+        self._sock.settimeout(None)
+        self._file = self._sock.makefile("rwb")
+
+    def request(self, message):
+        self._file.write(json.dumps(message, default=str).encode("utf-8") + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("The phc daemon closed the connection")
+        return json.loads(line)
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+class DaemonClient:
+    """
+    A stand-in for a connected P4.P4 that runs commands through the daemon.
+
+    Supports run(), the run_/fetch_/save_/delete_ shortcuts, at_exception_level() and the port, user,
+    client and exception_level attributes. Output handlers are not supported.
+    """
+
+    RAISE_NONE = 0
+    RAISE_ERRORS = 1
+    RAISE_ALL = 2
+
+    def __init__(self, channel, profile_name, port, user):
+        self._channel = channel
+        self.profile_name = profile_name
+        self.port = port
+        self.user = user
+        self.client = None
+        self.exception_level = DaemonClient.RAISE_ALL
+        self.warnings = []
+        self.errors = []
+
+    def connected(self):
+        return self._channel is not None
+
+    def disconnect(self):
+        if self._channel is not None:
+            self._channel.close()
+            self._channel = None
+
+    @contextlib.contextmanager
+    def at_exception_level(self, level):
+        previous, self.exception_level = self.exception_level, level
+        try:
+            yield
+        finally:
+            self.exception_level = previous
+
+    def run(self, *args, **kwargs):
+        """
+        Run a command on one of the daemon's connections, like P4.P4.run().
+        """
+        if "handler" in kwargs:
+            raise _command_error()("Output handlers are not supported through the phc daemon")
+        if self._channel is None:
+            raise _command_error()("Not connected to the phc daemon")
+
+        flat = []
+        for arg in args:
+            flat.extend(arg if isinstance(arg, (list, tuple)) else [arg])
+        try:
+            response = self._channel.request({
+                "op": "run",
+                "profile": self.profile_name,
+                "args": [str(arg) for arg in flat],
+                "input": kwargs.get("input"),
+                "client": self.client,
+                "exception_level": self.exception_level,
+            })
+        except (OSError, ValueError) as e:
+            raise _command_error()(f"Lost the connection to the phc daemon: {e}")
+        self.warnings = response.get("warnings", [])
+        self.errors = response.get("errors", [])
+        if "error" in response:
+            raise _command_error()(response["error"])
+        return response["result"]
+
+    def __getattr__(self, name):
+        if name.startswith("run_"):
+            return lambda *args, **kwargs: self.run(name[len("run_"):], *args, **kwargs)
+        if name.startswith("fetch_"):
+            return lambda *args, **kwargs: self.run(name[len("fetch_"):], "-o", *args, **kwargs)[0]
+        if name.startswith("save_"):
+            return lambda spec, *args, **kwargs: self.run(name[len("save_"):], "-i", *args, input=spec, **kwargs)
+        if name.startswith("delete_"):
+            return lambda *args, **kwargs: self.run(name[len("delete_"):], "-d", *args, **kwargs)
+        raise AttributeError(name)
+
+
+def connect_via_daemon(profile_name):
+    """
+    Get a DaemonClient for a profile if the daemon is running.
+
+    Args:
+        profile_name (str): The name of the profile to use
+
+    Returns:
+        DaemonClient: A client routed through the daemon, or None if the daemon is not available
+
+    Raises:
+        ValueError: If the daemon is running but cannot connect to the server with the profile
+    """
+    if not daemon_supported() or not os.path.exists(SOCKET_PATH):
+        return None
+    try:
+        channel = _Channel(timeout=1.0)
+        response = channel.request({"op": "open", "profile": profile_name})
+    except (OSError, ValueError):
+        return None
+
+    if "error" in response:
+        channel.close()
+        raise ValueError(response["error"])
+    return tracing.traced(DaemonClient)(channel, profile_name, response["port"], response["user"])
+
+
+class _DaemonState:
+    """
+    Warm connection pools of the running daemon, keyed by profile.
+    """
+
+    def __init__(self, idle_timeout):
+        self.idle_timeout = idle_timeout
+        self.started = time.time()
+        self.last_request = time.monotonic()
+        self.requests = 0
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def pool(self, profile_name):
+        profile = get_profile(profile_name)
+        key = _profile_key(profile)
+        with self._lock:
+            entry = self._pools.get(profile_name)
+            if entry is None or entry[0] != key:
+                if entry is not None:
+                    entry[1].close()
+                pool = ConnectionPool(lambda: get_p4_client(profile_name, direct=True), CONNECTIONS_PER_PROFILE)
+                entry = self._pools[profile_name] = (key, pool)
+            return entry[1]
+
+    def record_request(self):
+        with self._lock:
+            self.last_request = time.monotonic()
+            self.requests += 1
+
+    def status(self):
+        with self._lock:
+            requests = self.requests
+            profiles = sorted(self._pools)
+        return {"pid": os.getpid(), "uptime": time.time() - self.started, "requests": requests,
+                "profiles": profiles}
+
+    def close(self):
+        with self._lock:
+            for _, pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        state = self.server.state
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                break
+            state.record_request()
+            response = self._dispatch(state, request)
+            self.wfile.write(json.dumps(response, default=str).encode("utf-8") + b"\n")
+            self.wfile.flush()
+            if request.get("op") == "shutdown":
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                break
+
+    def _dispatch(self, state, request):
+        op = request.get("op")
+        try:
+            if op == "status":
+                return state.status()
+            if op == "shutdown":
+                return {"ok": True}
+            pool = state.pool(request["profile"])
+            with pool.connection() as p4:
+                if op == "open":
+                    return {"port": p4.port, "user": p4.user}
+                if op == "run":
+                    return self._run(p4, request)
+            return {"error": f"Unknown request '{op}'"}
+        except Exception as e:
+            return {"error": str(e)}
+
+    @staticmethod
+    def _run(p4, request):
+        default_client = p4.client
+        default_input = p4.input
+        if request.get("client"):
+            p4.client = request["client"]
+        if request.get("input") is not None:
+            p4.input = request["input"]
+        try:
+            with p4.at_exception_level(request.get("exception_level", 2)):
+                result = p4.run(*request["args"])
+            return {"result": result, "warnings": list(p4.warnings), "errors": list(p4.errors)}
+        except Exception as e:
+            return {"error": str(e), "warnings": list(p4.warnings), "errors": list(p4.errors)}
+        finally:
+            p4.client = default_client
+            p4.input = default_input
+
+
+class _DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _ping():
+    """
+    Ask a running daemon for its status.
+
+    Returns:
+        dict: The daemon status, or None if no daemon answers
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(SOCKET_PATH):
+        return None
+    try:
+        channel = _Channel(timeout=1.0)
+        try:
+            return channel.request({"op": "status"})
+        finally:
+            channel.close()
+    except (OSError, ValueError):
+        return None
+
+
+def serve(idle_timeout):
+    """
+    Run the daemon in the foreground until it is stopped or has been idle for idle_timeout seconds.
+
+    Args:
+        idle_timeout (float): Seconds without requests after which the daemon exits (0 to never exit)
+    """
+    ensure_config_dir()
+    if os.path.exists(SOCKET_PATH):
+        if _ping() is not None:
+            raise ValueError("The phc daemon is already running")
+        # Left behind by a daemon that did not shut down cleanly
+        os.remove(SOCKET_PATH)
+
+    # Only the current user may connect, since the daemon holds authenticated connections
+    previous_umask = os.umask(0o077)
+    try:
+        server = _DaemonServer(SOCKET_PATH, _RequestHandler)
+    finally:
+        os.umask(previous_umask)
+    server.state = _DaemonState(idle_timeout)
+
+    def reap_idle():
+        while idle_timeout:
+            time.sleep(min(idle_timeout, 10))
+            if time.monotonic() - server.state.last_request > idle_timeout:
+                server.shutdown()
+                return
+
+    threading.Thread(target=reap_idle, daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        server.state.close()
+        if os.path.exists(SOCKET_PATH):
+            os.remove(SOCKET_PATH)
+
+
+@click.group()
+def main():
+    """
+    Manage the background connection daemon.
+
+    The daemon keeps warm, authenticated connections per profile and is used automatically by the
+    read-only commands while it is running. Set PHC_NO_DAEMON=1 to bypass it.
+    """
+    pass
+
+
+@main.command()
+@click.option('--idle-timeout', type=click.FloatRange(min=0), default=1800, show_default=True,
+              help='Seconds without requests after which the daemon exits (0 to keep running)')
+def start(idle_timeout):
+    """
+    Start the daemon in the background.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        click.echo("Error: The phc daemon needs Unix domain sockets, which this platform does not support")
+        exit(1)
+    if _ping() is not None:
+        click.echo("The phc daemon is already running.")
+        return
+
+    subprocess.Popen([sys.executable, "-m", "perforce_tools.daemon", "serve", "--idle-timeout", str(idle_timeout)],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True)
+    for _ in range(50):
+        time.sleep(0.1)
+        status = _ping()
+        if status is not None:
+            click.echo(f"Started the phc daemon (pid {status['pid']}) on {SOCKET_PATH}")
+            return
+    click.echo("Error: The phc daemon did not start")
+    exit(1)
+
+
+@main.command(name='serve')
+@click.option('--idle-timeout', type=click.FloatRange(min=0), default=1800, show_default=True,
+              help='Seconds without requests after which the daemon exits (0 to keep running)')
+def serve_cmd(idle_timeout):
+    """
+    Run the daemon in the foreground.
+    """
+    try:
+        serve(idle_timeout)
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        exit(1)
+
+
+@main.command()
+def stop():
+    """
+    Stop a running daemon.
+    """
+    if _ping() is None:
+        click.echo("The phc daemon is not running.")
+        return
+    channel = _Channel(timeout=1.0)
+    try:
+        channel.request({"op": "shutdown"})
+    finally:
+        channel.close()
+    click.echo("Stopped the phc daemon.")
+
+
+@main.command()
+def status():
+    """
+    Show whether the daemon is running and which profiles it holds connections for.
+    """
+    status = _ping()
+    if status is None:
+        click.echo("The phc daemon is not running.")
+        return
+    click.echo(f"The phc daemon is running (pid {status['pid']}, up {status['uptime']:.0f}s, "
+               f"{status['requests']} requests)")
+    profiles = ", ".join(status['profiles']) or "none"
+    click.echo(f"Connected profiles: {profiles}")
+
+
+if __name__ == '__main__':
+    main()
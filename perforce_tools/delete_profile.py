@@ -5,7 +5,8 @@ This tool deletes a profile from the configuration file after confirmation.
 """
 
 import click
-from perforce_tools.config import load_config, save_config, get_profile
+from perforce_tools.config import update_config, get_profile, forget_ticket
+from perforce_tools.metadata_cache import forget_profile
 
 @click.command()
 @click.option('--profile', required=True, help='Profile name to delete')
@@ -33,9 +34,11 @@ def main(profile):
             return
         
         # Delete profile
-        config = load_config()
-        del config["profiles"][profile]
-        save_config(config)
+        with update_config() as config:
+            # Another process may have deleted it while waiting for confirmation
+            config["profiles"].pop(profile, None)
+        forget_ticket(profile)
+        forget_profile(profile)
         
         click.echo(f"Profile '{profile}' deleted successfully.")
         
@@ -0,0 +1,82 @@
+"""
+Profile Fan-out for Perforce Helix Core Python Tools.
+
+This module lets a command run the same query against several profiles at once. Every profile is queried
+on its own thread, so the total time is close to that of the slowest server rather than the sum of all of
+them, and a server that does not answer within the timeout is reported as failed instead of holding up
+the others.
+"""
+
+import re
+import threading
+import time
+from perforce_tools.config import load_config
+
+# Seconds to wait for each server when querying several profiles
+DEFAULT_TIMEOUT = 30.0
+
+
+def select_profiles(profile=None, all_profiles=False, profiles_pattern=None):
+    """
+    Resolve the profile options of a command into profile names.
+
+    Args:
+        profile (str): A single profile name (--profile)
+        all_profiles (bool): Use every profile in the configuration (--all-profiles)
+        profiles_pattern (str): Use the profiles whose names match this re.search pattern (--profiles)
+
+    Returns:
+        list: The selected profile names, sorted
+
+    Raises:
+        ValueError: If not exactly one of the options is given or no profile matches
+    """
+    if sum(1 for option in (profile, all_profiles, profiles_pattern) if option) != 1:
+        raise ValueError("Specify exactly one of --profile, --all-profiles and --profiles")
+    if profile:
+        return [profile]
+
+    names = sorted(load_config().get("profiles", {}))
+    if profiles_pattern:
+        names = [name for name in names if re.search(profiles_pattern, name)]
+    if not names:
+        raise ValueError("No profiles match" if profiles_pattern else "No profiles found")
+    return names
+
+
+def run_for_profiles(profile_names, query, timeout=DEFAULT_TIMEOUT):
+    """
+    Run a query for several profiles concurrently.
+
+    Queries that are still running when the timeout expires are abandoned; they run on daemon threads, so
+    they do not keep the process alive.
+
+    Args:
+        profile_names (list): The profiles to query
+        query (callable): Called with a profile name; returns the result for that profile
+        timeout (float): Seconds to wait for all profiles
+
+    Returns:
+        list: (profile name, result, error) tuples in the order of profile_names, where error is None or
+              a message describing why the query failed
+    """
+    outcomes = {}
+
+    def worker(name):
+        try:
+            outcomes[name] = (query(name), None)
+        except Exception as e:
+            outcomes[name] = (None, str(e))
+
+    threads = [threading.Thread(target=worker, args=(name,), daemon=True) for name in profile_names]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    results = []
+    for name in profile_names:
+        result, error = outcomes.get(name, (None, f"No answer within {timeout:g}s"))
+        results.append((name, result, error))
+    return results
@@ -0,0 +1,575 @@
+"""
+Changelist History Index for Perforce Helix Core Python Tools.
+
+This module mirrors the changelist metadata of chosen streams into a local SQLite database (history.db in the
+configuration directory), so that questions such as "what changed in this stream since change N" or "who
+touched this path in the last week" are answered locally in milliseconds, instead of scanning the server's
+change history every time.
+
+The index is updated incrementally. The highest indexed changelist of every stream is recorded, and an update
+only fetches the submitted changes above it: their descriptions with 'p4 changes -l', newest first in pages
+of CHANGES_PAGE, and their files with 'p4 describe -s', DESCRIBE_BATCH changes per command. Each page is
+written as soon as it has been fetched, and the highest indexed changelist is only moved once every page has
+been written, so an interrupted update is simply repeated by the next one.
+"""
+
+import click
+import functools
+import json
+import os
+import re
+import sqlite3
+import time
+
+from perforce_tools.clients import view_filter, wildcard_regex
+from perforce_tools.config import CONFIG_DIR, ensure_config_dir, get_profile, p4_connection
+
+HISTORY_FILE = os.path.join(CONFIG_DIR, "history.db")
+
+# Changes fetched per 'p4 changes' command
+CHANGES_PAGE = 1000
+
+# Changes whose files are fetched per 'p4 describe' command
+DESCRIBE_BATCH = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS streams (
+    server TEXT, stream TEXT, last_change INTEGER, updated REAL, PRIMARY KEY (server, stream));
+CREATE TABLE IF NOT EXISTS changes (
+    server TEXT, change INTEGER, user TEXT, client TEXT, time INTEGER, description TEXT,
+    PRIMARY KEY (server, change));
+CREATE TABLE IF NOT EXISTS stream_changes (
+    server TEXT, stream TEXT, change INTEGER, PRIMARY KEY (server, stream, change));
+CREATE TABLE IF NOT EXISTS files (
+    server TEXT, change INTEGER, depot_file TEXT, rev INTEGER, action TEXT, type TEXT,
+    PRIMARY KEY (server, change, depot_file));
+CREATE INDEX IF NOT EXISTS files_by_path ON files (server, depot_file);
+CREATE INDEX IF NOT EXISTS changes_by_time ON changes (server, time);
+"""
+
+
+def server_key(profile_name):
+    """
+    Get the key under which the history of a profile's server is indexed.
+
+    The user is part of the key, as the protections of different users may hide different files.
+    """
+    profile = get_profile(profile_name)
+    return f"{profile['host']}|{profile['username']}"
+
+
+@functools.lru_cache(maxsize=64)
+def _compiled(pattern):
+    return re.compile(pattern)
+
+
+def _regexp(pattern, value):
+    return value is not None and _compiled(pattern).fullmatch(value) is not None
+
+
+def path_condition(path, stream_path=None):
+    """
+    Translate a path filter into an SQL condition on files.depot_file.
+
+    Args:
+        path (str): A depot path ('//depot/main/src/...'), or a path relative to the stream root ('src'). Paths
+            may use the wildcards '*' and '...'; a path without wildcards matches the file or directory it names
+        stream_path (str): The stream relative paths refer to
+
+    Returns:
+        tuple: (SQL condition, list of parameters)
+
+    Raises:
+        ValueError: If a relative path is given without a stream, or leaves the stream root
+    """
+    if path.startswith('//'):
+        pattern = path.rstrip('/')
+    elif stream_path is None:
+        raise ValueError(f"Path '{path}' must be a depot path starting with '//' when no stream is given")
+    else:
+        pattern = f"{stream_path}/{view_filter([path])[0]}"
+        if pattern.endswith('/...') and '*' not in path and '...' not in path:
+            pattern = pattern[:-4]
+
+    if '*' not in pattern and '...' not in pattern:
+        # A file, or every file below a directory; both use the index on depot_file
+        return ("(f.depot_file = ? OR (f.depot_file >= ? AND f.depot_file < ?))",
+                [pattern, pattern + '/', pattern + '0'])
+    return "f.depot_file REGEXP ?", [wildcard_regex(pattern).pattern]
+
+
+class HistoryIndex:
+    """
+    The on-disk index of changelist metadata, keyed by server.
+    """
+
+    def __init__(self, path=HISTORY_FILE):
+        """
+        Open (or create) the index database.
+
+        Args:
+            path (str): The database file
+        """
+        ensure_config_dir()
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.create_function("REGEXP", 2, _regexp, deterministic=True)
+        with self._db:
+            self._db.executescript(SCHEMA)
+
+    def streams(self, server):
+        """
+        List the indexed streams of a server.
+
+        Returns:
+            list: One dict per stream, with 'stream', 'last_change', 'updated' and the number of 'changes'
+        """
+        rows = self._db.execute("SELECT s.stream, s.last_change, s.updated, "
+                                "(SELECT COUNT(*) FROM stream_changes c WHERE c.server = s.server AND c.stream = "
+                                "s.stream) FROM streams s WHERE s.server = ? ORDER BY s.stream", (server,))
+        return [{'stream': row[0], 'last_change': row[1], 'updated': row[2], 'changes': row[3]} for row in rows]
+
+    def last_change(self, server, stream_path):
+        """
+        Get the highest indexed changelist of a stream.
+
+        Returns:
+            int: The changelist number, 0 if the stream is indexed but has no changes, or None if it is not indexed
+        """
+        row = self._db.execute("SELECT last_change FROM streams WHERE server = ? AND stream = ?",
+                               (server, stream_path)).fetchone()
+        return None if row is None else row[0]
+
+    def store_changes(self, server, stream_path, changes, files):
+        """
+        Add changes and their files to the index.
+
+        Args:
+            server (str): The server key
+            stream_path (str): The stream the changes were listed for
+            changes (list): 'p4 changes -l' records
+            files (list): (change, depot file, revision, action, type) tuples
+        """
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO changes VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(server, int(c['change']), c.get('user'), c.get('client'), int(c.get('time') or 0),
+                                   c.get('desc')) for c in changes])
+            self._db.executemany("INSERT OR IGNORE INTO stream_changes VALUES (?, ?, ?)",
+                                 [(server, stream_path, int(c['change'])) for c in changes])
+            self._db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(server,) + entry for entry in files])
+
+    def set_last_change(self, server, stream_path, change):
+        """
+        Record the highest changelist of a stream that is completely indexed.
+        """
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO streams VALUES (?, ?, ?, ?)",
+                             (server, stream_path, change, time.time()))
+
+    def forget(self, server, stream_path):
+        """
+        Remove a stream from the index, with the changes no other indexed stream refers to.
+        """
+        with self._db:
+            self._db.execute("DELETE FROM streams WHERE server = ? AND stream = ?", (server, stream_path))
+            self._db.execute("DELETE FROM stream_changes WHERE server = ? AND stream = ?", (server, stream_path))
+            for table in ("changes", "files"):
+                self._db.execute(f"DELETE FROM {table} WHERE server = ? AND change NOT IN "
+                                 f"(SELECT change FROM stream_changes WHERE server = ?)", (server, server))
+
+    def _filters(self, server, stream_path, since, after_time, user, path):
+        """
+        Build the joins and conditions shared by the queries.
+        """
+        joins = ""
+        conditions = ["c.server = ?"]
+        params = [server]
+        if stream_path is not None:
+            joins = " JOIN stream_changes s ON s.server = c.server AND s.change = c.change AND s.stream = ?"
+            params.insert(0, stream_path)
+        if since is not None:
+            conditions.append("c.change > ?")
+            params.append(int(since))
+        if after_time is not None:
+            conditions.append("c.time >= ?")
+            params.append(int(after_time))
+        if user:
+            conditions.append("c.user = ?")
+            params.append(user)
+        if path:
+            condition, path_params = path_condition(path, stream_path)
+            conditions.append(f"EXISTS (SELECT 1 FROM files f WHERE f.server = c.server AND f.change = c.change "
+                              f"AND {condition})")
+            params.extend(path_params)
+        return joins, " AND ".join(conditions), params
+
+    def changes(self, server, stream_path=None, since=None, after_time=None, user=None, path=None, limit=None):
+        """
+        Query the indexed changes, newest first.
+
+        Args:
+            server (str): The server key
+            stream_path (str): Only changes listed for this stream
+            since (int): Only changes above this changelist number
+            after_time (float): Only changes submitted at or after this time
+            user (str): Only changes submitted by this user
+            path (str): Only changes touching this path (see path_condition())
+            limit (int): Maximum number of changes
+
+        Returns:
+            list: Dicts with 'change', 'user', 'client', 'time' and 'description'
+        """
+        joins, where, params = self._filters(server, stream_path, since, after_time, user, path)
+        query = (f"SELECT c.change, c.user, c.client, c.time, c.description FROM changes c{joins} WHERE {where} "
+                 f"ORDER BY c.change DESC")
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return [{'change': row[0], 'user': row[1], 'client': row[2], 'time': row[3], 'description': row[4]}
+                for row in self._db.execute(query, params)]
+
+    def files(self, server, change, path=None, stream_path=None):
+        """
+        List the indexed files of a change.
+
+        Returns:
+            list: Dicts with 'depotFile', 'rev', 'action' and 'type'
+        """
+        query = "SELECT f.depot_file, f.rev, f.action, f.type FROM files f WHERE f.server = ? AND f.change = ?"
+        params = [server, change]
+        if path:
+            condition, path_params = path_condition(path, stream_path)
+            query += f" AND {condition}"
+            params.extend(path_params)
+        return [{'depotFile': row[0], 'rev': row[1], 'action': row[2], 'type': row[3]}
+                for row in self._db.execute(query + " ORDER BY f.depot_file", params)]
+
+    def authors(self, server, stream_path=None, since=None, after_time=None, path=None):
+        """
+        Summarize who submitted the indexed changes, most recent first.
+
+        Args:
+            server (str): The server key
+            stream_path (str): Only changes listed for this stream
+            since (int): Only changes above this changelist number
+            after_time (float): Only changes submitted at or after this time
+            path (str): Only changes, and files, under this path (see path_condition())
+
+        Returns:
+            list: Dicts with 'user', the number of 'changes' and of 'files' they touched, and their 'last_change'
+                  and its 'time'
+        """
+        joins, where, params = self._filters(server, stream_path, since, after_time, None, None)
+        joins += " JOIN files f ON f.server = c.server AND f.change = c.change"
+        if path:
+            condition, path_params = path_condition(path, stream_path)
+            where += f" AND {condition}"
+            params.extend(path_params)
+        query = (f"SELECT c.user, COUNT(DISTINCT c.change), COUNT(*), MAX(c.change), MAX(c.time) FROM changes c{joins} "
+                 f"WHERE {where} GROUP BY c.user ORDER BY MAX(c.change) DESC")
+        return [{'user': row[0], 'changes': row[1], 'files': row[2], 'last_change': row[3], 'time': row[4]}
+                for row in self._db.execute(query, params)]
+
+    def close(self):
+        self._db.close()
+
+
+def _describe_files(p4, numbers):
+    """
+    Fetch the files of changes with 'p4 describe -s'.
+
+    Returns:
+        list: (change, depot file, revision, action, type) tuples
+    """
+    files = []
+    for i in range(0, len(numbers), DESCRIBE_BATCH):
+        with p4.at_exception_level(p4.RAISE_ERRORS):
+            records = p4.run("describe", "-s", *numbers[i:i + DESCRIBE_BATCH])
+        for record in records:
+            if not isinstance(record, dict) or 'depotFile' not in record:
+                continue
+            count = len(record['depotFile'])
+            columns = [record.get(field) or [None] * count for field in ('rev', 'action', 'type')]
+            for depot_file, rev, action, file_type in zip(record['depotFile'], *columns):
+                files.append((int(record['change']), depot_file, int(rev) if rev else None, action, file_type))
+    return files
+
+
+def update_stream(index, p4, server, stream_path, since=None, echo=click.echo):
+    """
+    Fetch the changes of a stream that are not indexed yet.
+
+    Args:
+        index (HistoryIndex): The open index
+        p4 (P4.P4): A connected P4 client
+        server (str): The server key, as returned by server_key()
+        stream_path (str): The full stream path, e.g. '//depot/main'
+        since (str): For a stream that is not indexed yet, the first changelist number or date ('2024/01/31')
+            to index; by default its whole history is indexed
+        echo (callable): Function used to print messages
+
+    Returns:
+        int: The number of new changes
+    """
+    last = index.last_change(server, stream_path)
+    low = str(last + 1) if last is not None else (since or "1")
+    high = "now"
+    count = 0
+    newest = last or 0
+    while True:
+        with p4.at_exception_level(p4.RAISE_ERRORS):
+            page = p4.run("changes", "-l", "-s", "submitted", "-m", str(CHANGES_PAGE),
+                          f"{stream_path}/...@{low},@{high}")
+        page = [record for record in page if isinstance(record, dict) and 'change' in record]
+        if not page:
+            break
+        index.store_changes(server, stream_path, page, _describe_files(p4, [record['change'] for record in page]))
+        count += len(page)
+        newest = max(newest, int(page[0]['change']))
+        if len(page) < CHANGES_PAGE:
+            break
+        # The next page ends below the oldest change of this one
+        high = int(page[-1]['change']) - 1
+        echo(f"  {stream_path}: fetched {count} changes...")
+    index.set_last_change(server, stream_path, newest)
+    return count
+
+
+def _update(index, profile, server, stream_paths, since=None, echo=click.echo):
+    """
+    Update several streams on one connection, printing the number of new changes of each.
+    """
+    with p4_connection(profile) as p4:
+        for stream_path in stream_paths:
+            start = time.monotonic()
+            count = update_stream(index, p4, server, stream_path, since, echo)
+            echo(f"  {stream_path}: {count} new changes, indexed up to "
+                 f"@{index.last_change(server, stream_path)} ({time.monotonic() - start:.1f}s)")
+
+
+def _stream_path(depot, stream):
+    if bool(depot) != bool(stream):
+        raise ValueError("--depot and --stream must be given together")
+    return f"//{depot}/{stream}" if depot else None
+
+
+def _prepare_query(index, profile, stream_path, update):
+    """
+    Check that a stream is indexed, updating it first if requested.
+
+    Returns:
+        str: The server key
+    """
+    server = server_key(profile)
+    if update:
+        streams = [stream_path] if stream_path else [s['stream'] for s in index.streams(server)]
+        _update(index, profile, server, streams, echo=lambda message: click.echo(message, err=True))
+    if stream_path is not None and index.last_change(server, stream_path) is None:
+        raise ValueError(f"Stream '{stream_path}' is not indexed; run 'phc history update' for it first")
+    return server
+
+
+def _format_time(value):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(value)) if value else "unknown"
+
+
+@click.group()
+def main():
+    """
+    Query a local index of the changelist history of streams.
+
+    'history update' mirrors the changelist metadata of streams into a local index, fetching only the changes
+    submitted since its last update. 'history changes' and 'history authors' answer from the index without
+    contacting the server, unless --update is given.
+    """
+    pass
+
+
+@main.command()
+@click.option('--profile', required=True, help='Profile name to use for connection')
+@click.option('--depot', required=False, help='Depot of a stream to index')
+@click.option('--stream', required=False, help='Stream to index; all indexed streams of the server by default')
+@click.option('--since', required=False,
+              help='For a stream that is not indexed yet, the first changelist number or date (2024/01/31) to index')
+def update(profile, depot, stream, since):
+    """
+    Add a stream to the history index, or fetch the new changes of indexed streams.
+    """
+    try:
+        stream_path = _stream_path(depot, stream)
+        index = HistoryIndex()
+        try:
+            server = server_key(profile)
+            streams = [stream_path] if stream_path else [s['stream'] for s in index.streams(server)]
+            if not streams:
+                raise ValueError("No streams are indexed for this server; give --depot and --stream")
+            click.echo(f"Updating the history of {len(streams)} streams...")
+            _update(index, profile, server, streams, since)
+        finally:
+            index.close()
+
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        exit(1)
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}")
+        exit(1)
+
+
+@main.command()
+@click.option('--profile', required=True, help='Profile name to use for connection')
+@click.option('--depot', required=False, help='Depot name containing the stream')
+@click.option('--stream', required=False, help='Only list changes of this stream')
+@click.option('--since', type=click.IntRange(min=0), required=False, help='Only list changes after this changelist')
+@click.option('--days', type=click.FloatRange(min=0), required=False,
+              help='Only list changes submitted in the last N days')
+@click.option('--user', required=False, help='Only list changes submitted by this user')
+@click.option('--path', required=False,
+              help='Only list changes touching this path, relative to the stream root or a depot path; '
+                   'may use * and ...')
+@click.option('--files', 'show_files', is_flag=True, help='List the files of every change')
+@click.option('--limit', type=click.IntRange(min=1), default=100, show_default=True,
+              help='Maximum number of changes to list')
+@click.option('--format', 'output_format', type=click.Choice(['text', 'json']), default='text', show_default=True,
+              help='Output format')
+@click.option('--update', 'update_first', is_flag=True, help='Fetch new changes from the server first')
+def changes(profile, depot, stream, since, days, user, path, show_files, limit, output_format, update_first):
+    """
+    List the indexed changes of streams, newest first.
+    """
+    try:
+        stream_path = _stream_path(depot, stream)
+        index = HistoryIndex()
+        try:
+            server = _prepare_query(index, profile, stream_path, update_first)
+            after_time = time.time() - days * 86400 if days is not None else None
+            results = index.changes(server, stream_path, since, after_time, user, path, limit)
+            if show_files:
+                for change in results:
+                    change['files'] = index.files(server, change['change'], path, stream_path)
+        finally:
+            index.close()
+
+        if output_format == 'json':
+            click.echo(json.dumps(results, indent=2))
+            return
+        if not results:
+            click.echo("No changes found.")
+            return
+        for change in results:
+            summary = (change['description'] or '').strip().split('\n')[0]
+            click.echo(f"  {change['change']}  {_format_time(change['time'])}  {change['user']}@{change['client']}  "
+                       f"{summary}")
+            for record in change.get('files', []):
+                click.echo(f"      {record['depotFile']}#{record['rev']} {record['action']}")
+
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        exit(1)
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}")
+        exit(1)
+
+
+@main.command()
+@click.option('--profile', required=True, help='Profile name to use for connection')
+@click.option('--depot', required=False, help='Depot name containing the stream')
+@click.option('--stream', required=False, help='Only count changes of this stream')
+@click.option('--path', required=False,
+              help='Only count files under this path, relative to the stream root or a depot path; may use * and ...')
+@click.option('--since', type=click.IntRange(min=0), required=False, help='Only count changes after this changelist')
+@click.option('--days', type=click.FloatRange(min=0), default=7, show_default=True,
+              help='Only count changes submitted in the last N days (0 counts all)')
+@click.option('--format', 'output_format', type=click.Choice(['text', 'json']), default='text', show_default=True,
+              help='Output format')
+@click.option('--update', 'update_first', is_flag=True, help='Fetch new changes from the server first')
+def authors(profile, depot, stream, path, since, days, output_format, update_first):
+    """
+    List who submitted the indexed changes of streams or paths.
+    """
+    try:
+        stream_path = _stream_path(depot, stream)
+        index = HistoryIndex()
+        try:
+            server = _prepare_query(index, profile, stream_path, update_first)
+            after_time = time.time() - days * 86400 if days else None
+            results = index.authors(server, stream_path, since, after_time, path)
+        finally:
+            index.close()
+
+        if output_format == 'json':
+            click.echo(json.dumps(results, indent=2))
+            return
+        if not results:
+            click.echo("No changes found.")
+            return
+        for entry in results:
+            click.echo(f"  {entry['user']}: {entry['changes']} changes, {entry['files']} files, last @"
+                       f"{entry['last_change']} on {_format_time(entry['time'])}")
+
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        exit(1)
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}")
+        exit(1)
+
+
+@main.command()
+@click.option('--profile', required=True, help='Profile name to use for connection')
+def status(profile):
+    """
+    List the indexed streams of a profile's server.
+    """
+    try:
+        index = HistoryIndex()
+        try:
+            streams = index.streams(server_key(profile))
+        finally:
+            index.close()
+
+        if not streams:
+            click.echo("No streams are indexed for this server.")
+            return
+        for entry in streams:
+            click.echo(f"  {entry['stream']}: {entry['changes']} changes up to @{entry['last_change']}, "
+                       f"updated {_format_time(entry['updated'])}")
+
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        exit(1)
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}")
+        exit(1)
+
+
+@main.command()
+@click.option('--profile', required=True, help='Profile name to use for connection')
+@click.option('--depot', required=True, help='Depot name containing the stream')
+@click.option('--stream', required=True, help='Stream to remove from the index')
+def forget(profile, depot, stream):
+    """
+    Remove a stream from the history index.
+    """
+    try:
+        stream_path = _stream_path(depot, stream)
+        index = HistoryIndex()
+        try:
+            server = server_key(profile)
+            if index.last_change(server, stream_path) is None:
+                raise ValueError(f"Stream '{stream_path}' is not indexed")
+            index.forget(server, stream_path)
+        finally:
+            index.close()
+        click.echo(f"Removed '{stream_path}' from the history index.")
+
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        exit(1)
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,43 +5,85 @@ This tool lists all depots on the server with an optional pattern filter.
 """
 
 import click
-import re
 import sys
-from perforce_tools.config import get_p4_client, warn_pattern_quoting
+from perforce_tools import api
+from perforce_tools.config import get_profile, warn_pattern_quoting
+from perforce_tools.fan_out import DEFAULT_TIMEOUT, run_for_profiles, select_profiles
 
 @click.command()
-@click.option('--profile', required=True, help='Profile name to use for connection')
+@click.option('--profile', required=False, help='Profile name to use for connection')
+@click.option('--all-profiles', is_flag=True, help='List the depots on the servers of all profiles')
+@click.option('--profiles', 'profiles_pattern', required=False,
+              help='List the depots on the servers of the profiles whose names match this regex pattern')
 @click.option('--pattern', required=False, 
               help='Regex pattern to filter depot names (enclose in quotes to avoid shell interpretation)')
-def main(profile, pattern):
+@click.option('--refresh', is_flag=True, help='Ignore cached results and ask the server')
+@click.option('--offline', is_flag=True, help='Only use cached results, without contacting the server')
+@click.option('--timeout', type=click.FloatRange(min=0), default=DEFAULT_TIMEOUT, show_default=True,
+              help='Seconds to wait for the servers when listing several profiles')
+def main(profile, all_profiles, profiles_pattern, pattern, refresh, offline, timeout):
     """
     List all depots on the server.
 
     Connects using the specified profile and runs 'p4 depots'.
-    If --pattern is supplied, filters the depot names using a Python re.search pattern.
-    """
-    try:
-        p4 = get_p4_client(profile)
+    If --pattern is supplied, filters the depot names using a Python re.search pattern. Simple patterns are
+    also passed to the server as a name filter, so it only sends depots that can match.
 
-        click.echo(f"Connected to {p4.port} as {p4.user}")
-        click.echo("Listing depots...")
+    With --all-profiles or --profiles, the servers of several profiles are queried at the same time and
+    each depot is tagged with the profile it was found on.
 
-        depots = p4.run("depots")
+    Results are cached locally and reused while no changelist has been submitted on the server.
+    Use --refresh to always ask the server, or --offline to never contact it.
+    """
+    try:
+        if refresh and offline:
+            raise ValueError("--refresh and --offline cannot be used together")
+        profile_names = select_profiles(profile, all_profiles, profiles_pattern)
 
         if pattern:
             warn_pattern_quoting(pattern)
             click.echo(f"Filtering depots with pattern: {pattern}")
-            depots = [depot for depot in depots if re.search(pattern, depot["name"])]
 
-        if not depots:
-            click.echo("No depots found.")
+        if profile:
+            click.echo("Listing depots...")
+            result = api.list_depots(profile, pattern, refresh, offline)
+            depots = result['depots']
+            if result['age'] is None:
+                profile_data = get_profile(profile)
+                click.echo(f"Connected to {profile_data['host']} as {profile_data['username']}")
+            else:
+                click.echo(result['source'])
+
+            if not depots:
+                click.echo("No depots found.")
+                return
+
+            click.echo("\nDepots:")
+            for depot in depots:
+                click.echo(f"  {depot['name']} - {depot['desc']}")
             return
 
-        click.echo("\nDepots:")
-        for depot in depots:
-            click.echo(f"  {depot['name']} - {depot['desc']}")
+        click.echo(f"Listing depots on {len(profile_names)} profiles...")
+        results = run_for_profiles(profile_names, lambda name: api.list_depots(name, pattern, refresh, offline),
+                                   timeout)
+
+        found = [(name, depot) for name, result, _ in results if result for depot in result['depots']]
+        if found:
+            click.echo("\nDepots:")
+            for name, depot in found:
+                click.echo(f"  [{name}] {depot['name']} - {depot['desc']}")
+        else:
+            click.echo("No depots found.")
+
+        click.echo("\nProfiles:")
+        for name, result, error in results:
+            if error:
+                click.echo(f"  {name}: Error: {error}")
+            else:
+                click.echo(f"  {name}: {len(result['depots'])} depots - {result['source']}")
 
-        p4.disconnect()
+        if any(error for _, _, error in results):
+            exit(1)
 
     except ValueError as e:
         click.echo(f"Error: {e}")
@@ -0,0 +1,201 @@
+"""
+List Files Tool for Perforce Helix Core Python Tools.
+
+This tool lists the files in a stream, writing them as NDJSON or TSV while the listing is in progress.
+
+Instead of a single 'p4 files //stream/...', which may exceed the server's result limits (MaxResults,
+MaxScanRows) and must be held in memory as a whole, the stream is walked one directory at a time: every
+query returns the files directly inside one directory, and its records are written out before the next
+directory is queried. Memory use therefore depends on the largest directory, not on the size of the stream.
+
+Directories are listed in pages of at most PAGE_SIZE files. A directory whose first page is full, or whose
+listing exceeds the server's limits, is listed again in parts: the files whose names start with each of the
+possible next characters, split further in the same way until every part fits in a page. The possible next
+characters are the printable ASCII characters and the other characters found in the full page; wildcards cannot
+select the remaining characters, so names that continue with a character outside printable ASCII that the page
+did not reach are not listed.
+"""
+
+import click
+import json
+from perforce_tools import api
+
+# Fields of 'p4 files' records written to the output
+FIELDS = ["depotFile", "rev", "change", "action", "type", "time"]
+
+# Maximum number of files requested by one 'p4 files' command
+PAGE_SIZE = 10000
+
+# Characters a file name part is split on: printable ASCII other than '/' and the characters that depot paths
+# only hold escaped ('@', '#', '*' and '%' become '%40', '%23', '%2A' and '%25')
+NAME_CHARS = "".join(chr(code) for code in range(0x20, 0x7f) if chr(code) not in "/@#*")
+
+# Characters that can follow the '%' starting an escaped character
+ESCAPE_CHARS = "0123456789ABCDEF"
+
+# Messages of the errors raised when a query exceeds the MaxResults, MaxScanRows or MaxLockTime limits
+LIMIT_ERRORS = ("Request too large", "Too many rows scanned", "Operation took too long")
+
+
+def _name_chars(prefix, page, case_sensitive):
+    """
+    Get the characters that can follow a file name prefix, in sorted order.
+
+    Args:
+        prefix (str): The start of the file names
+        page (list): File records already returned for the prefix; other characters found after the prefix
+            in their names are added
+        case_sensitive (bool): Whether the server distinguishes upper and lower case file names
+
+    Returns:
+        list: The characters
+    """
+    if "%" in prefix[-2:]:
+        chars = set(ESCAPE_CHARS)
+    else:
+        chars = {char for char in NAME_CHARS if case_sensitive or not char.islower()}
+        if prefix.endswith(".."):
+            # '...' is a wildcard and cannot occur in a file name
+            chars.discard(".")
+    for record in page:
+        name = record["depotFile"].rsplit("/", 1)[-1]
+        if len(name) > len(prefix) and not name[len(prefix)].isascii():
+            chars.add(name[len(prefix)])
+    return sorted(chars)
+
+
+def _is_case_sensitive(p4):
+    """
+    Check whether the server distinguishes upper and lower case file names.
+    """
+    with p4.at_exception_level(p4.RAISE_ERRORS):
+        info = p4.run("info")
+    return not any(isinstance(entry, dict) and entry.get("caseHandling") == "insensitive" for entry in info)
+
+
+def _list_page(p4, files_args, pattern):
+    """
+    Run one 'p4 files' query limited to PAGE_SIZE files.
+
+    Returns:
+        list: The file records, or None if the query exceeded the server's limits
+    """
+    try:
+        with p4.at_exception_level(p4.RAISE_ERRORS):
+            records = p4.run("files", *files_args, "-m", str(PAGE_SIZE), pattern)
+    except Exception as e:
+        # P4 is only imported here, as a connection through the daemon does not load it otherwise
+        import P4
+
+        if not isinstance(e, P4.P4Exception) or not any(message in str(e) for message in LIMIT_ERRORS):
+            raise
+        return None
+    return [record for record in records if isinstance(record, dict) and "depotFile" in record]
+
+
+def _iter_directory(p4, files_args, directory, prefix="", case_sensitive=None):
+    """
+    Yield the files directly inside a directory whose names start with a prefix, in pages.
+
+    Yields:
+        dict: One 'p4 files' record per file
+    """
+    page = _list_page(p4, files_args, f"{directory}/{prefix}*")
+    if page is not None and len(page) < PAGE_SIZE:
+        yield from page
+        return
+
+    # The listing may be incomplete, so list the file named by the prefix itself and then each longer prefix
+    if case_sensitive is None:
+        case_sensitive = _is_case_sensitive(p4)
+    if prefix and "%" not in prefix[-2:]:
+        yield from _list_page(p4, files_args, f"{directory}/{prefix}") or []
+    for char in _name_chars(prefix, page or [], case_sensitive):
+        yield from _iter_directory(p4, files_args, directory, prefix + char, case_sensitive)
+
+
+def iter_files(p4, root, include_deleted=False):
+    """
+    Walk a depot directory tree, yielding its files one directory at a time.
+
+    Directories are visited depth first in sorted order, and the files of each directory are yielded
+    before its subdirectories are queried. The files of a directory are listed in pages of at most
+    PAGE_SIZE files.
+
+    Args:
+        p4 (P4.P4): A connected P4 client
+        root (str): The depot directory to walk, e.g. '//depot/main'
+        include_deleted (bool): Also yield files whose head revision is deleted
+
+    Yields:
+        dict: One 'p4 files' record per file
+    """
+    files_args = [] if include_deleted else ["-e"]
+    dirs_args = ["-D"] if include_deleted else []
+    pending = [root.rstrip("/")]
+
+    while pending:
+        directory = pending.pop()
+        # Empty directories and directories without files directly inside them are reported as warnings
+        yield from _iter_directory(p4, files_args, directory)
+        with p4.at_exception_level(p4.RAISE_ERRORS):
+            subdirectories = p4.run("dirs", *dirs_args, f"{directory}/*")
+
+        pending.extend(sorted((entry["dir"] for entry in subdirectories), reverse=True))
+
+
+def format_record(record, output_format):
+    """
+    Format a file record as one line of output.
+
+    Args:
+        record (dict): A 'p4 files' record
+        output_format (str): 'ndjson' or 'tsv'
+
+    Returns:
+        str: The line, without a trailing newline
+    """
+    if output_format == "ndjson":
+        return json.dumps({field: record.get(field) for field in FIELDS})
+    return "\t".join(str(record.get(field, "")) for field in FIELDS)
+
+
+@click.command()
+@click.option('--profile', required=True, help='Profile name to use for connection')
+@click.option('--depot', required=True, help='Depot name containing the stream')
+@click.option('--stream', required=True, help='Stream name to list files from')
+@click.option('--path', 'sub_path', required=False, help='Only list files below this directory of the stream')
+@click.option('--format', 'output_format', type=click.Choice(['ndjson', 'tsv']), default='ndjson', show_default=True,
+              help='Output format: one JSON object per line, or tab-separated values with a header line')
+@click.option('--output', type=click.Path(dir_okay=False, writable=True, allow_dash=True), default='-',
+              show_default=True, help='File to write the listing to')
+@click.option('--include-deleted', is_flag=True, help='Also list files whose head revision is deleted')
+def main(profile, depot, stream, sub_path, output_format, output, include_deleted):
+    """
+    List the files in a stream.
+
+    The stream is walked one directory at a time and each directory's files are written as soon as they
+    arrive, so very large streams can be listed without hitting server result limits or holding the listing
+    in memory. Status messages are written to stderr, so the output can be piped.
+    """
+    try:
+        count = 0
+        with click.open_file(output, 'w') as out:
+            if output_format == 'tsv':
+                out.write("\t".join(FIELDS) + "\n")
+            for record in api.list_files(profile, depot, stream, sub_path, include_deleted,
+                                         echo=lambda message: click.echo(message, err=True)):
+                out.write(format_record(record, output_format) + "\n")
+                count += 1
+
+        click.echo(f"Listed {count} files", err=True)
+
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        exit(1)
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}", err=True)
+        exit(1)
+
+if __name__ == '__main__':
+    main()
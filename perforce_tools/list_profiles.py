@@ -16,7 +16,7 @@ def main(pattern):
     """
     List all profiles in the configuration file.
 
-    Shows the profile name, host, and username for each profile.
+    Shows the profile name, host, and username for each profile, and the transfer tuning settings it sets.
     If --pattern is supplied, filters the profile names using a Python re.search pattern.
     """
     try:
@@ -38,7 +38,12 @@ def main(pattern):
 
         click.echo("\nProfiles:")
         for name, profile in profiles.items():
-            click.echo(f"  {name} - Host: {profile['host']} - Username: {profile['username']}")
+            line = f"  {name} - Host: {profile['host']} - Username: {profile['username']}"
+            if profile.get('tuning'):
+                tuning = dict(profile['tuning'])
+                tuning.update(tuning.pop('tunables', None) or {})
+                line += " - Tuning: " + ", ".join(f"{key}={value}" for key, value in tuning.items())
+            click.echo(line)
 
     except Exception as e:
         click.echo(f"Unexpected error: {e}")
@@ -5,44 +5,89 @@ This tool lists all streams in a given depot with an optional pattern filter.
 """
 
 import click
-import re
 import sys
-from perforce_tools.config import get_p4_client, warn_pattern_quoting
+from perforce_tools import api
+from perforce_tools.config import get_profile, warn_pattern_quoting
+from perforce_tools.fan_out import DEFAULT_TIMEOUT, run_for_profiles, select_profiles
+
+def _format_stream(stream):
+    return f"{stream['Stream']} - {stream.get('Type', 'N/A')} - {stream.get('Description', 'No description')}"
 
 @click.command()
-@click.option('--profile', required=True, help='Profile name to use for connection')
+@click.option('--profile', required=False, help='Profile name to use for connection')
+@click.option('--all-profiles', is_flag=True, help='List the streams on the servers of all profiles')
+@click.option('--profiles', 'profiles_pattern', required=False,
+              help='List the streams on the servers of the profiles whose names match this regex pattern')
 @click.option('--depot', required=True, help='Depot name to list streams from')
 @click.option('--pattern', required=False, 
               help='Regex pattern to filter stream names (enclose in quotes to avoid shell interpretation)')
-def main(profile, depot, pattern):
+@click.option('--refresh', is_flag=True, help='Ignore cached results and ask the server')
+@click.option('--offline', is_flag=True, help='Only use cached results, without contacting the server')
+@click.option('--timeout', type=click.FloatRange(min=0), default=DEFAULT_TIMEOUT, show_default=True,
+              help='Seconds to wait for the servers when listing several profiles')
+def main(profile, all_profiles, profiles_pattern, depot, pattern, refresh, offline, timeout):
     """
     List all streams in a given depot.
 
-    Connects using the specified profile and runs 'p4 streams //depot/...'.
-    If --pattern is supplied, filters the stream names using a Python re.search pattern.
-    """
-    try:
-        p4 = get_p4_client(profile)
+    Connects using the specified profile and runs 'p4 streams //depot/...', fetching only the displayed fields.
+    If --pattern is supplied, filters the stream names using a Python re.search pattern. Simple patterns are
+    also passed to the server as a filter expression, so it only sends streams that can match.
 
-        click.echo(f"Connected to {p4.port} as {p4.user}")
-        click.echo(f"Listing streams in depot '{depot}'...")
+    With --all-profiles or --profiles, the servers of several profiles are queried at the same time and
+    each stream is tagged with the profile it was found on.
 
-        streams = p4.run("streams", f"//{depot}/...")
+    Results are cached locally and reused while no changelist has been submitted on the server.
+    Use --refresh to always ask the server, or --offline to never contact it.
+    """
+    try:
+        if refresh and offline:
+            raise ValueError("--refresh and --offline cannot be used together")
+        profile_names = select_profiles(profile, all_profiles, profiles_pattern)
 
         if pattern:
             warn_pattern_quoting(pattern)
             click.echo(f"Filtering streams with pattern: {pattern}")
-            streams = [stream for stream in streams if re.search(pattern, stream["Stream"])]
 
-        if not streams:
-            click.echo("No streams found.")
+        if profile:
+            click.echo(f"Listing streams in depot '{depot}'...")
+            result = api.list_streams(profile, depot, pattern, refresh, offline)
+            streams = result['streams']
+            if result['age'] is None:
+                profile_data = get_profile(profile)
+                click.echo(f"Connected to {profile_data['host']} as {profile_data['username']}")
+            else:
+                click.echo(result['source'])
+
+            if not streams:
+                click.echo("No streams found.")
+                return
+
+            click.echo("\nStreams:")
+            for stream in streams:
+                click.echo(f"  {_format_stream(stream)}")
             return
 
-        click.echo("\nStreams:")
-        for stream in streams:
-            click.echo(f"  {stream['Stream']} - {stream.get('Type', 'N/A')} - {stream.get('Description', 'No description')}")
+        click.echo(f"Listing streams in depot '{depot}' on {len(profile_names)} profiles...")
+        results = run_for_profiles(profile_names,
+                                   lambda name: api.list_streams(name, depot, pattern, refresh, offline), timeout)
+
+        found = [(name, stream) for name, result, _ in results if result for stream in result['streams']]
+        if found:
+            click.echo("\nStreams:")
+            for name, stream in found:
+                click.echo(f"  [{name}] {_format_stream(stream)}")
+        else:
+            click.echo("No streams found.")
+
+        click.echo("\nProfiles:")
+        for name, result, error in results:
+            if error:
+                click.echo(f"  {name}: Error: {error}")
+            else:
+                click.echo(f"  {name}: {len(result['streams'])} streams - {result['source']}")
 
-        p4.disconnect()
+        if any(error for _, _, error in results):
+            exit(1)
 
     except ValueError as e:
         click.echo(f"Error: {e}")
@@ -0,0 +1,194 @@
+"""
+Metadata Cache for Perforce Helix Core Python Tools.
+
+This module keeps the results of server queries that rarely change, such as 'p4 depots' and 'p4 streams',
+in a local SQLite database so that repeated listings can be answered without contacting the server.
+
+Cached results are used as-is for a short time (the TTL). After that, the server's 'change' counter is
+read: if no changelist was submitted since the results were fetched they are kept for another TTL,
+otherwise they are fetched again. Results older than MAX_AGE are always fetched again, since some
+changes, such as editing a stream spec or creating a depot, do not move the counter.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from perforce_tools.config import CONFIG_DIR, ensure_config_dir, get_profile, p4_connection
+
+CACHE_FILE = os.path.join(CONFIG_DIR, "metadata.db")
+
+# Seconds during which cached results are used without contacting the server
+DEFAULT_TTL = 300
+
+# Seconds after which cached results are fetched again even if the change counter did not move
+MAX_AGE = 3600
+
+
+def _server_key(profile):
+    return f"{profile['host']}|{profile['username']}"
+
+
+def server_counter(p4):
+    """
+    Read the server's 'change' counter.
+
+    Args:
+        p4 (P4.P4): A connected P4 client
+
+    Returns:
+        str: The counter value, or None if it cannot be read
+    """
+    try:
+        with p4.at_exception_level(p4.RAISE_ERRORS):
+            result = p4.run("counter", "change")
+    except Exception as e:
+        # P4 is only imported here, as a connection through the daemon does not load it otherwise
+        import P4
+
+        if not isinstance(e, P4.P4Exception):
+            raise
+        # Treated as unknown, so the cached results are fetched again
+        return None
+    return result[0].get("value") if result else None
+
+
+class MetadataCache:
+    """
+    The on-disk cache of query results, keyed by profile and query.
+    """
+
+    def __init__(self, path=CACHE_FILE):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path (str): The database file
+        """
+        ensure_config_dir()
+        self._db = sqlite3.connect(path, timeout=30)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                             "profile TEXT, query TEXT, server TEXT, counter TEXT, fetched REAL, validated REAL, "
+                             "records TEXT, PRIMARY KEY (profile, query))")
+
+    def lookup(self, profile_name, query, server):
+        """
+        Get a cached entry.
+
+        Returns:
+            dict: The entry with 'counter', 'fetched', 'validated' and 'records', or None if there is none
+                  for the profile's current server and user
+        """
+        row = self._db.execute("SELECT counter, fetched, validated, records FROM entries "
+                               "WHERE profile = ? AND query = ? AND server = ?",
+                               (profile_name, query, server)).fetchone()
+        if row is None:
+            return None
+        return {"counter": row[0], "fetched": row[1], "validated": row[2], "records": json.loads(row[3])}
+
+    def store(self, profile_name, query, server, counter, records):
+        now = time.time()
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (profile_name, query, server, counter, now, now, json.dumps(records)))
+
+    def touch(self, profile_name, query):
+        """
+        Record that a cached entry was confirmed to be current.
+        """
+        with self._db:
+            self._db.execute("UPDATE entries SET validated = ? WHERE profile = ? AND query = ?",
+                             (time.time(), profile_name, query))
+
+    def forget(self, profile_name):
+        """
+        Drop every cached entry of a profile.
+        """
+        with self._db:
+            self._db.execute("DELETE FROM entries WHERE profile = ?", (profile_name,))
+
+    def close(self):
+        self._db.close()
+
+
+def cached_run(profile_name, args, refresh=False, offline=False, ttl=DEFAULT_TTL, pool=None):
+    """
+    Run a read-only query for a profile, answering from the metadata cache when possible.
+
+    Args:
+        profile_name (str): The name of the profile to use
+        args (list): The command and its arguments, e.g. ['streams', '//depot/...']
+        refresh (bool): Ignore cached results and fetch from the server
+        offline (bool): Only use cached results, without contacting the server
+        ttl (float): Seconds during which cached results are used without contacting the server
+        pool (ConnectionPool): Optional pool of the profile to take the connection from, instead of connecting
+
+    Returns:
+        tuple: (records, age), where age is the number of seconds since the records were fetched from the
+               server, or None if they were just fetched
+
+    Raises:
+        ValueError: If the profile does not exist, the connection fails, or there are no cached results
+                    in offline mode
+    """
+    profile = get_profile(profile_name)
+    server = _server_key(profile)
+    query = json.dumps(args)
+
+    cache = MetadataCache()
+    try:
+        entry = None if refresh else cache.lookup(profile_name, query, server)
+        now = time.time()
+        if offline:
+            if entry is None:
+                raise ValueError(f"No cached results for profile '{profile_name}'; run the command once without "
+                                 f"--offline")
+            return entry["records"], now - entry["fetched"]
+        if entry is not None and now - entry["validated"] < ttl:
+            return entry["records"], now - entry["fetched"]
+
+        with p4_connection(profile_name, pool=pool) as p4:
+            counter = server_counter(p4)
+            if (entry is not None and counter is not None and counter == entry["counter"]
+                    and now - entry["fetched"] < MAX_AGE):
+                cache.touch(profile_name, query)
+                return entry["records"], now - entry["fetched"]
+
+            records = p4.run(*args)
+            cache.store(profile_name, query, server, counter, records)
+            return records, None
+    finally:
+        cache.close()
+
+
+def describe_source(profile, age):
+    """
+    Describe where the results of cached_run() came from, for command output.
+
+    Args:
+        profile (dict): The profile the results are for
+        age (float): The age returned by cached_run()
+
+    Returns:
+        str: e.g. 'Fetched from ssl:p4:1666 as super'
+    """
+    if age is None:
+        return f"Fetched from {profile['host']} as {profile['username']}"
+    return f"Using cached results for {profile['host']} from {age:.0f}s ago (--refresh to update)"
+
+
+def forget_profile(profile_name):
+    """
+    Drop the cached results of a profile, e.g. after it was changed or deleted.
+
+    Args:
+        profile_name (str): The name of the profile
+    """
+    if not os.path.exists(CACHE_FILE):
+        return
+    cache = MetadataCache()
+    try:
+        cache.forget(profile_name)
+    finally:
+        cache.close()
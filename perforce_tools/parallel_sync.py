@@ -0,0 +1,241 @@
+"""
+Parallel Sync for Perforce Helix Core Python Tools.
+
+This module spreads a sync across several transfer threads. When the server has parallel file transfer
+enabled (net.parallel.max), the work is handed to the server with 'p4 sync --parallel'. Otherwise the client
+view is split into subdirectory units which are synced concurrently over a pool of connections.
+"""
+
+import collections
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import P4
+
+from perforce_tools.sync_stats import SyncOutputHandler, SyncStats
+
+# Number of work units planned per worker, so that uneven directories still balance across workers
+UNITS_PER_WORKER = 4
+
+
+def server_parallel_limit(p4):
+    """
+    Get the maximum number of parallel transfer threads the server allows.
+
+    Args:
+        p4 (P4.P4): A connected P4 client
+
+    Returns:
+        int: The value of net.parallel.max, or 0 if parallel sync is disabled or cannot be determined
+    """
+    try:
+        with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+            result = p4.run("configure", "show", "net.parallel.max")
+    except P4.P4Exception:
+        # 'configure show' needs super access; treat an unreadable setting as disabled
+        return 0
+
+    for entry in result:
+        if isinstance(entry, dict):
+            try:
+                return int(entry.get("Value"))
+            except (TypeError, ValueError):
+                continue
+    return 0
+
+
+def server_parallel_args(threads, tuning=None):
+    """
+    Build the arguments of 'p4 sync --parallel' for server-side parallel transfer.
+
+    Args:
+        threads (int): The number of transfer threads
+        tuning (dict): Optional profile tuning (see config.TUNING_DEFAULTS) whose parallel_batch,
+            parallel_batchsize, parallel_min and parallel_minsize settings are passed on
+
+    Returns:
+        list: e.g. ['--parallel', 'threads=4,batch=16']
+    """
+    options = [f"threads={threads}"]
+    for key in ("batch", "batchsize", "min", "minsize"):
+        value = (tuning or {}).get(f"parallel_{key}")
+        if value is not None:
+            options.append(f"{key}={value}")
+    return ["--parallel", ",".join(options)]
+
+
+def plan_sync_units(p4, client_name, min_units, revision=None, have=False):
+    """
+    Split a client view into independent sync units.
+
+    Directories are expanded breadth first. An expanded directory contributes a unit for the files
+    directly inside it ('dir/*'), while directories that are not expanded are synced whole ('dir/...').
+
+    Args:
+        p4 (P4.P4): A connected P4 client with the client workspace set
+        client_name (str): The name of the client workspace
+        min_units (int): Stop expanding once at least this many units are planned
+        revision (str): Optional changelist or label the units are synced to; directories are listed as of
+            that revision, so that directories whose files were all deleted since are still planned
+        have (bool): Also plan the directories holding files on the client's have list, so that syncing the
+            units removes the files of directories that hold no files at the revision
+
+    Returns:
+        list: File specifications which together cover the whole client view exactly once
+    """
+    units = []
+    frontier = collections.deque([f"//{client_name}"])
+    suffix = f"@{revision}" if revision else ""
+
+    with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+        while frontier and len(units) + len(frontier) < min_units:
+            directory = frontier.popleft()
+            units.append(f"{directory}/*")
+            subdirectories = {entry["dir"] for entry in p4.run("dirs", f"{directory}/*{suffix}")}
+            if have:
+                subdirectories.update(entry["dir"] for entry in p4.run("dirs", "-H", f"{directory}/*"))
+            frontier.extend(sorted(subdirectories))
+
+    units.extend(f"{directory}/..." for directory in frontier)
+    return units
+
+
+def latest_change(p4, client_name):
+    """
+    Get the most recent submitted changelist affecting a client view.
+
+    Args:
+        p4 (P4.P4): A connected P4 client
+        client_name (str): The name of the client workspace
+
+    Returns:
+        str: The changelist number, or None if no changes have been submitted to the view
+    """
+    with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+        changes = p4.run_changes("-m1", "-s", "submitted", f"//{client_name}/...")
+    return changes[0]["change"] if changes else None
+
+
+def _sync_unit(p4, spec, handler, cache, *args):
+    """
+    Sync one unit, taking files from the content store first when one is configured.
+    """
+    misses = cache.before(p4, spec, handler.stats) if cache is not None else None
+    p4.run_sync(*args, spec, handler=handler)
+    if cache is not None:
+        cache.after(misses)
+
+
+def sync_units(p4, units, stats, reporter=None, revision=None, on_unit_done=None, cache=None):
+    """
+    Sync a sequence of units one after another on a single connection.
+
+    Args:
+        p4 (P4.P4): A connected P4 client with the client workspace set
+        units (iterable): The file specifications to sync
+        stats (SyncStats): The counters to update
+        reporter (ProgressReporter): Optional reporter that prints progress while the sync runs
+        revision (str): Optional changelist or label to sync each unit to
+        on_unit_done (callable): Optional callback called with each unit once it has been synced completely
+        cache (CachedSync): Optional content store hooks used to skip transferring files already cached locally
+
+    Returns:
+        SyncStats: The updated counters
+    """
+    handler = SyncOutputHandler(stats, reporter)
+    suffix = f"@{revision}" if revision else ""
+    with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+        for unit in units:
+            _sync_unit(p4, unit + suffix, handler, cache)
+            if on_unit_done is not None:
+                on_unit_done(unit)
+    stats.stop()
+    return stats
+
+
+def _drain(units):
+    """
+    Yield units from a shared queue until it is empty.
+    """
+    while True:
+        try:
+            yield units.get_nowait()
+        except queue.Empty:
+            return
+
+
+def _sync_worker(pool, client_name, units, stats, reporter, revision, on_unit_done, cache):
+    """
+    Sync units from the shared queue on one pooled connection until the queue is empty.
+
+    A worker that cannot get a connection without waiting leaves the work to the others.
+    """
+    p4 = pool.try_acquire()
+    if p4 is None:
+        return None
+    try:
+        p4.client = client_name
+        return sync_units(p4, _drain(units), stats, reporter, revision, on_unit_done, cache)
+    finally:
+        pool.release(p4)
+
+
+def parallel_sync(p4, pool, client_name, parallel, units, reporter=None, revision=None, on_unit_done=None,
+                  cache=None, tuning=None):
+    """
+    Sync a client workspace using several transfer threads.
+
+    The calling thread syncs on the given connection as the first worker, and the other workers take
+    connections from the pool. Workers for which the pool has no connection to spare are skipped, so a
+    shared pool never blocks the sync.
+
+    Args:
+        p4 (P4.P4): A connected P4 client with the client workspace set
+        pool (ConnectionPool): The pool the additional workers take their connections from
+        client_name (str): The name of the client workspace
+        parallel (int): The number of transfer threads to use
+        units (list): The units to sync, as planned by plan_sync_units()
+        reporter (ProgressReporter): Optional reporter that prints progress while the sync runs
+        revision (str): Optional changelist or label to sync each unit to
+        on_unit_done (callable): Optional callback called with each unit once it has been synced completely
+        cache (CachedSync): Optional content store hooks used to skip transferring files already cached locally
+        tuning (dict): Optional profile tuning with the batch and threshold settings of server-side parallel sync
+
+    Returns:
+        tuple: (mode, stats) where mode is 'server' or 'client' and stats is a list of SyncStats,
+        one per worker (a single entry in server mode, where the server manages the threads)
+    """
+    limit = server_parallel_limit(p4)
+    if limit > 1:
+        threads = min(parallel, limit)
+        stats = SyncStats(f"server ({threads} threads)")
+        if reporter is not None:
+            reporter.track(stats)
+        handler = SyncOutputHandler(stats, reporter)
+        suffix = f"@{revision}" if revision else ""
+        args = server_parallel_args(threads, tuning)
+        with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+            for unit in units:
+                _sync_unit(p4, unit + suffix, handler, cache, *args)
+                if on_unit_done is not None:
+                    on_unit_done(unit)
+        stats.stop()
+        return "server", [stats]
+
+    pending = queue.Queue()
+    for unit in units:
+        pending.put(unit)
+
+    worker_stats = [SyncStats(f"worker {i + 1}") for i in range(parallel)]
+    if reporter is not None:
+        for stats in worker_stats:
+            reporter.track(stats)
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel - 1)) as executor:
+        futures = [executor.submit(_sync_worker, pool, client_name, pending, stats, reporter, revision,
+                                   on_unit_done, cache)
+                   for stats in worker_stats[1:]]
+        sync_units(p4, _drain(pending), worker_stats[0], reporter, revision, on_unit_done, cache)
+        stats = [worker_stats[0]] + [future.result() for future in futures]
+
+    return "client", [s for s in stats if s is not None]
@@ -1,33 +1,90 @@
 """
 Main CLI entry point for Perforce Helix Core Python Tools.
 
-This module defines the main 'phc' command group and imports the existing commands as subcommands.
+This module defines the main 'phc' command group and registers the existing commands as subcommands.
+
+Subcommand modules are imported only when their command is invoked, so that commands which do not talk
+to a server, and 'phc --help', start without loading P4Python or the modules of every other command.
 """
 
+import importlib
 import click
-from perforce_tools.save_profile import main as save_profile_cmd
-from perforce_tools.list_depots import main as list_depots_cmd
-from perforce_tools.list_streams import main as list_streams_cmd
-from perforce_tools.list_profiles import main as list_profiles_cmd
-from perforce_tools.delete_profile import main as delete_profile_cmd
-from perforce_tools.sync_stream import main as sync_stream_cmd
-
-@click.group()
-def cli():
+from perforce_tools import tracing
+
+# Subcommands: name -> (module defining a 'main' command, short help shown by 'phc --help')
+LAZY_COMMANDS = {
+    'save-profile': ('perforce_tools.save_profile', 'Add a new named profile to the config file.'),
+    'list-depots': ('perforce_tools.list_depots', 'List all depots on the server.'),
+    'list-streams': ('perforce_tools.list_streams', 'List all streams in a given depot.'),
+    'list-files': ('perforce_tools.list_files', 'List the files in a stream.'),
+    'list-profiles': ('perforce_tools.list_profiles', 'List all profiles in the configuration file.'),
+    'delete-profile': ('perforce_tools.delete_profile', 'Delete a profile from the configuration file.'),
+    'sync-stream': ('perforce_tools.sync_stream', 'Sync a stream to a local workspace path.'),
+    'sync-streams': ('perforce_tools.sync_streams', 'Sync a batch of streams listed in a manifest.'),
+    'verify-workspace': ('perforce_tools.verify_workspace', 'Verify a synced workspace against the server.'),
+    'client-pool': ('perforce_tools.client_pool', 'Manage the pool of reusable client workspaces.'),
+    'history': ('perforce_tools.history', 'Query a local index of the changelist history of streams.'),
+    'tune-profile': ('perforce_tools.tune_profile', 'Find the fastest transfer settings for a profile and store them.'),
+    'daemon': ('perforce_tools.daemon', 'Manage the background connection daemon.'),
+}
+
+
+class LazyGroup(click.Group):
+    """
+    A command group that imports the module of a subcommand only when the subcommand is used.
+    """
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            module_name, _ = self.lazy_commands[cmd_name]
+            self.add_command(importlib.import_module(module_name).main, name=cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        """
+        List the subcommands with their stored short help, without importing them.
+        """
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.lazy_commands and name not in self.commands:
+                rows.append((name, self.lazy_commands[name][1]))
+            else:
+                command = self.get_command(ctx, name)
+                if command is not None and not command.hidden:
+                    rows.append((name, command.get_short_help_str()))
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+@click.group(cls=LazyGroup, lazy_commands=LAZY_COMMANDS)
+@click.option('--trace', 'trace_path', type=click.Path(dir_okay=False, writable=True), required=False,
+              help='Record the time spent in each server command and local step, and write it to this file')
+@click.option('--trace-format', type=click.Choice(tracing.FORMATS), default='json', show_default=True,
+              help='Format of the --trace file: a JSON timing report, or a Chrome trace file')
+@click.pass_context
+def cli(ctx, trace_path, trace_format):
     """
     Perforce Helix Core Python Tools.
 
     A suite of command-line tools for interacting with Perforce Helix Core server.
     """
-    pass
-
-# Add commands to the group
-cli.add_command(save_profile_cmd, name='save-profile')
-cli.add_command(list_depots_cmd, name='list-depots')
-cli.add_command(list_streams_cmd, name='list-streams')
-cli.add_command(list_profiles_cmd, name='list-profiles')
-cli.add_command(delete_profile_cmd, name='delete-profile')
-cli.add_command(sync_stream_cmd, name='sync-stream')
+    if trace_path:
+        tracing.enable(trace_path, trace_format)
+        ctx.call_on_close(_write_trace)
+        ctx.with_resource(tracing.span(f"phc {ctx.invoked_subcommand}", "command"))
+
+
+def _write_trace():
+    path = tracing.finish()
+    click.echo(f"Trace written to '{path}'", err=True)
 
 if __name__ == '__main__':
     cli()
@@ -0,0 +1,112 @@
+"""
+Server-side Filters for Perforce Helix Core Python Tools.
+
+This module translates the --pattern regular expressions of the list commands into the wildcard filters that
+'p4 depots -e' and 'p4 streams -F' understand, so the server only sends the depots and streams that can
+match, and builds the queries so that 'p4 streams' only returns the fields the commands display.
+
+A translated filter may match more names than the regular expression (for example '.' becomes '*'), but
+never fewer, so the commands still apply the regular expression to the results. Patterns that cannot be
+translated are only applied on the client, as before.
+"""
+
+import re
+
+# Fields of 'p4 streams' shown by list-streams
+STREAM_FIELDS = ["Stream", "Type", "Description"]
+
+# Characters that can be passed through to a server wildcard unchanged
+_LITERAL = re.compile(r"[A-Za-z0-9_\-/]")
+
+# Characters that may follow a backslash and stand for themselves
+_ESCAPABLE = "._-/"
+
+
+def regex_to_wildcard(pattern):
+    """
+    Translate a Python re.search pattern into a Perforce wildcard that matches a superset of the same names.
+
+    Literal characters, '^' and '$' anchors, '.' and '.*'-style repetitions are translated. The rest of the
+    pattern after any other regular expression syntax is replaced by '*', since the part before it must
+    still match. Patterns with alternatives ('|') cannot be translated.
+
+    Args:
+        pattern (str): The regular expression
+
+    Returns:
+        str: The wildcard, e.g. '*release-*' for 'release-', or None if the pattern cannot be translated or
+             would not filter anything
+    """
+    if not pattern or "|" in pattern:
+        return None
+
+    i = 0
+    anchored_start = pattern.startswith("^")
+    if anchored_start:
+        i = 1
+    anchored_end = False
+    parts = []
+    while i < len(pattern):
+        char = pattern[i]
+        following = pattern[i + 1] if i + 1 < len(pattern) else ""
+        if char == "$" and i == len(pattern) - 1:
+            anchored_end = True
+            i += 1
+        elif char == "\\" and following and following in _ESCAPABLE:
+            parts.append(following)
+            i += 2
+        elif char == ".":
+            parts.append("*")
+            i += 2 if following in ("*", "+", "?") else 1
+        elif _LITERAL.match(char) and following not in ("*", "+", "?", "{"):
+            parts.append(char)
+            i += 1
+        else:
+            parts.append("*")
+            anchored_end = False
+            break
+
+    wildcard = "".join(parts)
+    if not anchored_start:
+        wildcard = "*" + wildcard
+    if not anchored_end:
+        wildcard += "*"
+    wildcard = re.sub(r"\*+", "*", wildcard)
+    if not wildcard.strip("*"):
+        return None
+    return wildcard
+
+
+def depots_query(pattern=None):
+    """
+    Build the 'p4 depots' command for a name pattern.
+
+    Args:
+        pattern (str): Optional regular expression the depot names must match
+
+    Returns:
+        list: The command and its arguments, e.g. ['depots', '-e', '*project*']
+    """
+    wildcard = regex_to_wildcard(pattern)
+    if wildcard is None:
+        return ["depots"]
+    return ["depots", "-e", wildcard]
+
+
+def streams_query(depot, pattern=None):
+    """
+    Build the 'p4 streams' command for a depot and stream path pattern.
+
+    Args:
+        depot (str): The depot to list streams from
+        pattern (str): Optional regular expression the stream paths must match
+
+    Returns:
+        list: The command and its arguments, e.g. ['streams', '-T', 'Stream,Type,Description',
+              '-F', 'Stream=*main*', '//depot/...']
+    """
+    args = ["streams", "-T", ",".join(STREAM_FIELDS)]
+    wildcard = regex_to_wildcard(pattern)
+    if wildcard is not None:
+        args += ["-F", f"Stream={wildcard}"]
+    return args + [f"//{depot}/..."]
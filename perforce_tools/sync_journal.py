@@ -0,0 +1,187 @@
+"""
+Sync Journal for Perforce Helix Core Python Tools.
+
+This module records the progress of a sync in a small local checkpoint journal, so that a sync which dies
+partway through can be resumed without transferring the completed parts again.
+
+The journal is a JSON-lines file kept in the configuration directory, one per workspace path. The first
+line holds the target changelist and the planned sync units; every following line records one completed
+unit. Appending a line per unit keeps writes cheap, and a torn final line from a crash is simply ignored.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from perforce_tools.config import CONFIG_DIR, ensure_config_dir
+
+JOURNAL_DIR = os.path.join(CONFIG_DIR, "journals")
+
+# Minimum number of parts a sync is split into, which bounds how much is transferred again on resume
+CHECKPOINT_UNITS = 16
+
+# Placeholder for the client name in stored units, since a resumed sync uses a new temporary client
+CLIENT_PLACEHOLDER = "//{client}/"
+
+
+def journal_path(workspace_path):
+    """
+    Get the path of the journal file for a workspace path.
+
+    Args:
+        workspace_path (str): The local workspace path
+
+    Returns:
+        str: The journal file path
+    """
+    key = os.path.abspath(workspace_path).encode('utf-8')
+    return os.path.join(JOURNAL_DIR, hashlib.sha1(key).hexdigest() + ".jsonl")
+
+
+def _to_stored(unit, client_name):
+    prefix = f"//{client_name}/"
+    return CLIENT_PLACEHOLDER + unit[len(prefix):] if unit.startswith(prefix) else unit
+
+
+def _from_stored(unit, client_name):
+    prefix = f"//{client_name}/"
+    return prefix + unit[len(CLIENT_PLACEHOLDER):] if unit.startswith(CLIENT_PLACEHOLDER) else unit
+
+
+class SyncJournal:
+    """
+    A checkpoint journal for one sync into one workspace path.
+    """
+
+    def __init__(self, path, header, completed):
+        self.path = path
+        self.header = header
+        self.completed = completed
+        self._lock = threading.Lock()
+
+    @property
+    def change(self):
+        """str: The changelist or label the sync targets, or None if the stream had no submitted changes."""
+        return self.header.get("change")
+
+    @property
+    def include(self):
+        """list: The paths the client view was narrowed to, if any."""
+        return self.header.get("include", [])
+
+    @property
+    def exclude(self):
+        """list: The paths removed from the client view, if any."""
+        return self.header.get("exclude", [])
+
+    @classmethod
+    def create(cls, workspace_path, profile_name, stream_path, change, units, client_name, include=(),
+               exclude=()):
+        """
+        Start a new journal, replacing any previous journal for the workspace path.
+
+        Args:
+            workspace_path (str): The local workspace path
+            profile_name (str): The profile used for the connection
+            stream_path (str): The full stream path, e.g. '//depot/main'
+            change (str): The changelist (or label) the sync targets
+            units (list): The planned sync units, in client terms
+            client_name (str): The name of the client workspace the units refer to
+            include (list): The paths the client view was narrowed to, which a resumed sync must use as well
+            exclude (list): The paths removed from the client view
+
+        Returns:
+            SyncJournal: The new journal
+        """
+        ensure_config_dir()
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+
+        header = {
+            "profile": profile_name,
+            "stream": stream_path,
+            "workspace_path": os.path.abspath(workspace_path),
+            "change": change,
+            "units": [_to_stored(unit, client_name) for unit in units],
+            "include": list(include),
+            "exclude": list(exclude),
+        }
+        path = journal_path(workspace_path)
+        with open(path, 'w') as f:
+            f.write(json.dumps(header) + "\n")
+        return cls(path, header, set())
+
+    @classmethod
+    def load(cls, workspace_path):
+        """
+        Load the journal for a workspace path.
+
+        Args:
+            workspace_path (str): The local workspace path
+
+        Returns:
+            SyncJournal: The journal, or None if there is no usable journal for the workspace path
+        """
+        path = journal_path(workspace_path)
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            return None
+
+        completed = set()
+        for line in lines[1:]:
+            try:
+                completed.add(json.loads(line)["done"])
+            except (ValueError, KeyError, TypeError):
+                # A crash can leave the last line half written
+                continue
+        return cls(path, header, completed)
+
+    def matches(self, profile_name, stream_path):
+        """
+        Check whether the journal was written for the same profile and stream.
+
+        Returns:
+            bool: True if the journal can be used to resume this sync
+        """
+        return self.header.get("profile") == profile_name and self.header.get("stream") == stream_path
+
+    def remaining_units(self, client_name):
+        """
+        Get the planned units that have not been completed yet.
+
+        Args:
+            client_name (str): The name of the client workspace to express the units for
+
+        Returns:
+            list: The remaining sync units, in client terms
+        """
+        return [_from_stored(unit, client_name) for unit in self.header["units"] if unit not in self.completed]
+
+    def mark_done(self, unit, client_name):
+        """
+        Record that a unit has been synced completely. Safe to call from several threads.
+
+        Args:
+            unit (str): The completed unit, in client terms
+            client_name (str): The name of the client workspace the unit refers to
+        """
+        stored = _to_stored(unit, client_name)
+        with self._lock:
+            self.completed.add(stored)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({"done": stored}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def remove(self):
+        """
+        Delete the journal once the sync has finished.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
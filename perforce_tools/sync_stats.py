@@ -0,0 +1,246 @@
+"""
+Sync Statistics for Perforce Helix Core Python Tools.
+
+This module keeps running counters of files and bytes transferred by a sync and formats them for display.
+Sync results are consumed through a P4Python output handler as they arrive, so memory use stays constant no
+matter how many files a stream contains, and progress can be reported while the sync is still running.
+"""
+
+import threading
+import time
+
+import P4
+
+
+def _to_int(value):
+    """
+    Convert a tagged field value to an int, treating missing or malformed values as 0.
+    """
+    try:
+        return int(value or 0)
+    except ValueError:
+        return 0
+
+
+def format_bytes(num_bytes):
+    """
+    Format a byte count using binary units.
+
+    Args:
+        num_bytes (float): The number of bytes
+
+    Returns:
+        str: A human readable size such as '12.3 MB'
+    """
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if abs(num_bytes) < 1024 or unit == 'TB':
+            return f"{num_bytes:.1f} {unit}" if unit != 'B' else f"{int(num_bytes)} B"
+        num_bytes /= 1024.0
+
+
+class SyncStats:
+    """
+    Running counters for the files and bytes transferred by one sync worker.
+    """
+
+    def __init__(self, name=None):
+        """
+        Start a new set of counters.
+
+        Args:
+            name (str): Optional label used when reporting, e.g. 'worker 1'
+        """
+        self.name = name
+        self.files = 0
+        self.bytes = 0
+        self.expected_files = 0
+        self.expected_bytes = 0
+        # Files and bytes taken from the content store instead of being transferred
+        self.cached_files = 0
+        self.cached_bytes = 0
+        self.start_time = time.monotonic()
+        self.end_time = None
+
+    def add_record(self, record):
+        """
+        Count a single tagged 'p4 sync' result record.
+
+        Args:
+            record (dict): A tagged sync record; non-file records are ignored
+        """
+        if isinstance(record, dict) and 'depotFile' in record:
+            self.files += 1
+            self.bytes += _to_int(record.get('fileSize'))
+            # The first record of every sync carries the totals for that sync
+            self.expected_files += _to_int(record.get('totalFileCount'))
+            self.expected_bytes += _to_int(record.get('totalFileSize'))
+
+    def add_cached(self, size):
+        """
+        Count a file materialized from the content store.
+
+        Args:
+            size (int): The size of the file in bytes
+        """
+        self.cached_files += 1
+        self.cached_bytes += size
+
+    def add_records(self, records):
+        """
+        Count a list of tagged 'p4 sync' result records.
+
+        Args:
+            records (list): The records returned by p4.run_sync()
+        """
+        for record in records:
+            self.add_record(record)
+
+    @classmethod
+    def combine(cls, stats_list, name=None):
+        """
+        Sum the counters of several workers that ran side by side.
+
+        Args:
+            stats_list (list): The SyncStats to combine
+            name (str): Optional label for the combined counters
+
+        Returns:
+            SyncStats: Counters covering the earliest start to the latest stop
+        """
+        combined = cls(name)
+        for stats in stats_list:
+            combined.files += stats.files
+            combined.bytes += stats.bytes
+            combined.expected_files += stats.expected_files
+            combined.expected_bytes += stats.expected_bytes
+            combined.cached_files += stats.cached_files
+            combined.cached_bytes += stats.cached_bytes
+        if stats_list:
+            combined.start_time = min(stats.start_time for stats in stats_list)
+            combined.end_time = max(stats.start_time + stats.elapsed for stats in stats_list)
+        return combined
+
+    def stop(self):
+        """
+        Freeze the elapsed time.
+        """
+        if self.end_time is None:
+            self.end_time = time.monotonic()
+
+    @property
+    def elapsed(self):
+        """float: Seconds since the counters were started (or until they were stopped)."""
+        end = self.end_time if self.end_time is not None else time.monotonic()
+        return end - self.start_time
+
+    @property
+    def throughput(self):
+        """float: Bytes transferred per second."""
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        """
+        Describe the counters in one line.
+
+        Returns:
+            str: e.g. '1200 files, 45.0 MB in 3.2s (14.1 MB/s)', followed by e.g.
+            '; 300 files, 9.0 MB from the content cache' if files were taken from the content store
+        """
+        summary = (f"{self.files} files, {format_bytes(self.bytes)} in {self.elapsed:.1f}s "
+                   f"({format_bytes(self.throughput)}/s)")
+        if self.cached_files:
+            summary += f"; {self.cached_files} files, {format_bytes(self.cached_bytes)} from the content cache"
+        return summary
+
+
+class ProgressReporter:
+    """
+    Prints periodic progress lines summed across one or more SyncStats.
+
+    Safe to call from several sync worker threads at once.
+    """
+
+    def __init__(self, echo, interval=5.0, show_totals=True):
+        """
+        Args:
+            echo (callable): Function used to print a progress line, e.g. click.echo
+            interval (float): Minimum seconds between progress lines; 0 disables reporting
+            show_totals (bool): Include the expected totals reported by the server in each line
+        """
+        self._echo = echo
+        self._interval = interval
+        self._show_totals = show_totals
+        self._stats = []
+        self._lock = threading.Lock()
+        self._start_time = time.monotonic()
+        self._last_report = self._start_time
+
+    def track(self, stats):
+        """
+        Include a set of counters in the progress lines.
+
+        Args:
+            stats (SyncStats): The counters to include
+
+        Returns:
+            SyncStats: The same counters, for convenience
+        """
+        with self._lock:
+            self._stats.append(stats)
+        return stats
+
+    def maybe_report(self):
+        """
+        Print a progress line if at least the configured interval has passed since the last one.
+        """
+        if not self._interval:
+            return
+        now = time.monotonic()
+        if now - self._last_report < self._interval:
+            return
+        with self._lock:
+            if now - self._last_report < self._interval:
+                return
+            self._last_report = now
+            files = sum(stats.files for stats in self._stats)
+            num_bytes = sum(stats.bytes for stats in self._stats)
+            expected_files = sum(stats.expected_files for stats in self._stats)
+            expected_bytes = sum(stats.expected_bytes for stats in self._stats)
+            rate = num_bytes / (now - self._start_time)
+
+            if self._show_totals and expected_files:
+                percent = 100.0 * num_bytes / expected_bytes if expected_bytes else 100.0 * files / expected_files
+                line = (f"  Progress: {files}/{expected_files} files, {format_bytes(num_bytes)}/"
+                        f"{format_bytes(expected_bytes)} ({percent:.0f}%) at {format_bytes(rate)}/s")
+            else:
+                line = f"  Progress: {files} files, {format_bytes(num_bytes)} at {format_bytes(rate)}/s"
+            self._echo(line)
+
+
+class SyncOutputHandler(P4.OutputHandler):
+    """
+    Output handler that counts 'p4 sync' records as they arrive instead of collecting them.
+
+    Tagged records are marked as handled so P4Python never builds the full result list. Messages are still
+    reported so that warnings and errors reach p4.warnings/p4.errors and raise as usual.
+    """
+
+    def __init__(self, stats, reporter=None):
+        """
+        Args:
+            stats (SyncStats): The counters to update
+            reporter (ProgressReporter): Optional reporter to give a chance to print progress
+        """
+        P4.OutputHandler.__init__(self)
+        self.stats = stats
+        self.reporter = reporter
+
+    def outputStat(self, h):
+        self.stats.add_record(h)
+        if self.reporter is not None:
+            self.reporter.maybe_report()
+        return P4.OutputHandler.HANDLED
+
+    def outputInfo(self, i):
+        return P4.OutputHandler.HANDLED
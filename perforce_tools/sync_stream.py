@@ -13,9 +13,288 @@ local machine that exists only for the duration of the sync operation. This appr
 
 import click
 import os
+import shutil
 import sys
 import socket
-from perforce_tools.config import get_p4_client
+import time
+import P4
+from perforce_tools import api, tracing
+from perforce_tools.client_pool import collect_garbage, lease_client
+from perforce_tools.clients import (build_client_spec, client_exists, narrow_view, persistent_client_name,
+                                    stream_view, temp_client_name)
+from perforce_tools.config import get_tuning
+from perforce_tools.content_store import CachedSync, ContentStore
+from perforce_tools.parallel_sync import UNITS_PER_WORKER, latest_change, parallel_sync, plan_sync_units, sync_units
+from perforce_tools.sync_journal import CHECKPOINT_UNITS, SyncJournal
+from perforce_tools.sync_stats import ProgressReporter, SyncStats, format_bytes
+from perforce_tools.sync_watch import DEBOUNCE, POLL_INTERVAL, watch_stream
+from perforce_tools.workspace_clear import WorkspaceClear, clear_in_background
+
+def prepare_workspace(workspace_path, force, keep_contents=False, echo=click.echo):
+    """
+    Make sure the workspace directory exists and is ready to be synced into.
+
+    Args:
+        workspace_path (str): The local workspace path
+        force (bool): Clear a non-empty workspace directory
+        keep_contents (bool): Accept a non-empty workspace directory without clearing it, as incremental
+            and resumed syncs do
+        echo (callable): Function used to print messages
+
+    Returns:
+        A false value if nothing was cleared. Otherwise a WorkspaceClear that is still deleting the old
+        contents, which were renamed aside, in the background; or True if the directory could not be renamed
+        and was cleared in place.
+
+    Raises:
+        ValueError: If the path is not a directory, or is not empty and may not be cleared
+    """
+    if not os.path.exists(workspace_path):
+        # Create the directory if it doesn't exist
+        os.makedirs(workspace_path, exist_ok=True)
+        echo(f"Created workspace directory '{workspace_path}'")
+        return False
+
+    if not os.path.isdir(workspace_path):
+        raise ValueError(f"Workspace path '{workspace_path}' exists but is not a directory")
+
+    # Check if directory is empty; an incremental or resumed workspace is expected to hold files already
+    if not os.listdir(workspace_path) or (keep_contents and not force):
+        return False
+
+    if not force:
+        raise ValueError(f"Workspace directory '{workspace_path}' is not empty. Use --force to clear it before syncing.")
+
+    echo(f"Workspace directory '{workspace_path}' is not empty. Clearing it...")
+    clear = clear_in_background(workspace_path)
+    if clear is not None:
+        echo(f"Moved the old contents aside in {clear.moved_in:.2f}s; deleting them in the background")
+        return clear
+
+    # The directory cannot be renamed, e.g. because it is a mount point; remove its contents one by one
+    start = time.monotonic()
+    with tracing.span("clear_workspace", path=workspace_path):
+        for item in os.listdir(workspace_path):
+            item_path = os.path.join(workspace_path, item)
+            if os.path.isdir(item_path):
+                shutil.rmtree(item_path)
+            else:
+                os.remove(item_path)
+    echo(f"Workspace directory '{workspace_path}' has been cleared in {time.monotonic() - start:.1f}s")
+    return True
+
+
+def sync_stream(p4, pool, profile, stream_path, workspace_path, echo=click.echo, writable=False, parallel=None,
+                progress_interval=5.0, incremental=False, reconcile=False, journal=None, cleared=False,
+                cache_dir=None, cache_size=10240, overwrite=False, client_pool=False, include=(), exclude=(),
+                at=None, watch=False, poll_interval=POLL_INTERVAL, debounce=DEBOUNCE, stop=None, tuning=None):
+    """
+    Sync a stream into a prepared workspace directory.
+
+    Creates the client workspace (temporary, leased from the client pool, or persistent with incremental),
+    syncs the stream part by part while recording progress in a checkpoint journal, and deletes the temporary
+    client or returns the leased one afterwards. With watch, the workspace is kept up to date with new changes
+    in between, until the watch is interrupted.
+
+    Args:
+        p4 (P4.P4): A connected P4 client
+        pool (ConnectionPool): Pool that additional parallel workers take connections from
+        profile (str): The profile the connection was made with
+        stream_path (str): The full stream path, e.g. '//depot/main'
+        workspace_path (str): The local workspace path, as prepared by prepare_workspace()
+        echo (callable): Function used to print messages
+        writable (bool): Make synced files writable
+        parallel (int): Number of parallel transfer threads; by default the profile tuning's
+        progress_interval (float): Seconds between progress lines (0 disables them)
+        incremental (bool): Use a persistent client workspace that keeps its have list
+        reconcile (bool): Restore locally modified or deleted files after an incremental sync
+        overwrite (bool): After an incremental sync, also remove local files that are not in the stream, so the
+            workspace matches the stream exactly without having been cleared first
+        journal (SyncJournal): Journal of an interrupted sync to resume, or None to start a new sync
+        cleared: The value returned by prepare_workspace(); a background clear is waited for and reported
+        cache_dir (str): Optional directory of a local content cache
+        cache_size (int): Maximum size of the content cache in MB
+        client_pool (bool): Lease a client workspace from the pool of this host instead of creating a
+            temporary one
+        include (list): Paths to narrow the client view to, as returned by clients.view_filter()
+        exclude (list): Paths to remove from the client view, as returned by clients.view_filter()
+        at (str): Changelist number or label to sync to instead of the latest change
+        watch (bool): After the sync, keep syncing new changes until interrupted (see sync_watch)
+        poll_interval (float): With watch, seconds between two polls for new changes
+        debounce (float): With watch, seconds without a newer change before a new change is synced
+        stop (threading.Event): With watch, an optional event that ends the watch when set
+        tuning (dict): Transfer tuning settings (see config.TUNING_DEFAULTS); by default the profile's
+
+    Returns:
+        SyncStats: The files and bytes transferred by the initial sync
+    """
+    tuning = tuning or get_tuning(profile)
+    parallel = parallel or tuning['parallel']
+    echo(f"Syncing stream '{stream_path}' to '{workspace_path}'...")
+
+    if writable:
+        echo("Files will be made writable after sync")
+
+    lease = lease_client(p4, profile) if client_pool and not incremental else None
+    if incremental:
+        # A persistent client workspace keeps its have list between runs
+        client_name = persistent_client_name(profile, stream_path, workspace_path, include, exclude)
+        existing = client_exists(p4, client_name)
+        host = socket.gethostname()
+    elif lease is not None:
+        # Reuse a client workspace from the pool of this host and profile
+        client_name = lease.name
+        existing = False
+        host = socket.gethostname()
+    else:
+        if client_pool:
+            echo("Every pool client workspace is in use; using a temporary client workspace instead")
+        # Create a temporary client workspace
+        client_name = temp_client_name()
+        existing = False
+        host = None
+
+    view = None
+    if include or exclude:
+        # Narrow the view the server generates for the stream, so only the requested paths are mapped
+        view = narrow_view(stream_view(p4, client_name, stream_path), client_name, include, exclude)
+        echo(f"Client view narrowed to {len(view)} lines" + (f", including {', '.join(include)}" if include else "")
+             + (f", excluding {', '.join(exclude)}" if exclude else ""))
+    client_spec = build_client_spec(p4, client_name, workspace_path, stream_path, writable, host=host, view=view,
+                                    compress=tuning['compress'])
+
+    # Create the client
+    p4.client = client_name
+    if lease is not None:
+        try:
+            lease.retarget(p4, stream_path, client_spec)
+        except BaseException:
+            lease.release(p4)
+            raise
+        echo(f"Leased pool client workspace '{client_name}'")
+    else:
+        p4.save_client(client_spec)
+        if not incremental:
+            echo(f"Created temporary client workspace '{client_name}'")
+        elif existing:
+            echo(f"Using persistent client workspace '{client_name}'; only changed files will be transferred")
+        else:
+            echo(f"Created persistent client workspace '{client_name}'")
+
+    cache = None
+    try:
+        if incremental and existing and cleared:
+            # The have list no longer matches the cleared directory, so forget it without transferring anything
+            with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+                p4.run_sync("-k", f"//{client_name}/...#none")
+
+        if journal is None:
+            # Pin the sync to the requested or current head change, plan the units as of that change and record
+            # the plan, so an interrupted sync can resume
+            change = at or latest_change(p4, client_name)
+            if at:
+                echo(f"Syncing the stream as of @{at}")
+            # An existing client's have list may hold files of directories that no longer exist at the change
+            units = plan_sync_units(p4, client_name, max(CHECKPOINT_UNITS, parallel * UNITS_PER_WORKER), change,
+                                    have=existing)
+            journal = SyncJournal.create(workspace_path, profile, stream_path, change, units, client_name,
+                                         include, exclude)
+        else:
+            echo(f"Resuming sync at @{journal.change}: {len(journal.completed)} of "
+                 f"{len(journal.header['units'])} parts already completed")
+        units = journal.remaining_units(client_name)
+
+        def checkpoint(unit):
+            journal.mark_done(unit, client_name)
+
+        if cache_dir:
+            store = ContentStore(cache_dir, cache_size * 1024 * 1024)
+            cache = CachedSync(store, client_name, workspace_path, writable)
+
+        # Sync the files
+        echo("Syncing files...")
+        # Each part reports its own totals when it starts, so running totals for the whole stream are unknown
+        reporter = ProgressReporter(echo, progress_interval, show_totals=False)
+        with tracing.span("transfer", parallel=parallel, units=len(units)) as details:
+            if parallel > 1:
+                mode, worker_stats = parallel_sync(p4, pool, client_name, parallel, units, reporter,
+                                                   journal.change, checkpoint, cache, tuning)
+                stats = SyncStats.combine(worker_stats)
+            else:
+                stats = sync_units(p4, units, reporter.track(SyncStats()), reporter, journal.change, checkpoint,
+                                   cache)
+            details.update(records=stats.files, bytes=stats.bytes)
+        if parallel > 1:
+            if mode == "server":
+                echo("Using server-side parallel sync")
+            else:
+                echo(f"Server-side parallel sync is not enabled; synced by subdirectory "
+                     f"over {len(worker_stats)} connections")
+            for worker in worker_stats:
+                echo(f"  {worker.name}: {worker.summary()}")
+            echo(f"Synced {stats.files} files" + (f"; {stats.cached_files} files, {format_bytes(stats.cached_bytes)} "
+                                                  f"from the content cache" if stats.cached_files else ""))
+        else:
+            echo(f"Synced {stats.summary()}")
+        journal.remove()
+
+        if reconcile or overwrite:
+            clean_args = ["-e", "-d", "-m"]
+            if overwrite:
+                echo("Checking for locally modified, deleted or extra files...")
+                clean_args.append("-a")
+            else:
+                echo("Checking for locally modified or deleted files...")
+            with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+                restored = p4.run_clean(*clean_args, f"//{client_name}/...")
+            restored = [r for r in restored if isinstance(r, dict) and 'depotFile' in r]
+            label = "Restored or removed" if overwrite else "Restored"
+            for record in restored:
+                echo(f"  {label} {record.get('clientFile', record['depotFile'])}")
+            echo(f"{label} {len(restored)} locally modified, deleted" + (" or extra files" if overwrite else " files"))
+
+        if isinstance(cleared, WorkspaceClear):
+            with tracing.span("wait_for_delete"):
+                deleted_in = cleared.wait()
+            for error in cleared.errors:
+                echo(f"Warning: could not delete old workspace contents: {error}")
+            echo(f"Deleted the old workspace contents in {deleted_in:.1f}s in the background")
+
+        if watch:
+            # Only this connection is needed from now on
+            pool.close()
+            watch_stream(p4, client_name, journal.change, echo, poll_interval, debounce,
+                         progress_interval=progress_interval, cache=cache, stop=stop)
+
+    except (Exception, KeyboardInterrupt):
+        if journal is not None and os.path.exists(journal.path):
+            echo("Sync was interrupted; progress has been saved. Run the same command with --resume to continue.")
+        raise
+
+    finally:
+        if isinstance(cleared, WorkspaceClear):
+            cleared.wait()
+        if cache is not None:
+            cache.store.close()
+        if lease is not None:
+            # Return the client to the pool, and occasionally delete idle or abandoned clients of this host
+            echo(f"Returning pool client workspace '{client_name}'...")
+            lease.release(p4)
+            try:
+                removed = collect_garbage(p4, profile)
+            except P4.P4Exception as e:
+                echo(f"Warning: could not clean up idle client workspaces: {e}")
+            else:
+                if removed:
+                    echo(f"Deleted idle or abandoned client workspaces: {', '.join(removed)}")
+        elif not incremental:
+            # Clean up the temporary client
+            echo(f"Deleting temporary client workspace '{client_name}'...")
+            p4.delete_client(client_name)
+
+    echo(f"Stream sync completed successfully to '{workspace_path}'")
+    return stats
+
 
 @click.command()
 @click.option('--profile', required=True, help='Profile name to use for connection')
@@ -24,7 +303,35 @@ from perforce_tools.config import get_p4_client
 @click.option('--workspace-path', required=True, help='Full path of the location to sync the stream into')
 @click.option('--force', is_flag=True, help='Force sync even if workspace directory is not empty')
 @click.option('--writable', is_flag=True, help='Make files in the workspace writable after sync')
-def main(profile, depot, stream, workspace_path, force, writable):
+@click.option('--parallel', type=click.IntRange(min=1), required=False,
+              help="Number of parallel transfer threads to use for the sync [default: the profile's tuning, or 1]")
+@click.option('--progress-interval', type=click.FloatRange(min=0), default=5.0, show_default=True,
+              help='Seconds between progress lines while syncing (0 disables progress output)')
+@click.option('--incremental', is_flag=True,
+              help='Keep a persistent client workspace so later runs only transfer changed files')
+@click.option('--reconcile', is_flag=True,
+              help='With --incremental, restore local files that were modified or deleted outside of Perforce')
+@click.option('--resume', is_flag=True, help='Continue an interrupted sync into the workspace path from its checkpoint')
+@click.option('--cache-dir', required=False,
+              help='Directory of a local content cache shared between workspaces; cached files are not transferred')
+@click.option('--cache-size', type=click.IntRange(min=1), default=10240, show_default=True,
+              help='Maximum size of the content cache in MB')
+@click.option('--client-pool', is_flag=True,
+              help='Reuse a client workspace from a pool kept for this host instead of creating a temporary one')
+@click.option('--include', multiple=True,
+              help='Only sync this path of the stream, relative to the stream root; may be repeated')
+@click.option('--exclude', multiple=True,
+              help='Do not sync this path of the stream, relative to the stream root; may be repeated')
+@click.option('--at', required=False, help='Sync the stream as of this changelist number or label')
+@click.option('--watch', is_flag=True,
+              help='After the sync, keep the workspace up to date with new changes until interrupted')
+@click.option('--poll-interval', type=click.FloatRange(min=1), default=POLL_INTERVAL, show_default=True,
+              help='With --watch, seconds between two checks for new changes')
+@click.option('--debounce', type=click.FloatRange(min=0), default=DEBOUNCE, show_default=True,
+              help='With --watch, seconds without a newer change before a new change is synced')
+def main(profile, depot, stream, workspace_path, force, writable, parallel, progress_interval, incremental,
+         reconcile, resume, cache_dir, cache_size, client_pool, include, exclude, at, watch, poll_interval,
+         debounce):
     """
     Sync a stream to a local workspace path.
 
@@ -34,82 +341,49 @@ def main(profile, depot, stream, workspace_path, force, writable):
     The command handles the workspace directory as follows:
     - If the workspace directory does not exist, it will be created automatically
     - If the workspace directory is not empty and --force is not specified, a warning will be displayed and the script will exit
-    - If the --force option is specified and the workspace directory is not empty, the directory will be cleared before syncing
+    - If the --force option is specified and the workspace directory is not empty, the directory will be cleared before syncing.
+      The old contents are renamed aside and deleted in the background while the sync runs
     - If the --writable option is specified, files in the workspace will be made writable after sync
-    """
-    try:
-        # Validate workspace path
-        if not os.path.exists(workspace_path):
-            # Create the directory if it doesn't exist
-            os.makedirs(workspace_path, exist_ok=True)
-            click.echo(f"Created workspace directory '{workspace_path}'")
-        elif not os.path.isdir(workspace_path):
-            click.echo(f"Error: Workspace path '{workspace_path}' exists but is not a directory")
-            exit(1)
-        else:
-            # Check if directory is empty
-            if os.listdir(workspace_path):
-                if force:
-                    click.echo(f"Workspace directory '{workspace_path}' is not empty. Clearing it...")
-                    # Remove all files and directories in the workspace path
-                    for item in os.listdir(workspace_path):
-                        item_path = os.path.join(workspace_path, item)
-                        if os.path.isdir(item_path):
-                            import shutil
-                            shutil.rmtree(item_path)
-                        else:
-                            os.remove(item_path)
-                    click.echo(f"Workspace directory '{workspace_path}' has been cleared")
-                else:
-                    click.echo(f"Warning: Workspace directory '{workspace_path}' is not empty. Use --force to clear it before syncing.")
-                    exit(1)
-
-        # Connect to Perforce
-        p4 = get_p4_client(profile)
-        click.echo(f"Connected to {p4.port} as {p4.user}")
-
-        # Construct the full stream path
-        stream_path = f"//{depot}/{stream}"
-        click.echo(f"Syncing stream '{stream_path}' to '{workspace_path}'...")
 
-        # Create a temporary client workspace
-        # Get hostname and sanitize it for use in client name
-        hostname = socket.gethostname().replace('.', '_')
-        client_name = f"temp_sync_{hostname}_{os.getpid()}"
-        # Set client options based on writable flag
-        if writable:
-            client_options = 'allwrite clobber compress unlocked modtime normdir'
-            click.echo("Files will be made writable after sync")
-        else:
-            client_options = 'noallwrite clobber compress unlocked modtime normdir'
-
-        client_spec = {
-            'Client': client_name,
-            'Owner': p4.user,
-            'Root': workspace_path,
-            'Options': client_options,
-            'LineEnd': 'local',
-            'Stream': stream_path
-        }
-
-        # Create the client
-        p4.client = client_name
-        p4.save_client(client_spec)
-        click.echo(f"Created temporary client workspace '{client_name}'")
+    If --parallel is greater than 1, the sync uses server-side parallel transfer when the server allows it,
+    and otherwise splits the stream by subdirectory across that many pooled connections. Without --parallel,
+    and for compression and network settings, the transfer tuning of the profile is used (see tune-profile).
 
-        try:
-            # Sync the files
-            click.echo("Syncing files...")
-            result = p4.run_sync()
-            click.echo(f"Synced {len(result)} files")
+    With --incremental, a persistent client workspace named after the profile, stream and workspace path is
+    kept between runs, so each run only transfers the revisions that changed since the last one. A non-empty
+    workspace is expected in this mode, and --force overwrites it in place instead of clearing it, removing
+    files that are not in the stream after the sync. --reconcile additionally restores files that were modified
+    or deleted locally, using modification times to avoid rehashing unchanged files.
 
-        finally:
-            # Clean up the temporary client
-            click.echo(f"Deleting temporary client workspace '{client_name}'...")
-            p4.delete_client(client_name)
+    Progress is recorded in a local checkpoint journal as parts of the stream complete. If a sync is
+    interrupted, running the same command again with --resume continues at the same changelist and skips
+    the parts that were already synced.
+
+    With --cache-dir, file contents are kept in a local content cache keyed by the server digest. Files that
+    are already in the cache are hardlinked (or copied, for --writable) into the workspace instead of being
+    transferred, and the least recently used files are evicted once the cache exceeds --cache-size.
+
+    With --client-pool, the sync leases one of a few client workspaces kept on the server for this host and
+    retargets it to the stream and workspace path, instead of creating and deleting a temporary client. Pool
+    clients that stay unused for a day, and temporary clients left behind by crashed runs, are deleted
+    automatically.
 
-        click.echo(f"Stream sync completed successfully to '{workspace_path}'")
-        p4.disconnect()
+    --include and --exclude narrow the sync to parts of the stream, given as paths relative to the stream root
+    that may use the wildcards '*' and '...'; a path without wildcards covers the whole directory. The stream's
+    own view, including its imports, is narrowed in a client workspace of its own, so only the requested files
+    are transferred. --at syncs the stream as of a changelist number or label instead of the latest change.
+
+    With --watch, the connection and client workspace are kept open after the sync, and the workspace is kept up
+    to date: the latest change of the stream is checked every --poll-interval seconds, and each new change is
+    synced as soon as no newer change has followed it for --debounce seconds. Only the files of the new changes
+    are transferred. Failed checks are retried with increasing delays. Press Ctrl+C to stop watching.
+    """
+    try:
+        api.sync_stream(profile, depot, stream, workspace_path, force=force, writable=writable, parallel=parallel,
+                        incremental=incremental, reconcile=reconcile, resume=resume, cache_dir=cache_dir,
+                        cache_size=cache_size, client_pool=client_pool, include=include, exclude=exclude, at=at,
+                        watch=watch, poll_interval=poll_interval, debounce=debounce,
+                        progress_interval=progress_interval, echo=click.echo)
 
     except ValueError as e:
         click.echo(f"Error: {e}")
@@ -0,0 +1,200 @@
+"""
+Sync Streams Tool for Perforce Helix Core Python Tools.
+
+This tool syncs a batch of streams, listed in a manifest file, each into its own local workspace path.
+
+The streams are synced concurrently by a scheduler that limits both the number of streams in flight and
+the total number of server connections. Connections are pooled per profile and reused from one stream to
+the next, and a timing summary for every stream is printed at the end.
+"""
+
+import click
+import os
+import time
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from perforce_tools.clients import view_filter
+from perforce_tools.config import get_p4_client
+from perforce_tools.connection_pool import ConnectionBudget, ProfilePools
+from perforce_tools.sync_stats import format_bytes
+from perforce_tools.sync_stream import prepare_workspace, sync_stream
+
+# Keys allowed in a manifest entry, with their defaults
+ENTRY_DEFAULTS = {
+    'profile': None,
+    'depot': None,
+    'stream': None,
+    'path': None,
+    'force': False,
+    'writable': False,
+    'parallel': None,
+    'incremental': False,
+    'reconcile': False,
+    'cache_dir': None,
+    'cache_size': 10240,
+    'client_pool': False,
+    'include': None,
+    'exclude': None,
+    'at': None,
+}
+
+
+def load_manifest(manifest_path, default_profile=None):
+    """
+    Load and validate a sync manifest.
+
+    The manifest is a YAML file with a 'streams' list. Each entry needs 'depot', 'stream' and 'path', and
+    may set any other sync-stream option ('profile', 'force', 'writable', 'parallel', 'incremental',
+    'reconcile', 'cache_dir', 'cache_size', 'client_pool', 'include', 'exclude', 'at'). 'include' and 'exclude'
+    take a path or a list of paths. An optional 'defaults' mapping applies to every entry.
+
+    Args:
+        manifest_path (str): Path of the manifest file
+        default_profile (str): Profile used for entries that do not name one
+
+    Returns:
+        list: One dict per stream, with every key of ENTRY_DEFAULTS filled in
+
+    Raises:
+        ValueError: If the manifest is malformed
+    """
+    with open(manifest_path, 'r') as f:
+        manifest = yaml.safe_load(f) or {}
+
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('streams'), list):
+        raise ValueError(f"Manifest '{manifest_path}' must contain a 'streams' list")
+
+    defaults = dict(ENTRY_DEFAULTS, profile=default_profile)
+    defaults.update(manifest.get('defaults') or {})
+
+    entries = []
+    paths = set()
+    for number, item in enumerate(manifest['streams'], start=1):
+        if not isinstance(item, dict):
+            raise ValueError(f"Manifest entry {number} must be a mapping")
+        unknown = set(item) - set(ENTRY_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Manifest entry {number} has unknown keys: {', '.join(sorted(unknown))}")
+        entry = dict(defaults, **item)
+        for key in ('profile', 'depot', 'stream', 'path'):
+            if not entry[key]:
+                raise ValueError(f"Manifest entry {number} is missing '{key}'")
+        for key in ('include', 'exclude'):
+            value = entry[key] or []
+            entry[key] = view_filter([value] if isinstance(value, str) else value)
+        if entry['at'] is not None:
+            entry['at'] = str(entry['at']).lstrip('@')
+        path = os.path.abspath(entry['path'])
+        if path in paths:
+            raise ValueError(f"Manifest entry {number} uses the workspace path '{entry['path']}' more than once")
+        paths.add(path)
+        entries.append(entry)
+    return entries
+
+
+def _sync_entry(entry, pools, progress_interval):
+    """
+    Sync one manifest entry, returning a result dict for the summary.
+    """
+    stream_path = f"//{entry['depot']}/{entry['stream']}"
+    label = f"{entry['profile']}:{stream_path}"
+
+    def echo(message):
+        click.echo(f"[{label}] {message}")
+
+    result = {'label': label, 'path': entry['path'], 'files': 0, 'bytes': 0, 'error': None}
+    start = time.monotonic()
+    try:
+        overwrite = entry['force'] and entry['incremental']
+        cleared = prepare_workspace(entry['path'], entry['force'] and not overwrite,
+                                    keep_contents=entry['incremental'], echo=echo)
+        pool = pools.get(entry['profile'])
+        with pool.connection() as p4:
+            stats = sync_stream(p4, pool, entry['profile'], stream_path, entry['path'], echo=echo,
+                                writable=entry['writable'], parallel=entry['parallel'],
+                                progress_interval=progress_interval, incremental=entry['incremental'],
+                                reconcile=entry['reconcile'], cleared=cleared, cache_dir=entry['cache_dir'],
+                                cache_size=entry['cache_size'], overwrite=overwrite,
+                                client_pool=entry['client_pool'] and not entry['incremental'],
+                                include=entry['include'], exclude=entry['exclude'], at=entry['at'])
+        result['files'] = stats.files
+        result['bytes'] = stats.bytes
+    except Exception as e:
+        echo(f"Error: {e}")
+        result['error'] = str(e)
+    result['elapsed'] = time.monotonic() - start
+    return result
+
+
+@click.command()
+@click.option('--manifest', required=True, type=click.Path(exists=True, dir_okay=False),
+              help='YAML manifest listing the streams to sync')
+@click.option('--profile', required=False, help='Profile used for manifest entries that do not name one')
+@click.option('--max-streams', type=click.IntRange(min=1), default=4, show_default=True,
+              help='Maximum number of streams synced at the same time')
+@click.option('--max-connections', type=click.IntRange(min=1), default=8, show_default=True,
+              help='Maximum number of server connections open at the same time')
+@click.option('--progress-interval', type=click.FloatRange(min=0), default=30.0, show_default=True,
+              help='Seconds between progress lines for each stream (0 disables progress output)')
+def main(manifest, profile, max_streams, max_connections, progress_interval):
+    """
+    Sync a batch of streams listed in a manifest.
+
+    Each manifest entry is synced as sync-stream would, into its own workspace path. Streams are synced
+    concurrently, up to --max-streams at a time and --max-connections server connections in total.
+    Connections are reused between streams, and a per-stream timing summary is printed at the end.
+
+    Example manifest:
+
+    \b
+        defaults:
+          profile: dev
+          incremental: true
+        streams:
+          - depot: project-x
+            stream: main
+            path: /builds/project-x/main
+          - depot: project-x
+            stream: release-1.0
+            path: /builds/project-x/release-1.0
+            parallel: 4
+    """
+    try:
+        entries = load_manifest(manifest, profile)
+        if not entries:
+            click.echo("No streams found in the manifest.")
+            return
+
+        click.echo(f"Syncing {len(entries)} streams ({max_streams} at a time, "
+                   f"up to {max_connections} connections)...")
+
+        pools = ProfilePools(ConnectionBudget(max_connections), lambda name: get_p4_client(name, direct=True))
+        start = time.monotonic()
+        try:
+            # Every stream holds at least one connection, so never run more streams than connections
+            with ThreadPoolExecutor(max_workers=min(max_streams, max_connections)) as executor:
+                results = list(executor.map(lambda entry: _sync_entry(entry, pools, progress_interval), entries))
+        finally:
+            pools.close()
+        elapsed = time.monotonic() - start
+
+        click.echo("\nSummary:")
+        for result in results:
+            status = f"FAILED ({result['error']})" if result['error'] else "OK"
+            click.echo(f"  {result['label']} -> {result['path']}: {status} - {result['files']} files, "
+                       f"{format_bytes(result['bytes'])} in {result['elapsed']:.1f}s")
+        failed = sum(1 for result in results if result['error'])
+        click.echo(f"Synced {len(results) - failed} of {len(results)} streams in {elapsed:.1f}s")
+
+        if failed:
+            exit(1)
+
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        exit(1)
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}")
+        exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Watch Mode for Perforce Helix Core Python Tools.
+
+After a stream has been synced, sync-stream --watch keeps the connection and the client workspace open and
+keeps the workspace up to date. The latest submitted change affecting the client view is polled with
+'p4 changes -m1', which the server answers from its change index without reading any file metadata, and each
+new change is synced as a delta against the client's have list, so only the revisions submitted since the
+previous sync are transferred.
+
+A burst of submits is synced once: after a new change is seen, the watcher waits until no newer change has
+appeared for the debounce period. Failed polls and syncs, e.g. after the connection dropped, are retried with
+exponential backoff, reconnecting first if the connection was lost.
+"""
+
+import click
+import threading
+import time
+
+import P4
+
+from perforce_tools import tracing
+from perforce_tools.parallel_sync import sync_units
+from perforce_tools.sync_stats import ProgressReporter, SyncStats
+
+# Seconds between two polls for new changes
+POLL_INTERVAL = 10.0
+
+# Seconds without a newer change before a new change is synced
+DEBOUNCE = 2.0
+
+# Longest time in seconds a steady series of submits may postpone a sync
+MAX_DEBOUNCE_WAIT = 60.0
+
+# Longest time in seconds between two retries after a failure
+MAX_BACKOFF = 300.0
+
+
+def _latest_change(p4, client_name):
+    """
+    Get the record of the most recent submitted change affecting a client view, or None.
+    """
+    with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+        changes = p4.run_changes("-m1", "-s", "submitted", f"//{client_name}/...")
+    return changes[0] if changes else None
+
+
+def watch_stream(p4, client_name, change, echo=click.echo, poll_interval=POLL_INTERVAL, debounce=DEBOUNCE,
+                 max_backoff=MAX_BACKOFF, progress_interval=5.0, cache=None, stop=None):
+    """
+    Keep a synced client workspace up to date until interrupted.
+
+    Args:
+        p4 (P4.P4): A connected P4 client with the client workspace set
+        client_name (str): The name of the client workspace, whose have list matches the workspace
+        change (str): The changelist the workspace was synced to
+        echo (callable): Function used to print messages
+        poll_interval (float): Seconds between two polls for new changes
+        debounce (float): Seconds without a newer change before a new change is synced (0 syncs at once)
+        max_backoff (float): Longest time in seconds between two retries after a failure
+        progress_interval (float): Seconds between progress lines while syncing (0 disables them)
+        cache (CachedSync): Optional content store hooks used to skip transferring files already cached locally
+        stop (threading.Event): Optional event that ends the watch when set; Ctrl+C ends it as well
+
+    Returns:
+        int: The number of changes synced
+    """
+    stop = stop or threading.Event()
+    synced = int(change or 0)
+    syncs = 0
+    failures = 0
+    delay = poll_interval
+    echo(f"Watching for changes submitted after @{synced}; press Ctrl+C to stop")
+
+    try:
+        while not stop.wait(delay):
+            try:
+                if not p4.connected():
+                    p4.connect()
+                latest = _latest_change(p4, client_name)
+                if latest is None or int(latest['change']) <= synced:
+                    failures, delay = 0, poll_interval
+                    continue
+
+                # Wait for a burst of submits to settle, so it is synced once
+                waited = 0.0
+                while debounce and waited < MAX_DEBOUNCE_WAIT:
+                    if stop.wait(debounce):
+                        return syncs
+                    waited += debounce
+                    newer = _latest_change(p4, client_name)
+                    if newer is None or newer['change'] == latest['change']:
+                        break
+                    latest = newer
+
+                head = latest['change']
+                reporter = ProgressReporter(echo, progress_interval)
+                with tracing.span("watch_sync", change=head) as details:
+                    stats = sync_units(p4, [f"//{client_name}/..."], reporter.track(SyncStats()), reporter, head,
+                                       cache=cache)
+                    details.update(records=stats.files, bytes=stats.bytes)
+                message = f"Synced @{head}: {stats.summary()}"
+                if latest.get('time'):
+                    message += f", {max(0.0, time.time() - int(latest['time'])):.0f}s after it was submitted"
+                echo(message)
+                synced = int(head)
+                syncs += 1
+                failures, delay = 0, poll_interval
+
+            except P4.P4Exception as e:
+                failures += 1
+                delay = min(poll_interval * 2 ** failures, max_backoff)
+                echo(f"Warning: retrying in {delay:.0f}s after an error: {e}")
+
+    except KeyboardInterrupt:
+        echo("Stopped watching")
+    return syncs
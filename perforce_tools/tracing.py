@@ -0,0 +1,293 @@
+"""
+Timing Instrumentation for Perforce Helix Core Python Tools.
+
+This module records where the time of a phc command goes when the global --trace option is given. Every
+connection returned by config.get_p4_client() is instrumented, so each server command, including those run by
+the save_/delete_/fetch_ shortcuts, is recorded as a span with its wall time, the number of records it
+returned and the size of the files it reported. Connecting and authenticating are recorded as spans of their
+own, and local work such as clearing a workspace is recorded by wrapping it in span().
+
+Direct connections are opened with P4Python's performance tracking enabled, so the server's tracking output
+(lock waits, database pages, RPC sizes) is attached to the span of each command.
+
+The trace is written when the command finishes, either as a JSON timing report or as a Chrome trace file
+that can be opened in chrome://tracing or Perfetto. Tracing is disabled by default and costs nothing then.
+"""
+
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+# Output formats of the trace file
+FORMATS = ("json", "chrome")
+
+# The active tracer, or None when tracing is disabled
+_tracer = None
+
+
+class Tracer:
+    """
+    Collects the spans recorded by all threads of a command.
+    """
+
+    def __init__(self, path, output_format="json"):
+        """
+        Args:
+            path (str): The file to write the trace to
+            output_format (str): 'json' for a timing report, 'chrome' for a Chrome trace file
+        """
+        self.path = path
+        self.output_format = output_format
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._threads = {}
+        self._start = time.perf_counter()
+        self._started_at = time.time()
+
+    @contextlib.contextmanager
+    def span(self, name, category, **details):
+        stack = self._local.__dict__.setdefault("stack", [])
+        span = {"name": name, "category": category, "start": time.perf_counter() - self._start,
+                "thread": threading.get_ident(), "depth": len(stack), "details": details}
+        stack.append(span)
+        try:
+            yield span["details"]
+        except BaseException as e:
+            span["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            stack.pop()
+            span["duration"] = time.perf_counter() - self._start - span["start"]
+            with self._lock:
+                self._threads.setdefault(span["thread"], threading.current_thread().name)
+                self.spans.append(span)
+
+    def summary(self):
+        """
+        Total the spans by name.
+
+        Returns:
+            dict: Per span name, the number of spans and their total seconds, records and bytes
+        """
+        totals = {}
+        for span in self.spans:
+            total = totals.setdefault(span["name"], {"count": 0, "seconds": 0.0, "records": 0, "bytes": 0})
+            total["count"] += 1
+            total["seconds"] += span["duration"]
+            total["records"] += span["details"].get("records", 0)
+            total["bytes"] += span["details"].get("bytes", 0)
+        return dict(sorted(totals.items(), key=lambda item: -item[1]["seconds"]))
+
+    def report(self):
+        """
+        Build the JSON timing report.
+        """
+        spans = sorted(self.spans, key=lambda span: span["start"])
+        return {
+            "command": sys.argv,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self._started_at)),
+            "elapsed": time.perf_counter() - self._start,
+            "summary": self.summary(),
+            "spans": spans,
+        }
+
+    def chrome_trace(self):
+        """
+        Build a trace in the Chrome trace event format.
+        """
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": " ".join(sys.argv)}}]
+        for thread, name in self._threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread, "args": {"name": name}})
+        for span in sorted(self.spans, key=lambda span: span["start"]):
+            args = dict(span["details"])
+            if "error" in span:
+                args["error"] = span["error"]
+            events.append({"name": span["name"], "cat": span["category"], "ph": "X", "pid": pid,
+                           "tid": span["thread"], "ts": span["start"] * 1e6, "dur": span["duration"] * 1e6,
+                           "args": args})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self):
+        """
+        Write the trace file.
+        """
+        with self._lock:
+            data = self.chrome_trace() if self.output_format == "chrome" else self.report()
+        with open(self.path, "w") as f:
+            json.dump(data, f, indent=None if self.output_format == "chrome" else 2, default=str)
+
+
+def enable(path, output_format="json"):
+    """
+    Start tracing the current process.
+
+    Args:
+        path (str): The file to write the trace to
+        output_format (str): One of FORMATS
+
+    Returns:
+        Tracer: The active tracer
+    """
+    global _tracer
+    _tracer = Tracer(path, output_format)
+    return _tracer
+
+
+def finish():
+    """
+    Write the trace file and stop tracing, if tracing was enabled.
+
+    Returns:
+        str: The path of the trace file, or None if tracing was not enabled
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    tracer.write()
+    return tracer.path
+
+
+def enabled():
+    """
+    Check whether tracing is enabled.
+    """
+    return _tracer is not None
+
+
+def span(name, category="local", **details):
+    """
+    Record a block of code as a span.
+
+    Args:
+        name (str): Name of the span, e.g. 'clear workspace'
+        category (str): Category of the span, used by trace viewers to group spans
+        **details: Values stored with the span
+
+    Returns:
+        A context manager yielding the span's details dict, to which 'records' and 'bytes' can be added;
+        a no-op when tracing is disabled
+    """
+    if _tracer is None:
+        return contextlib.nullcontext({})
+    return _tracer.span(name, category, **details)
+
+
+def _command_name(args):
+    """
+    Name a server command after the P4Python method that runs it, e.g. 'save_client' for 'client -i'.
+    """
+    command = str(args[0]) if args else ""
+    flag = args[1] if len(args) > 1 else None
+    prefix = {"-i": "save_", "-d": "delete_", "-o": "fetch_"}.get(flag) if isinstance(flag, str) else None
+    return f"{prefix}{command}" if prefix else f"run_{command}"
+
+
+def _record_size(record):
+    try:
+        return int(record.get("fileSize") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+# Counting handler class, created on first use since P4Python is only imported when connecting
+_counting_handler_class = None
+
+# Traced subclasses of connection classes: class -> subclass
+_traced_classes = {}
+_traced_classes_lock = threading.Lock()
+
+
+def _counting_handler(handler, details):
+    """
+    Wrap an output handler, counting the tagged records it is given.
+
+    P4Python only accepts subclasses of P4.OutputHandler as handlers, so the wrapper is one, and forwards every
+    output method to the wrapped handler.
+    """
+    global _counting_handler_class
+    if _counting_handler_class is None:
+        import P4
+
+        class CountingHandler(P4.OutputHandler):
+            def __init__(self, handler, details):
+                P4.OutputHandler.__init__(self)
+                self.handler = handler
+                self.details = details
+
+            def outputStat(self, h):
+                self.details["records"] += 1
+                self.details["bytes"] += _record_size(h)
+                return self.handler.outputStat(h)
+
+            def outputInfo(self, i):
+                return self.handler.outputInfo(i)
+
+            def outputText(self, s):
+                return self.handler.outputText(s)
+
+            def outputBinary(self, b):
+                return self.handler.outputBinary(b)
+
+            def outputMessage(self, e):
+                return self.handler.outputMessage(e)
+
+        _counting_handler_class = CountingHandler
+    return _counting_handler_class(handler, details)
+
+
+def _traced_run(p4, run, args, kwargs):
+    """
+    Run a command with run(*args, **kwargs), recording it as a span.
+    """
+    flat = []
+    for arg in args:
+        flat.extend(arg if isinstance(arg, (list, tuple)) else [arg])
+    with span(_command_name(flat), "p4", args=[str(arg) for arg in flat if not isinstance(arg, dict)],
+              records=0, bytes=0) as details:
+        if kwargs.get("handler") is not None:
+            kwargs["handler"] = _counting_handler(kwargs["handler"], details)
+        try:
+            result = run(p4, *args, **kwargs)
+        finally:
+            track_output = getattr(p4, "track_output", None) if getattr(p4, "track", False) else None
+            if track_output:
+                details["track"] = list(track_output)
+        if isinstance(result, list):
+            details["records"] += len(result)
+            details["bytes"] += sum(_record_size(r) for r in result if isinstance(r, dict))
+        return result
+
+
+def traced(cls):
+    """
+    Get the class to create connections with, recording their commands if tracing is enabled.
+
+    P4.P4 does not allow attributes to be set on its instances, so commands are recorded by a subclass that
+    overrides run(), through which the run_/save_/delete_/fetch_ shortcuts go as well.
+
+    Args:
+        cls (type): P4.P4 or daemon.DaemonClient
+
+    Returns:
+        type: A subclass of cls when tracing is enabled, otherwise cls itself
+    """
+    if _tracer is None:
+        return cls
+    with _traced_classes_lock:
+        subclass = _traced_classes.get(cls)
+        if subclass is None:
+            run = cls.run
+
+            def traced_run(self, *args, **kwargs):
+                if _tracer is None:
+                    return run(self, *args, **kwargs)
+                return _traced_run(self, run, args, kwargs)
+
+            subclass = _traced_classes[cls] = type(f"Traced{cls.__name__}", (cls,), {"run": traced_run})
+    return subclass
@@ -0,0 +1,221 @@
+"""
+Tune Profile Tool for Perforce Helix Core Python Tools.
+
+This tool finds the fastest transfer settings for a profile by syncing a sample path of a stream with
+different settings, and stores the fastest combination in the profile's tuning (see config.TUNING_DEFAULTS).
+
+The settings are tuned one after another, each starting from the best combination found so far: compression
+on and off, then the number of transfer threads, then every client-side tunable given with --tunable. Every
+trial syncs the sample into a fresh directory with a temporary client workspace, so the whole sample is
+transferred each time. A setting only replaces the current one if it is faster by more than MIN_GAIN, so that
+measurement noise does not pick settings that make no real difference.
+"""
+
+import click
+import os
+import shutil
+import tempfile
+
+from perforce_tools import api
+from perforce_tools.config import get_tuning, save_tuning
+from perforce_tools.sync_journal import SyncJournal
+from perforce_tools.sync_stats import format_bytes
+
+# Fraction by which a setting must be faster than the current one to replace it
+MIN_GAIN = 0.05
+
+# Transfer thread counts tried by default
+THREADS = "1,2,4,8"
+
+# Client-side tunables tried by default; net.tcpsize is the size of the TCP send and receive buffers
+TUNABLES = ("net.tcpsize=524288,2097152,8388608",)
+
+
+def _parse_tunables(values):
+    """
+    Parse --tunable options of the form 'name=value1,value2'.
+
+    Returns:
+        list: (name, [values]) pairs
+    """
+    tunables = []
+    for value in values:
+        name, _, candidates = value.partition('=')
+        candidates = [c.strip() for c in candidates.split(',') if c.strip()]
+        if not name.strip() or not candidates:
+            raise ValueError(f"Invalid --tunable '{value}': expected NAME=VALUE[,VALUE...]")
+        tunables.append((name.strip(), candidates))
+    return tunables
+
+
+def _describe(tuning):
+    """
+    Summarize the tuned settings of a configuration in one line.
+    """
+    parts = [f"compress {'on' if tuning['compress'] else 'off'}", f"{tuning['parallel']} threads"]
+    parts.extend(f"{name}={value}" for name, value in sorted(tuning['tunables'].items()))
+    return ", ".join(parts)
+
+
+def run_trial(profile, depot, stream, include, tuning, directory, runs=1):
+    """
+    Sync a sample with a configuration into fresh directories, and measure how long it takes.
+
+    Args:
+        profile (str): The profile name
+        depot (str): The depot name
+        stream (str): The stream name
+        include (list): Paths of the stream to sync, relative to the stream root
+        tuning (dict): The configuration to sync with
+        directory (str): Directory in which the trial workspaces are created and deleted again
+        runs (int): Number of syncs; the fastest is used
+
+    Returns:
+        dict: The 'seconds', 'files' and 'bytes' of the fastest sync
+    """
+    best = None
+    for _ in range(runs):
+        workspace = tempfile.mkdtemp(prefix="trial-", dir=directory)
+        try:
+            result = api.sync_stream(profile, depot, stream, workspace, writable=True, include=include,
+                                     parallel=tuning['parallel'], tuning=tuning, progress_interval=0)
+        except BaseException:
+            journal = SyncJournal.load(workspace)
+            if journal is not None:
+                journal.remove()
+            raise
+        finally:
+            shutil.rmtree(workspace, ignore_errors=True)
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+
+def tune(profile, depot, stream, include=(), threads=(1, 2, 4, 8), tunables=(), runs=1, directory=None,
+         echo=click.echo):
+    """
+    Find the fastest transfer settings for a profile.
+
+    Args:
+        profile (str): The profile name
+        depot (str): The depot name
+        stream (str): The stream name
+        include (list): Paths of the stream to sync as the sample, relative to the stream root; the whole
+            stream by default
+        threads (list): Transfer thread counts to try
+        tunables (list): (name, [values]) pairs of client-side tunables to try
+        runs (int): Syncs per configuration; the fastest is used
+        directory (str): Directory in which the trial workspaces are created; a temporary directory by default
+        echo (callable): Function used to print messages
+
+    Returns:
+        dict: The fastest tuning, with every key of config.TUNING_DEFAULTS
+    """
+    import P4
+
+    best = get_tuning(profile)
+    # Tunables are global to the process, so a configuration that does not set a tried tunable is measured with
+    # its default value rather than the value of the previous trial
+    defaults = {name: str(P4.P4().get_tunable(name)) for name, _ in tunables if name not in best['tunables']}
+    work_dir = tempfile.mkdtemp(prefix="phc-tune-", dir=directory)
+    try:
+        def measure(tuning):
+            effective = dict(tuning, tunables=dict(defaults, **tuning['tunables']))
+            result = run_trial(profile, depot, stream, include, effective, work_dir, runs)
+            rate = result['bytes'] / result['seconds'] if result['seconds'] else 0
+            echo(f"  {_describe(tuning)}: {result['seconds']:.2f}s ({format_bytes(rate)}/s)")
+            return result['seconds']
+
+        # The first sync also warms the server's file cache, so it is not counted
+        echo("Warming up...")
+        sample = run_trial(profile, depot, stream, include, best, work_dir)
+        echo(f"Sample: {sample['files']} files, {format_bytes(sample['bytes'])}")
+        best_time = measure(best)
+
+        def consider(candidate):
+            nonlocal best, best_time
+            seconds = measure(candidate)
+            if seconds < best_time * (1 - MIN_GAIN):
+                best, best_time = candidate, seconds
+
+        echo("Compression:")
+        consider(dict(best, compress=not best['compress']))
+
+        echo("Transfer threads:")
+        for count in sorted(set(threads) - {best['parallel']}):
+            consider(dict(best, parallel=count))
+
+        for name, values in tunables:
+            echo(f"Tunable {name}:")
+            for value in values:
+                if best['tunables'].get(name) != value:
+                    consider(dict(best, tunables=dict(best['tunables'], **{name: value})))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return best
+
+
+@click.command()
+@click.option('--profile', required=True, help='Profile name to tune')
+@click.option('--depot', required=True, help='Depot name containing the stream')
+@click.option('--stream', required=True, help='Stream to sync the sample from')
+@click.option('--path', 'paths', multiple=True,
+              help='Sample path of the stream, relative to the stream root; may be repeated (default: whole stream)')
+@click.option('--threads', default=THREADS, show_default=True, help='Comma-separated transfer thread counts to try')
+@click.option('--tunable', 'tunables', multiple=True, default=TUNABLES, show_default=True,
+              help='Client-side tunable values to try, as NAME=VALUE[,VALUE...]; may be repeated')
+@click.option('--runs', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Syncs per configuration; the fastest is used')
+@click.option('--workspace-path', required=False,
+              help='Directory in which the trial workspaces are created (default: the temporary directory)')
+@click.option('--dry-run', is_flag=True, help='Show the fastest settings without storing them in the profile')
+def main(profile, depot, stream, paths, threads, tunables, runs, workspace_path, dry_run):
+    """
+    Find the fastest transfer settings for a profile and store them.
+
+    Syncs a sample path of a stream several times with different settings: compression on and off, each
+    thread count of --threads, and each value of every --tunable. The settings are tried one after another,
+    each starting from the fastest combination so far, and the fastest combination is stored in the profile's
+    tuning, which sync-stream, sync-streams and verify-workspace then use.
+
+    Choose a sample that is representative of the files usually synced, and large enough that a sync takes
+    several seconds. Every trial transfers the whole sample.
+    """
+    try:
+        from perforce_tools.clients import view_filter
+
+        include = view_filter(paths)
+        try:
+            thread_counts = sorted({int(t) for t in threads.split(',') if t.strip()})
+        except ValueError:
+            raise ValueError(f"Invalid --threads '{threads}': expected comma-separated numbers")
+        if not thread_counts or thread_counts[0] < 1:
+            raise ValueError("--threads must list positive thread counts")
+        if workspace_path:
+            os.makedirs(workspace_path, exist_ok=True)
+
+        click.echo(f"Tuning profile '{profile}' with //{depot}/{stream}" +
+                   (f" ({', '.join(include)})" if include else ""))
+        current = get_tuning(profile)
+        best = tune(profile, depot, stream, include, thread_counts, _parse_tunables(tunables), runs, workspace_path)
+
+        click.echo(f"Fastest settings: {_describe(best)}")
+        if best == current:
+            click.echo(f"The current settings of profile '{profile}' are already the fastest.")
+        elif dry_run:
+            click.echo("Dry run; the profile was not changed.")
+        else:
+            save_tuning(profile, best)
+            click.echo(f"Profile '{profile}' updated.")
+
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        exit(1)
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}")
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
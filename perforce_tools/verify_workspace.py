@@ -0,0 +1,266 @@
+"""
+Verify Workspace Tool for Perforce Helix Core Python Tools.
+
+This tool checks that a workspace synced with sync-stream still matches the server, and can re-sync only the
+files that do not.
+
+The expected files, with their sizes, modification times and MD5 digests, are fetched from the server in bulk
+with 'p4 fstat -Ol', one part of the stream at a time. A local file whose size and modification time match
+the server is taken to be unchanged without reading it, as the 'modtime' client option gives every synced
+file the modification time of its revision. Only the remaining files are hashed, in a pool of worker
+processes reading the files through memory maps, so a clean workspace is verified much faster than its
+contents could be read.
+"""
+
+import click
+import hashlib
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import P4
+
+from perforce_tools import tracing
+from perforce_tools.clients import (build_client_spec, client_exists, local_path, narrow_view, persistent_client_name,
+                                    stream_view, temp_client_name, view_filter)
+from perforce_tools.config import get_p4_client, get_tuning
+from perforce_tools.parallel_sync import plan_sync_units
+from perforce_tools.sync_stats import format_bytes
+
+# Fields of 'p4 fstat' needed to verify a file
+FSTAT_FIELDS = "depotFile,clientFile,headType,headAction,headRev,headModTime,fileSize,digest"
+
+# Number of parts the stream is split into for 'p4 fstat'
+FSTAT_UNITS = 64
+
+# Number of files passed to a single 'p4 sync -f' command
+FIX_BATCH_SIZE = 500
+
+
+def _is_hashable(file_type):
+    """
+    Check whether the server digest of a file type can be compared with a hash of the local file.
+
+    Keyword-expanded files differ from the server content by their expanded keywords, symlinks and Mac
+    resource types are not plain files, and utf16 files (and on Windows, all text files) are translated
+    when they are written to the workspace.
+    """
+    base, _, modifiers = file_type.partition('+')
+    if base in ('symlink', 'apple', 'resource', 'utf16', 'xutf16') or base.startswith('k') or 'k' in modifiers:
+        return False
+    if os.name == 'nt' and base in ('text', 'xtext', 'unicode', 'xunicode', 'utf8', 'xutf8'):
+        return False
+    return True
+
+
+def md5_file(path):
+    """
+    Hash a file with MD5 through a memory map.
+
+    Args:
+        path (str): The file to hash
+
+    Returns:
+        str: The digest in upper case, as the server reports it, or None if the file cannot be read
+    """
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return hashlib.md5().hexdigest().upper()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return hashlib.md5(mapped).hexdigest().upper()
+    except (OSError, ValueError):
+        return None
+
+
+def expected_files(p4, client_name, workspace_path, revision=""):
+    """
+    Get the files the server expects in a workspace.
+
+    Args:
+        p4 (P4.P4): A connected P4 client with the client workspace set
+        client_name (str): The name of the client workspace
+        workspace_path (str): The client workspace root
+        revision (str): Revision specifier applied to every part, e.g. '#have'; the head revision by default
+
+    Returns:
+        dict: 'fstat' records of the files that exist at the revision, keyed by normalized local path
+    """
+    expected = {}
+    # Plan the parts as of a pinned changelist or label, so that directories deleted since are still fetched, and
+    # include the directories of the have list when comparing with it, which may no longer exist at head
+    pinned = revision[1:] if revision.startswith('@') else None
+    for unit in plan_sync_units(p4, client_name, FSTAT_UNITS, pinned, have=revision == "#have"):
+        with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+            records = p4.run_fstat("-Ol", "-T", FSTAT_FIELDS, "-F", "^headAction=delete & ^headAction=move/delete",
+                                   f"{unit}{revision}")
+        for record in records:
+            if isinstance(record, dict) and 'clientFile' in record:
+                path = os.path.normcase(os.path.abspath(local_path(record['clientFile'], client_name,
+                                                                   workspace_path)))
+                expected[path] = record
+    return expected
+
+
+def compare_workspace(expected, workspace_path, jobs=None, full=False):
+    """
+    Compare a workspace directory with the files the server expects.
+
+    Args:
+        expected (dict): The value returned by expected_files()
+        workspace_path (str): The client workspace root
+        jobs (int): Number of hashing processes (defaults to the number of CPUs)
+        full (bool): Hash every file, even if its size and modification time match
+
+    Returns:
+        dict: Lists of local paths under 'missing', 'modified' and 'extra', and the counts 'matched' (by
+              size and modification time), 'hashed' and 'hashed_bytes'
+    """
+    result = {'missing': [], 'modified': [], 'extra': [], 'matched': 0, 'hashed': 0, 'hashed_bytes': 0}
+    to_hash = []
+    for path, record in expected.items():
+        file_type = record.get('headType', '')
+        try:
+            st = os.lstat(path) if file_type.startswith('symlink') else os.stat(path)
+        except OSError:
+            result['missing'].append(path)
+            continue
+        if not _is_hashable(file_type):
+            result['matched'] += 1
+            continue
+        size = int(record.get('fileSize') or -1)
+        if size >= 0 and st.st_size != size:
+            result['modified'].append(path)
+        elif not full and size >= 0 and int(st.st_mtime) == int(record.get('headModTime') or -1):
+            result['matched'] += 1
+        elif record.get('digest'):
+            to_hash.append(path)
+        else:
+            result['matched'] += 1
+
+    if to_hash:
+        with tracing.span("hash_files", jobs=jobs) as details, ProcessPoolExecutor(max_workers=jobs) as executor:
+            chunk = max(1, len(to_hash) // (4 * (jobs or os.cpu_count() or 1)))
+            for path, digest in zip(to_hash, executor.map(md5_file, to_hash, chunksize=chunk)):
+                result['hashed'] += 1
+                result['hashed_bytes'] += int(expected[path].get('fileSize') or 0)
+                if digest != expected[path]['digest'].upper():
+                    result['modified'].append(path)
+            details.update(records=result['hashed'], bytes=result['hashed_bytes'])
+
+    with tracing.span("scan_workspace"):
+        for directory, _, files in os.walk(workspace_path):
+            for name in files:
+                path = os.path.normcase(os.path.abspath(os.path.join(directory, name)))
+                if path not in expected:
+                    result['extra'].append(path)
+
+    for key in ('missing', 'modified', 'extra'):
+        result[key].sort()
+    return result
+
+
+def fix_files(p4, records, echo=click.echo):
+    """
+    Force-sync files of a workspace.
+
+    Args:
+        p4 (P4.P4): A connected P4 client with the client workspace set
+        records (list): 'fstat' records of the files to sync, at the revision they should have
+        echo (callable): Function used to print messages
+    """
+    specs = [f"{record['depotFile']}#{record['headRev']}" for record in records]
+    for i in range(0, len(specs), FIX_BATCH_SIZE):
+        with p4.at_exception_level(P4.P4.RAISE_ERRORS):
+            p4.run_sync("-f", *specs[i:i + FIX_BATCH_SIZE])
+    echo(f"Re-synced {len(specs)} files")
+
+
+@click.command()
+@click.option('--profile', required=True, help='Profile name to use for connection')
+@click.option('--depot', required=True, help='Depot name containing the stream')
+@click.option('--stream', required=True, help='Stream name the workspace was synced from')
+@click.option('--workspace-path', required=True, type=click.Path(exists=True, file_okay=False),
+              help='Full path of the workspace to verify')
+@click.option('--fix', is_flag=True, help='Force-sync the missing and modified files')
+@click.option('--writable', is_flag=True, help='With --fix, make the re-synced files writable')
+@click.option('--full', is_flag=True, help='Hash every file, even if its size and modification time match')
+@click.option('--jobs', type=click.IntRange(min=1), default=None,
+              help='Number of processes hashing files  [default: number of CPUs]')
+@click.option('--include', multiple=True, help='Only verify this path of the stream, as given to sync-stream')
+@click.option('--exclude', multiple=True, help='Do not verify this path of the stream, as given to sync-stream')
+@click.option('--at', required=False, help='Compare with the stream as of this changelist number or label')
+def main(profile, depot, stream, workspace_path, fix, writable, full, jobs, include, exclude, at):
+    """
+    Verify a synced workspace against the server.
+
+    Reports files that are missing from the workspace, files whose content differs from the server, and extra
+    files the stream does not contain. Workspaces synced with --incremental are compared with the revisions in
+    their have list; other workspaces with the head revisions of the stream, or its revisions as of --at.
+    Workspaces synced with --include or --exclude are verified with the same options.
+
+    Files whose size and modification time match the server are not read; use --full to hash them as well.
+    With --fix, only the missing and modified files are synced again. Extra files are only reported.
+    """
+    try:
+        stream_path = f"//{depot}/{stream}"
+        workspace_path = os.path.abspath(workspace_path)
+        include = view_filter(include)
+        exclude = view_filter(exclude)
+        at = at.lstrip('@') if at else None
+
+        p4 = get_p4_client(profile, direct=True)
+        click.echo(f"Connected to {p4.port} as {p4.user}")
+
+        # An incremental sync leaves a persistent client whose have list records the synced revisions
+        client_name = persistent_client_name(profile, stream_path, workspace_path, include, exclude)
+        temporary = not client_exists(p4, client_name)
+        if temporary:
+            client_name = temp_client_name()
+            view = None
+            if include or exclude:
+                view = narrow_view(stream_view(p4, client_name, stream_path), client_name, include, exclude)
+            p4.client = client_name
+            p4.save_client(build_client_spec(p4, client_name, workspace_path, stream_path, writable, view=view,
+                                             compress=get_tuning(profile)['compress']))
+        else:
+            p4.client = client_name
+            click.echo(f"Comparing with the have list of persistent client workspace '{client_name}'")
+
+        try:
+            click.echo(f"Fetching file digests for '{stream_path}'...")
+            revision = f"@{at}" if at else "" if temporary else "#have"
+            expected = expected_files(p4, client_name, workspace_path, revision)
+
+            click.echo(f"Verifying {len(expected)} files in '{workspace_path}'...")
+            result = compare_workspace(expected, workspace_path, jobs, full)
+
+            for key, label in (('missing', 'Missing'), ('modified', 'Modified'), ('extra', 'Extra')):
+                for path in result[key]:
+                    click.echo(f"  {label}: {path}")
+            click.echo(f"{result['matched']} files matched by size and modification time, {result['hashed']} "
+                       f"files hashed ({format_bytes(result['hashed_bytes'])})")
+            click.echo(f"{len(result['missing'])} missing, {len(result['modified'])} modified, "
+                       f"{len(result['extra'])} extra files")
+
+            bad = result['missing'] + result['modified']
+            if fix and bad:
+                fix_files(p4, [expected[path] for path in bad])
+        finally:
+            if temporary:
+                p4.delete_client(client_name)
+
+        p4.disconnect()
+
+        if (bad and not fix) or result['extra']:
+            exit(1)
+
+    except ValueError as e:
+        click.echo(f"Error: {e}")
+        exit(1)
+    except Exception as e:
+        click.echo(f"Unexpected error: {e}")
+        exit(1)
+
+if __name__ == '__main__':
+    main()
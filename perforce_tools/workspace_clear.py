@@ -0,0 +1,154 @@
+"""
+Workspace Clearing for Perforce Helix Core Python Tools.
+
+This module clears a workspace directory without making the sync wait for it. The directory is renamed
+aside, which is a single atomic operation regardless of its size, and an empty directory is created in its
+place so the sync can start right away. The renamed tree is then deleted by a pool of threads in the
+background while the sync runs.
+
+Trees left behind by a process that was interrupted before it finished deleting are picked up and deleted
+by the next clear of the same workspace.
+"""
+
+import collections
+import itertools
+import os
+import shutil
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from perforce_tools import tracing
+
+# Threads deleting a renamed tree
+DELETE_WORKERS = 8
+
+# Numbers the trees renamed aside by a process
+_clear_counter = itertools.count()
+
+
+def _trash_prefix(workspace_path):
+    parent, name = os.path.split(os.path.abspath(workspace_path))
+    return os.path.join(parent, f".{name}.phc-clear-")
+
+
+def _on_remove_error(function, path, _):
+    # Windows refuses to delete read-only files, as synced files are by default
+    os.chmod(path, stat.S_IWUSR | stat.S_IRUSR)
+    function(path)
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, onerror=_on_remove_error)
+    else:
+        try:
+            os.remove(path)
+        except PermissionError:
+            _on_remove_error(os.remove, path, None)
+
+
+def delete_tree(path, workers=DELETE_WORKERS):
+    """
+    Delete a directory tree using several threads.
+
+    The tree is expanded breadth first until there are enough independent parts to keep every thread busy,
+    the parts are deleted concurrently, and the expanded directories are removed last.
+
+    Args:
+        path (str): The directory to delete
+        workers (int): Number of threads
+    """
+    parts = []
+    expanded = []
+    frontier = collections.deque([path])
+    while frontier and len(parts) + len(frontier) < workers * 4:
+        directory = frontier.popleft()
+        expanded.append(directory)
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    frontier.append(entry.path)
+                else:
+                    parts.append(entry.path)
+    parts.extend(frontier)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(_remove, parts))
+    for directory in reversed(expanded):
+        os.rmdir(directory)
+
+
+class WorkspaceClear:
+    """
+    The background deletion of the former contents of a workspace.
+    """
+
+    def __init__(self, paths, moved_in, workers=DELETE_WORKERS):
+        """
+        Start deleting trees in a background thread.
+
+        Args:
+            paths (list): The renamed trees to delete
+            moved_in (float): Seconds it took to rename the contents aside
+            workers (int): Number of threads deleting the trees
+        """
+        self.moved_in = moved_in
+        self.deleted_in = None
+        self.errors = []
+        self._start = time.monotonic()
+        self._thread = threading.Thread(target=self._run, args=(paths, workers), daemon=True)
+        self._thread.start()
+
+    def _run(self, paths, workers):
+        with tracing.span("delete_old_contents", trees=len(paths)):
+            for path in paths:
+                try:
+                    delete_tree(path, workers)
+                except OSError as e:
+                    self.errors.append(f"{path}: {e}")
+        self.deleted_in = time.monotonic() - self._start
+
+    def wait(self):
+        """
+        Wait for the deletion to finish.
+
+        Returns:
+            float: Seconds the deletion took
+        """
+        self._thread.join()
+        return self.deleted_in
+
+
+def clear_in_background(workspace_path, workers=DELETE_WORKERS):
+    """
+    Replace a workspace directory with an empty one and delete the old contents in the background.
+
+    Args:
+        workspace_path (str): The workspace directory to clear
+        workers (int): Number of threads deleting the old contents
+
+    Returns:
+        WorkspaceClear: The running deletion, or None if the directory could not be renamed (for example
+        because it is a mount point), in which case nothing was changed
+    """
+    workspace_path = os.path.abspath(workspace_path)
+    prefix = _trash_prefix(workspace_path)
+    trash = f"{prefix}{os.getpid()}-{next(_clear_counter)}"
+
+    start = time.monotonic()
+    with tracing.span("move_aside", path=workspace_path):
+        mode = stat.S_IMODE(os.stat(workspace_path).st_mode)
+        try:
+            os.rename(workspace_path, trash)
+        except OSError:
+            return None
+        os.mkdir(workspace_path)
+        os.chmod(workspace_path, mode)
+    moved_in = time.monotonic() - start
+
+    # Include trees left behind by an earlier clear that was interrupted
+    parent, base = os.path.split(prefix)
+    leftovers = [os.path.join(parent, name) for name in os.listdir(parent)
+                 if name.startswith(base) and os.path.join(parent, name) != trash]
+    return WorkspaceClear([trash] + leftovers, moved_in, workers)